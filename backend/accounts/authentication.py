@@ -0,0 +1,121 @@
+"""
+Stateless JWT authentication.
+
+Access tokens carry the user's role and username next to the user id, so
+authenticated requests are served from the token alone instead of loading
+the user row on every request. request.user is then a ClaimsUser; views
+that need the full profile load it with ClaimsUser.get_user().
+
+Changes that must take effect before a token expires (role, username,
+password or is_active changes and deletions, see accounts/signals.py)
+revoke the user's outstanding tokens: a marker holding the revocation time
+is kept in the cache for ACCESS_TOKEN_LIFETIME, after which every token
+issued before it has expired anyway. The markers only reach every worker,
+and survive a restart, in a shared cache (CACHE_BACKEND), so claims are
+trusted only when TOKEN_CLAIMS_TRUSTED is on, which by default means a
+shared cache is configured. Otherwise the user is loaded on every request
+as before, and role, username and is_active changes apply at once.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# User fields copied into every token; changing one of them revokes the user's tokens
+CLAIM_FIELDS = ('username', 'role')
+
+
+def revocation_key(user_id):
+    return f'auth-revoked:{user_id}'
+
+
+def revoke(user_id):
+    """Reject every token issued to the user up to now"""
+    cache.set(
+        revocation_key(user_id),
+        int(time.time()),
+        timeout=int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()) + 1,
+    )
+
+
+def is_revoked(token):
+    revoked_at = cache.get(revocation_key(token[api_settings.USER_ID_CLAIM]))
+    # iat has whole-second precision: a token issued in the second of the revocation
+    # may predate it, so it is rejected too (at worst a fresh login is asked again)
+    return revoked_at is not None and token.get('iat', 0) <= revoked_at
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry the identity claims"""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for field in CLAIM_FIELDS:
+            token[field] = getattr(user, field)
+        return token
+
+
+class ClaimsUser(TokenUser):
+    """
+    Authenticated user built from access token claims, without a query.
+    """
+
+    @cached_property
+    def id(self):
+        # Tokens store the id as a string; views compare it with foreign keys
+        return get_user_model()._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    @cached_property
+    def role(self):
+        return self.token.get('role', '')
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    @property
+    def is_faculty(self):
+        return self.role == 'faculty'
+
+    @property
+    def is_student(self):
+        return self.role == 'student'
+
+    def get_user(self):
+        """Load the full user row"""
+        return get_user_model()._default_manager.get(pk=self.pk)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that trusts the identity claims in the token.
+
+    Tokens issued before the claims were added, and every token while
+    TOKEN_CLAIMS_TRUSTED is off, fall back to loading the user.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM in validated_token and is_revoked(validated_token):
+            raise InvalidToken('Token has been revoked')
+        if not settings.TOKEN_CLAIMS_TRUSTED or any(field not in validated_token for field in CLAIM_FIELDS):
+            return super().get_user(validated_token)
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('Token contained no recognizable user identification')
+        return ClaimsUser(validated_token)
+
+
+def get_full_user(user):
+    """The model instance for request.user, loading it if it came from claims"""
+    return user.get_user() if isinstance(user, ClaimsUser) else user
@@ -0,0 +1,186 @@
+"""
+Password verification for the login endpoint.
+
+Hash checks are CPU-bound and deliberately slow, so they run on a bounded
+pool of LOGIN_HASH_WORKERS threads (hashlib and argon2 release the GIL while
+hashing) instead of on every request thread at once. Up to LOGIN_HASH_QUEUE
+further logins wait for a worker; beyond that, or after LOGIN_HASH_TIMEOUT
+seconds of waiting, logins are shed with a 503 and Retry-After rather than
+letting every request slow down together.
+
+Database access stays on the request thread; only hashing is handed to the
+pool. Passwords stored with an outdated hasher or outdated parameters are
+rehashed with the preferred hasher after a successful login. The async login
+view awaits the pool with authenticate_user_async() instead of blocking.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model, user_login_failed
+from django.contrib.auth.hashers import Argon2PasswordHasher, check_password, get_hasher, identify_hasher, make_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class LoginOverloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many logins in progress, please retry shortly.'
+    default_code = 'login_overloaded'
+
+    def __init__(self, wait=1):
+        super().__init__()
+        # Sent as Retry-After by DRF's exception handler
+        self.wait = wait
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2id with cost parameters taken from settings.
+
+    Keeps the "argon2" algorithm name, so hashes made with other parameters
+    still verify and are upgraded on the next login via must_update().
+    """
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    parallelism = settings.ARGON2_PARALLELISM
+
+
+class VerificationPool:
+    """
+    Fixed number of hashing threads with a bounded wait queue.
+    """
+
+    def __init__(self, workers, queue_size, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size) if workers else None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.in_flight = 0
+        self.shed = 0
+
+    def _get_executor(self):
+        # Pools do not survive a fork; each worker process builds its own
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='login-hash')
+                    self._pid = os.getpid()
+        return self._executor
+
+    def run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        future = self._submit(func, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Still queued: drop it. Already hashing: let it finish in the background.
+            future.cancel()
+            self._count(shed=1)
+            raise LoginOverloaded()
+
+    async def arun(self, func, *args):
+        """run() for coroutines: the event loop stays free while the pool hashes"""
+        if not self.workers:
+            return await sync_to_async(func, thread_sensitive=False)(*args)
+        future = self._submit(func, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            self._count(shed=1)
+            raise LoginOverloaded()
+
+    def _submit(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            self._count(shed=1)
+            raise LoginOverloaded()
+        self._count(in_flight=1)
+
+        def release(_):
+            self._count(in_flight=-1)
+            self._slots.release()
+
+        future = self._get_executor().submit(func, *args)
+        future.add_done_callback(release)
+        return future
+
+    def _count(self, in_flight=0, shed=0):
+        with self._stats_lock:
+            self.in_flight += in_flight
+            self.shed += shed
+
+    def stats(self):
+        return {'workers': self.workers, 'in_flight': self.in_flight, 'shed': self.shed}
+
+
+pool = VerificationPool(
+    workers=settings.LOGIN_HASH_WORKERS,
+    queue_size=settings.LOGIN_HASH_QUEUE,
+    timeout=settings.LOGIN_HASH_TIMEOUT,
+)
+
+
+def verify(password, encoded):
+    """Return (matches, needs_rehash) for a stored hash; runs on the pool"""
+    if not check_password(password, encoded):
+        return False, False
+    preferred = get_hasher('default')
+    hasher = identify_hasher(encoded)
+    return True, hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def authenticate_user(request, username, password):
+    """
+    Equivalent of django.contrib.auth.authenticate() for username/password
+    logins with ModelBackend, with the hashing done on the pool.
+    """
+    User = get_user_model()
+    try:
+        user = User._default_manager.get_by_natural_key(username)
+    except User.DoesNotExist:
+        # Hash anyway so unknown usernames take as long as wrong passwords
+        pool.run(make_password, password)
+        user = None
+    else:
+        matches, needs_rehash = pool.run(verify, password, user.password)
+        if matches and needs_rehash:
+            user.password = pool.run(make_password, password)
+            # Same password, new hash: accounts/signals.py keeps the user's tokens valid
+            user._password_rehash = True
+            user.save(update_fields=['password'])
+        if not matches or not user.is_active:
+            user = None
+    if user is None:
+        user_login_failed.send(sender=__name__, credentials={'username': username}, request=request)
+    return user
+
+
+async def authenticate_user_async(request, username, password):
+    """authenticate_user() for async views"""
+    User = get_user_model()
+    try:
+        user = await User._default_manager.aget(**{User.USERNAME_FIELD: username})
+    except User.DoesNotExist:
+        await pool.arun(make_password, password)
+        user = None
+    else:
+        matches, needs_rehash = await pool.arun(verify, password, user.password)
+        if matches and needs_rehash:
+            user.password = await pool.arun(make_password, password)
+            user._password_rehash = True
+            await user.asave(update_fields=['password'])
+        if not matches or not user.is_active:
+            user = None
+    if user is None:
+        await sync_to_async(user_login_failed.send)(
+            sender=__name__, credentials={'username': username}, request=request,
+        )
+    return user
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'first_name', 'last_name'], name='users_role_name_idx'),
+        ),
+    ]
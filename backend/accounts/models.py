@@ -38,3 +38,7 @@ class User(AbstractUser):
     
     class Meta:
         db_table = 'users'
+        indexes = [
+            # Role-filtered rosters sorted by name (get_students / get_faculty)
+            models.Index(fields=['role', 'first_name', 'last_name'], name='users_role_name_idx'),
+        ]
@@ -1,10 +1,11 @@
 from rest_framework import serializers
-from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from .hashing import authenticate_user
 from .models import User
+from api.instrumentation import TimedSerializerMixin
 
 
-class UserRegistrationSerializer(serializers.ModelSerializer):
+class UserRegistrationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for user registration
     """
@@ -27,19 +28,24 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserLoginSerializer(serializers.Serializer):
+class UserCredentialsSerializer(serializers.Serializer):
     """
-    Serializer for user login
+    Username and password fields of a login, without authenticating
     """
     username = serializers.CharField()
     password = serializers.CharField()
-    
+
+
+class UserLoginSerializer(UserCredentialsSerializer):
+    """
+    Serializer for user login
+    """
     def validate(self, attrs):
         username = attrs.get('username')
         password = attrs.get('password')
         
         if username and password:
-            user = authenticate(username=username, password=password)
+            user = authenticate_user(self.context.get('request'), username, password)
             if not user:
                 raise serializers.ValidationError('Invalid credentials')
             if not user.is_active:
@@ -50,7 +56,7 @@ class UserLoginSerializer(serializers.Serializer):
             raise serializers.ValidationError('Must include username and password')
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for user profile
     """
@@ -62,7 +68,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'updated_at')
 
 
-class UserUpdateSerializer(serializers.ModelSerializer):
+class UserUpdateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for updating user profile
     """
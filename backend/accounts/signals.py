@@ -1,38 +1,66 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
+from .authentication import CLAIM_FIELDS, revoke
 from .models import User
-from api.mongo import col
-
-
-def _user_doc(user: User):
-    return {
-        "_id": user.id,
-        "username": user.username,
-        "email": user.email,
-        "first_name": user.first_name,
-        "last_name": user.last_name,
-        "role": user.role,
-        "student_id": user.student_id,
-        "faculty_id": user.faculty_id,
-        "phone": user.phone,
-        "address": user.address,
-        "created_at": user.created_at,
-        "updated_at": user.updated_at,
-    }
+from api import stored
+from api.documents import user_doc
+from api.mirror import mirror
+
+
+# Saves limited to these fields leave the Mongo documents unchanged
+UNMIRRORED_FIELDS = {"last_login", "password"}
 
 
 @receiver(post_save, sender=User)
-def sync_user_to_mongo(sender, instance: User, **kwargs):
-    doc = _user_doc(instance)
-    col("users").update_one({"_id": instance.id}, {"$set": doc}, upsert=True)
+def sync_user_to_mongo(sender, instance: User, update_fields=None, **kwargs):
+    if update_fields and UNMIRRORED_FIELDS.issuperset(update_fields):
+        return
+    doc = user_doc(instance)
+    mirror.upsert("users", instance.id, doc)
     if instance.role == "faculty":
-        col("faculty").update_one({"_id": instance.id}, {"$set": doc}, upsert=True)
-        col("students").delete_one({"_id": instance.id})
+        mirror.upsert("faculty", instance.id, doc)
+        mirror.delete("students", instance.id)
     elif instance.role == "student":
-        col("students").update_one({"_id": instance.id}, {"$set": doc}, upsert=True)
-        col("faculty").delete_one({"_id": instance.id})
+        mirror.upsert("students", instance.id, doc)
+        mirror.delete("faculty", instance.id)
     else:
-        col("faculty").delete_one({"_id": instance.id})
-        col("students").delete_one({"_id": instance.id})
+        mirror.delete("faculty", instance.id)
+        mirror.delete("students", instance.id)
+
+
+# Changes to these fields revoke the user's outstanding access tokens
+REVOKING_FIELDS = (*CLAIM_FIELDS, "is_active", "password")
+
+stored.register(User, *REVOKING_FIELDS)
+
+
+def _revoking_state(user: User):
+    return tuple(getattr(user, field) for field in REVOKING_FIELDS)
+
+
+@receiver(pre_save, sender=User)
+def remember_token_state(sender, instance: User, raw=False, update_fields=None, **kwargs):
+    instance._token_state = None
+    if raw or instance._state.adding:
+        return
+    # The rehash after login (accounts/hashing.py) flags the instance; the password
+    # itself is unchanged, so tokens stay valid
+    if getattr(instance, "_password_rehash", False):
+        return
+    if update_fields is not None and not set(REVOKING_FIELDS).intersection(update_fields):
+        return
+    values = stored.row(instance)
+    instance._token_state = None if values is None else tuple(values[field] for field in REVOKING_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_change(sender, instance: User, **kwargs):
+    instance._password_rehash = False
+    before = getattr(instance, "_token_state", None)
+    if before is not None and before != _revoking_state(instance):
+        revoke(instance.pk)
 
 
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_delete(sender, instance: User, **kwargs):
+    revoke(instance.pk)
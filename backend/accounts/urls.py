@@ -1,9 +1,10 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 urlpatterns = [
     path('register/', views.register, name='register'),
-    path('login/', views.login_view, name='login'),
+    path('login/', views.login_view_async if settings.ASYNC_VIEWS else views.login_view, name='login'),
     path('profile/', views.profile, name='profile'),
     path('profile/update/', views.update_profile, name='update_profile'),
     path('users/', views.UserListView.as_view(), name='user_list'),
@@ -1,14 +1,19 @@
+from asgiref.sync import sync_to_async
 from rest_framework import status, generics, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import login
+from .authentication import ClaimsRefreshToken, get_full_user
+from .hashing import authenticate_user_async
 from .models import User
-from api.mongo import col
+from api.async_support import async_api_view, json_response
+from api.mirror import mirror
+from api.throttling import LoginThrottle, RegisterThrottle
 from django.utils import timezone
 from .serializers import (
     UserRegistrationSerializer, 
     UserLoginSerializer, 
+    UserCredentialsSerializer,
     UserSerializer,
     UserUpdateSerializer
 )
@@ -16,6 +21,7 @@ from .serializers import (
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([RegisterThrottle])
 def register(request):
     """
     Register a new user
@@ -23,7 +29,7 @@ def register(request):
     serializer = UserRegistrationSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         return Response({
             'user': UserSerializer(user).data,
             'tokens': {
@@ -36,44 +42,60 @@ def register(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([LoginThrottle])
 def login_view(request):
     """
     Login user and return JWT tokens
     """
-    serializer = UserLoginSerializer(data=request.data)
+    serializer = UserLoginSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
         user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
-        # log login into Mongo
-        try:
-            col("logins").insert_one({
-                "user_id": user.id,
-                "username": user.username,
-                "role": user.role,
-                "ts": timezone.now(),
-                "ua": request.META.get("HTTP_USER_AGENT"),
-                "ip": request.META.get("REMOTE_ADDR"),
-            })
-        except Exception:
-            pass
-
-        return Response({
-            'user': UserSerializer(user).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            }
-        }, status=status.HTTP_200_OK)
+        return Response(_login_response(request, user), status=status.HTTP_200_OK)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@async_api_view(['POST'], authenticated=False, throttle=LoginThrottle)
+async def login_view_async(request, data):
+    """
+    login_view for ASGI servers: awaits the hashing pool instead of blocking
+    """
+    serializer = UserCredentialsSerializer(data=data)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    user = await authenticate_user_async(request, **serializer.validated_data)
+    if not user:
+        return json_response({'non_field_errors': ['Invalid credentials']}, status=status.HTTP_400_BAD_REQUEST)
+    # The audit insert registers an on_commit hook, which needs the sync database connection
+    return json_response(await sync_to_async(_login_response)(request, user))
+
+
+def _login_response(request, user):
+    refresh = ClaimsRefreshToken.for_user(user)
+    # log login into Mongo; buffered and written in batches by the mirror worker
+    mirror.insert("logins", {
+        "user_id": user.id,
+        "username": user.username,
+        "role": user.role,
+        "ts": timezone.now(),
+        "ua": request.META.get("HTTP_USER_AGENT"),
+        "ip": request.META.get("REMOTE_ADDR"),
+    })
+    return {
+        'user': UserSerializer(user).data,
+        'tokens': {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
+    }
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def profile(request):
     """
     Get current user profile
     """
-    serializer = UserSerializer(request.user)
+    serializer = UserSerializer(get_full_user(request.user))
     return Response(serializer.data)
 
 
@@ -83,10 +105,11 @@ def update_profile(request):
     """
     Update current user profile
     """
-    serializer = UserUpdateSerializer(request.user, data=request.data, partial=True)
+    user = get_full_user(request.user)
+    serializer = UserUpdateSerializer(user, data=request.data, partial=True)
     if serializer.is_valid():
         serializer.save()
-        return Response(UserSerializer(request.user).data)
+        return Response(UserSerializer(user).data)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
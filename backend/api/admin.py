@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Event, Exam, Result, StudyMaterial
+from .models import Event, Exam, Result, StudyMaterial, StudentSummary, Job
 
 
 @admin.register(Event)
@@ -29,6 +29,14 @@ class ResultAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at', 'grade')
 
 
+@admin.register(StudentSummary)
+class StudentSummaryAdmin(admin.ModelAdmin):
+    list_display = ('student', 'results_count', 'percentage', 'gpa', 'updated_at')
+    search_fields = ('student__username', 'student__first_name', 'student__student_id')
+    ordering = ('-gpa',)
+    readonly_fields = [field.name for field in StudentSummary._meta.fields]
+
+
 @admin.register(StudyMaterial)
 class StudyMaterialAdmin(admin.ModelAdmin):
     list_display = ('title', 'material_type', 'subject', 'uploaded_by', 'is_active', 'created_at')
@@ -36,3 +44,11 @@ class StudyMaterialAdmin(admin.ModelAdmin):
     search_fields = ('title', 'description', 'subject', 'uploaded_by__username')
     ordering = ('-created_at',)
     readonly_fields = ('created_at', 'updated_at', 'file_size')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    ordering = ('-created_at',)
+    readonly_fields = ('created_at', 'finished_at', 'locked_at', 'last_error')
@@ -6,4 +6,4 @@ class ApiConfig(AppConfig):
     name = 'api'
 
     def ready(self):
-        from . import signals  # noqa: F401
\ No newline at end of file
+        from . import signals, sqlite  # noqa: F401
\ No newline at end of file
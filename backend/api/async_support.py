@@ -0,0 +1,93 @@
+"""
+Request handling for native async views.
+
+DRF views are synchronous, so the async variants of the I/O-bound endpoints
+(enabled with ASYNC_VIEWS under an ASGI server) are plain Django coroutines.
+async_api_view gives them the parts of DRF they rely on: method check, JWT
+authentication, the token-bucket throttles, JSON/form body parsing and
+APIException handling, with the same status codes and error bodies as the
+synchronous views.
+"""
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException, AuthenticationFailed, MethodNotAllowed, NotAuthenticated, ParseError, Throttled,
+)
+from rest_framework.utils.encoders import JSONEncoder
+
+from accounts.authentication import ClaimsJWTAuthentication
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    """JsonResponse using DRF's encoder, so output matches the DRF views"""
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def error_response(exc, request=None):
+    """Equivalent of DRF's exception handler for APIException"""
+    detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = json_response(detail, status=exc.status_code)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = '%d' % exc.wait
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)) and request is not None:
+        response['WWW-Authenticate'] = ClaimsJWTAuthentication().authenticate_header(request)
+    return response
+
+
+async def authenticate(request):
+    """request.user for a bearer token; AnonymousUser without one"""
+    authenticator = ClaimsJWTAuthentication()
+    header = authenticator.get_header(request)
+    raw_token = authenticator.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        return AnonymousUser()
+    token = authenticator.get_validated_token(raw_token)
+    # Claims tokens only read the revocation cache; older tokens load the user row
+    return await sync_to_async(authenticator.get_user)(token)
+
+
+def parse_body(request):
+    if not request.body:
+        return {}
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body)
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+    return request.POST.dict()
+
+
+def async_api_view(methods, authenticated=True, throttle=None):
+    """
+    Decorator for `async def view(request, data, ...)` coroutines.
+
+    `data` is the parsed body; `throttle` is a TokenBucketThrottle class,
+    checked before the body is parsed.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                request.user = await authenticate(request)
+                if authenticated and not request.user.is_authenticated:
+                    raise NotAuthenticated()
+                if throttle is not None:
+                    # Buckets are in memory or a local file, so the check does not wait on the network
+                    checker = throttle()
+                    if not checker.allow_request(request, None):
+                        raise Throttled(checker.wait())
+                if request.method not in methods:
+                    raise MethodNotAllowed(request.method)
+                return await view(request, parse_body(request), *args, **kwargs)
+            except APIException as exc:
+                return error_response(exc, request)
+
+        # Token authentication only, as with the DRF views
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
@@ -0,0 +1,251 @@
+"""
+Synthetic dataset generation for load tests and benchmarks.
+
+Rows are written with bulk_create in fixed-size chunks, so post_save
+receivers (Mongo mirror, counters) do not run; callers rebuild whatever
+derived state they need afterwards, using high_water_marks() taken before
+the load to tell the new rows apart. The same seed always produces the same
+dataset.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import documents, search
+from .mirror import mirror
+from .models import Event, Exam, Result, StudyMaterial, calculate_grades
+
+User = get_user_model()
+
+FIRST_NAMES = [
+    'Aarav', 'Aditi', 'Alice', 'Arjun', 'Bob', 'Carol', 'David', 'Diya', 'Eve', 'Farhan',
+    'Gauri', 'Harsh', 'Isha', 'Jay', 'Kavya', 'Krish', 'Meera', 'Neel', 'Priya', 'Rahul',
+    'Riya', 'Rohan', 'Sara', 'Tanvi', 'Vihaan', 'Yash', 'Zara',
+]
+LAST_NAMES = [
+    'Brown', 'Desai', 'Gor', 'Iyer', 'Johnson', 'Joshi', 'Kapoor', 'Mehta', 'Miller', 'Nair',
+    'Patel', 'Rao', 'Shah', 'Sharma', 'Singh', 'Sisodiya', 'Smith', 'Trivedi', 'Wilson',
+]
+SUBJECTS = [
+    'Mathematics', 'Physics', 'Chemistry', 'Computer Science', 'Electronics',
+    'Mechanics', 'Economics', 'English', 'Biology', 'Statistics',
+]
+MATERIAL_TYPES = [choice for choice, _ in StudyMaterial.MATERIAL_TYPE_CHOICES]
+# Share of events, exams and materials that are still active
+ACTIVE_RATIO = 0.9
+
+USER_COLLECTIONS = {'student': 'students', 'faculty': 'faculty'}
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def high_water_marks():
+    """{model: highest primary key}; rows loaded afterwards have larger keys"""
+    return {
+        model: model.objects.aggregate(last=Max('pk'))['last'] or 0
+        for model in (User, Event, Exam, Result, StudyMaterial)
+    }
+
+
+def _documents(model, instance):
+    """(collection, doc) pairs api/signals.py and accounts/signals.py mirror for a row"""
+    if model is User:
+        doc = documents.user_doc(instance)
+        yield 'users', doc
+        if instance.role in USER_COLLECTIONS:
+            yield USER_COLLECTIONS[instance.role], doc
+    elif model is Event:
+        yield 'events', documents.event_doc(instance)
+    elif model is Exam:
+        yield 'exams', documents.exam_doc(instance)
+    elif model is Result:
+        yield 'results', documents.result_doc(instance)
+    else:
+        yield 'materials', documents.material_doc(instance)
+
+
+def new_rows(model, since, chunk_size):
+    """Chunks of the rows of model added after high_water_marks() returned since"""
+    queryset = model.objects.filter(pk__gt=since[model]).order_by('pk')
+    return _chunks(queryset.iterator(chunk_size=chunk_size), chunk_size)
+
+
+def load_mongo(since, chunk_size=5000, log=None):
+    """Mirror rows added since the high-water marks with one bulk write per collection and chunk"""
+    log = log or (lambda message: None)
+    written = {}
+    for model in since:
+        for chunk in new_rows(model, since, chunk_size):
+            docs = {}
+            for instance in chunk:
+                for collection, doc in _documents(model, instance):
+                    docs.setdefault(collection, {})[instance.pk] = doc
+            for collection, collection_docs in docs.items():
+                written[collection] = written.get(collection, 0) + mirror.load(collection, collection_docs)
+                log(f'Mongo {collection}: {written[collection]} documents written')
+    return written
+
+
+def index_new_rows(since, chunk_size=5000):
+    """Add rows loaded since the high-water marks to the search index"""
+    backend = search.get_backend()
+    indexed = 0
+    for model in (Event, Exam, StudyMaterial, User):
+        for chunk in new_rows(model, since, chunk_size):
+            # Faculty and admins have no search document
+            documents = [document for document in map(search.document_for, chunk) if document is not None]
+            with transaction.atomic():
+                backend.index(documents)
+            indexed += len(documents)
+    backend.optimize()
+    return indexed
+
+
+class DatasetGenerator:
+    """
+    Builds a reproducible campus dataset of the requested size.
+
+    Usernames are derived from ``prefix`` and a running number, so a second
+    run with the same prefix reuses existing users instead of failing.
+    """
+
+    def __init__(self, seed=0, chunk_size=5000, prefix='load', log=None):
+        self.random = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.prefix = prefix
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+
+    def generate(self, students, faculty, exams, results_per_exam, events=0, materials=0):
+        """Create the dataset and return {model name: rows created}"""
+        created = {}
+        student_ids = self.create_users('student', students)
+        faculty_ids = self.create_users('faculty', faculty)
+        created['users'] = len(student_ids) + len(faculty_ids)
+        if not faculty_ids:
+            return created
+        created['events'] = self.create_events(events, faculty_ids)
+        exam_ids = self.create_exams(exams, faculty_ids)
+        created['exams'] = len(exam_ids)
+        created['results'] = self.create_results(exam_ids, student_ids, results_per_exam)
+        created['materials'] = self.create_materials(materials, faculty_ids)
+        return created
+
+    def _bulk_create(self, model, rows, **kwargs):
+        total = 0
+        for chunk in _chunks(rows, self.chunk_size):
+            with transaction.atomic():
+                model.objects.bulk_create(chunk, batch_size=self.chunk_size, **kwargs)
+            total += len(chunk)
+            self.log(f'{model.__name__}: {total} rows written')
+        return total
+
+    def create_users(self, role, count):
+        # Hash once and share it; hashing per user would dominate the run time
+        password = make_password(f'{role}123')
+        id_field = 'student_id' if role == 'student' else 'faculty_id'
+        code = 'S' if role == 'student' else 'F'
+
+        def rows():
+            for i in range(count):
+                username = f'{self.prefix}_{role}_{i:07d}'
+                yield User(
+                    username=username,
+                    email=f'{username}@campusconnect.edu',
+                    first_name=self.random.choice(FIRST_NAMES),
+                    last_name=self.random.choice(LAST_NAMES),
+                    role=role,
+                    password=password,
+                    **{id_field: f'{self.prefix.upper()}{code}{i:07d}'},
+                )
+
+        self._bulk_create(User, rows(), ignore_conflicts=True)
+        return list(
+            User.objects.filter(role=role, username__startswith=f'{self.prefix}_{role}_')
+            .order_by('pk').values_list('pk', flat=True)[:count]
+        )
+
+    def _date(self):
+        return self.now + timedelta(days=self.random.randint(-365, 60), minutes=self.random.randint(0, 1439))
+
+    def create_events(self, count, faculty_ids):
+        rows = (
+            Event(
+                title=f'Event {i}',
+                description='Generated event',
+                date=self._date(),
+                location=f'Hall {self.random.randint(1, 20)}',
+                created_by_id=self.random.choice(faculty_ids),
+                is_active=self.random.random() < ACTIVE_RATIO,
+            )
+            for i in range(count)
+        )
+        return self._bulk_create(Event, rows)
+
+    def create_exams(self, count, faculty_ids):
+        first_new = Exam.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+        def rows():
+            for i in range(count):
+                subject = self.random.choice(SUBJECTS)
+                yield Exam(
+                    title=f'{subject} Exam {i}',
+                    description='Generated exam',
+                    date=self._date(),
+                    subject=subject,
+                    faculty_id=self.random.choice(faculty_ids),
+                    is_active=self.random.random() < ACTIVE_RATIO,
+                )
+
+        self._bulk_create(Exam, rows())
+        return list(Exam.objects.filter(pk__gt=first_new).order_by('pk').values_list('pk', flat=True))
+
+    def create_results(self, exam_ids, student_ids, per_exam):
+        per_exam = min(per_exam, len(student_ids))
+
+        def rows():
+            for exam_id in exam_ids:
+                takers = self.random.sample(student_ids, per_exam)
+                marks = [self.random.randint(20, 100) for _ in takers]
+                grades = calculate_grades((mark, 100) for mark in marks)
+                for student_id, mark, grade in zip(takers, marks, grades):
+                    yield Result(
+                        exam_id=exam_id,
+                        student_id=student_id,
+                        marks_obtained=mark,
+                        total_marks=100,
+                        grade=grade,
+                    )
+
+        return self._bulk_create(Result, rows())
+
+    def create_materials(self, count, faculty_ids):
+        rows = (
+            StudyMaterial(
+                title=f'Material {i}',
+                description='Generated material',
+                material_type=self.random.choice(MATERIAL_TYPES),
+                file=f'study_materials/generated_{i}.pdf',
+                file_size_bytes=self.random.randint(10_000, 5_000_000),
+                mime_type='application/pdf',
+                subject=self.random.choice(SUBJECTS),
+                uploaded_by_id=self.random.choice(faculty_ids),
+                is_active=self.random.random() < ACTIVE_RATIO,
+            )
+            for i in range(count)
+        )
+        return self._bulk_create(StudyMaterial, rows)
@@ -0,0 +1,116 @@
+"""
+Versioned response cache for read-heavy list endpoints.
+
+Each model a cached view depends on has a version token in the Django cache.
+The receivers in api/signals.py replace the token after every committed
+write, so cached pages never need to be deleted: a page is keyed by the
+endpoint, the caller's visibility scope, the query parameters and the current
+versions, and stale entries simply stop being addressed and expire.
+
+The same fingerprint is sent as the ETag. A request whose If-None-Match
+matches is answered with 304 before the view runs any query or serializer.
+
+Versions live in the default cache, so multi-process deployments need a shared
+backend (Redis or Memcached) for invalidation to reach every worker.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from .replicas import primary_reads
+
+VERSION_PREFIX = 'cache-version:'
+RESPONSE_PREFIX = 'cache-response:'
+
+# User fields rendered by the cached serializers; other saves (last_login) leave caches alone
+USER_DISPLAY_FIELDS = {'username', 'first_name', 'last_name', 'role', 'is_active'}
+
+
+def _token():
+    return uuid.uuid4().hex[:12]
+
+
+def get_versions(names):
+    """Current version token for each name, creating missing ones"""
+    keys = [VERSION_PREFIX + name for name in names]
+    found = cache.get_many(keys)
+    versions = {}
+    for name, key in zip(names, keys):
+        if key not in found:
+            # add() keeps a token another process may have set in the meantime
+            cache.add(key, _token(), None)
+            found[key] = cache.get(key)
+        versions[name] = found[key]
+    return versions
+
+
+def bump(*names):
+    """Invalidate everything cached against these names once the transaction commits"""
+    def replace():
+        cache.set_many({VERSION_PREFIX + name: _token() for name in names}, None)
+    transaction.on_commit(replace)
+
+
+def user_display_changed(update_fields):
+    return not update_fields or bool(USER_DISPLAY_FIELDS.intersection(update_fields))
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match', '')
+    candidates = {value.strip() for value in header.split(',')}
+    candidates |= {value[2:] for value in candidates if value.startswith('W/')}
+    return etag in candidates or '*' in candidates
+
+
+class CachedListMixin:
+    """
+    Serve ``list()`` from the response cache.
+
+    Views set ``cache_dependencies`` to the names bumped by signals (model
+    names, e.g. ('event', 'user')) and may override ``get_cache_scope()`` to
+    return a string identifying which rows the caller can see.
+    """
+    cache_dependencies = ()
+
+    def get_cache_scope(self):
+        return 'all'
+
+    def get_cache_fingerprint(self, request):
+        versions = get_versions(self.cache_dependencies)
+        parts = [
+            request.get_host(),
+            request.path,
+            self.get_cache_scope(),
+            repr(sorted(request.query_params.lists())),
+            repr(sorted(versions.items())),
+        ]
+        return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+    def list(self, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return super().list(request, *args, **kwargs)
+
+        fingerprint = self.get_cache_fingerprint(request)
+        etag = f'"{fingerprint}"'
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = cache.get(RESPONSE_PREFIX + fingerprint)
+            if data is None:
+                # Not from the replica: the page is cached under the current versions
+                with primary_reads():
+                    response = super().list(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(RESPONSE_PREFIX + fingerprint, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+            else:
+                response = Response(data)
+        response['ETag'] = etag
+        # Let clients keep the page but revalidate it on every use
+        response['Cache-Control'] = 'private, no-cache'
+        return response
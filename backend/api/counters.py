@@ -0,0 +1,226 @@
+"""
+Incrementally maintained counters for the dashboard.
+
+Each counted model contributes to a handful of keys (global totals, active
+totals and per-owner totals). Signal receivers in api/signals.py apply the
+difference between a row's contribution before and after every save or
+delete, so ``dashboard_stats`` reads a few primary keys instead of running
+COUNT(*) queries. ``reconcile_counters`` recomputes everything from scratch
+to correct any drift.
+"""
+from collections import Counter, namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, QuerySet
+
+from accounts.models import User
+from . import stored
+from .models import DashboardCounter, Event, Exam, Result, StudyMaterial
+
+
+def user_key(user_id, name):
+    return f"user:{user_id}:{name}"
+
+
+def _event_counts(created_by_id, is_active):
+    return {'events': 1, 'events:active': int(is_active), user_key(created_by_id, 'events'): 1}
+
+
+def _exam_counts(faculty_id, is_active):
+    return {'exams': 1, 'exams:active': int(is_active), user_key(faculty_id, 'exams'): 1}
+
+
+def _result_counts(student_id, faculty_id):
+    return {'results': 1, user_key(student_id, 'results'): 1, user_key(faculty_id, 'exam_results'): 1}
+
+
+def _material_counts(uploaded_by_id, is_active):
+    return {'materials': 1, 'materials:active': int(is_active), user_key(uploaded_by_id, 'materials'): 1}
+
+
+def _user_counts():
+    return {'users': 1}
+
+
+class CountedModel(namedtuple('CountedModel', 'lookups fields state counts')):
+    """
+    How a model feeds the counters: ``lookups`` read its counted state from
+    the database, ``fields`` are the model fields that state depends on,
+    ``state`` reads the same values from an instance and ``counts`` turns
+    them into {counter key: amount}.
+    """
+
+
+COUNTED = {
+    Event: CountedModel(
+        ('created_by_id', 'is_active'), {'created_by', 'is_active'},
+        lambda event: (event.created_by_id, event.is_active),
+        _event_counts,
+    ),
+    Exam: CountedModel(
+        ('faculty_id', 'is_active'), {'faculty', 'is_active'},
+        lambda exam: (exam.faculty_id, exam.is_active),
+        _exam_counts,
+    ),
+    Result: CountedModel(
+        ('student_id', 'exam__faculty_id'), {'student', 'exam'},
+        lambda result: (result.student_id, result.exam.faculty_id),
+        _result_counts,
+    ),
+    StudyMaterial: CountedModel(
+        ('uploaded_by_id', 'is_active'), {'uploaded_by', 'is_active'},
+        lambda material: (material.uploaded_by_id, material.is_active),
+        _material_counts,
+    ),
+    User: CountedModel((), set(), lambda user: (), _user_counts),
+}
+
+for model, counted in COUNTED.items():
+    stored.register(model, *counted.lookups)
+
+# Returned by stored_state() when a save cannot change any counter
+UNCHANGED = object()
+
+
+def current_state(instance):
+    return COUNTED[type(instance)].state(instance)
+
+
+def _exam_owners(origin):
+    """{exam_id: faculty_id} for the exams whose results a delete() of `origin` can reach"""
+    if isinstance(origin, Exam):
+        return {origin.pk: origin.faculty_id}
+    if isinstance(origin, QuerySet) and origin.model is Exam:
+        exams = origin
+    elif isinstance(origin, QuerySet) and origin.model is Result:
+        exams = Exam.objects.filter(results__in=origin)
+    elif isinstance(origin, User):
+        exams = Exam.objects.filter(Q(faculty=origin) | Q(results__student=origin))
+    else:
+        return {}
+    return dict(exams.order_by().distinct().values_list('pk', 'faculty_id'))
+
+
+def deleted_state(instance, origin=None):
+    """
+    current_state() of a row about to be deleted. A delete() sends pre_delete
+    for every cascaded result, so instead of loading result.exam per row the
+    exam owners are read once per delete() call (``origin``, the object or
+    queryset delete() was called on) and shared across its rows.
+    """
+    if type(instance) is not Result or Result.exam.is_cached(instance):
+        return current_state(instance)
+    owners = getattr(origin, '_counted_exam_owners', None)
+    if owners is None:
+        owners = _exam_owners(origin)
+        if origin is not None:
+            origin._counted_exam_owners = owners
+    if instance.exam_id not in owners:
+        owners[instance.exam_id] = (
+            Exam.objects.filter(pk=instance.exam_id).values_list('faculty_id', flat=True).first()
+        )
+    return (instance.student_id, owners[instance.exam_id])
+
+
+def stored_state(instance, update_fields=None):
+    """
+    Counted state of the instance's database row: None for a new row, or
+    UNCHANGED when the save only touches fields the counters ignore.
+    """
+    counted = COUNTED[type(instance)]
+    if instance.pk is None or instance._state.adding:
+        return None
+    if not counted.lookups or (update_fields is not None and not counted.fields & set(update_fields)):
+        return UNCHANGED
+    values = stored.row(instance)
+    return None if values is None else tuple(values[lookup] for lookup in counted.lookups)
+
+
+def contribution(model, state):
+    """Counter values a row of `model` in `state` adds (None adds nothing)"""
+    if state is None:
+        return Counter()
+    return Counter(COUNTED[model].counts(*state))
+
+
+def adjust(deltas):
+    """Add each delta to its counter, creating counters on first use"""
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        if DashboardCounter.objects.filter(key=key).update(value=F('value') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                DashboardCounter.objects.create(key=key, value=delta)
+        except IntegrityError:
+            # Another writer created the row first
+            DashboardCounter.objects.filter(key=key).update(value=F('value') + delta)
+
+
+def record_change(model, before, after):
+    """Apply the difference between two counted states of one row"""
+    delta = contribution(model, after)
+    delta.subtract(contribution(model, before))
+    adjust(delta)
+
+
+def move_exam_results(exam, old_faculty_id):
+    """Re-attribute an exam's results when the exam changes owner"""
+    if old_faculty_id is None or old_faculty_id == exam.faculty_id:
+        return
+    total = exam.results.count()
+    adjust({
+        user_key(old_faculty_id, 'exam_results'): -total,
+        user_key(exam.faculty_id, 'exam_results'): total,
+    })
+
+
+def compute_all():
+    """Recompute every counter from the source tables"""
+    values = Counter()
+    values['users'] = User.objects.count()
+    for model, name, owner in (
+        (Event, 'events', 'created_by_id'),
+        (Exam, 'exams', 'faculty_id'),
+        (StudyMaterial, 'materials', 'uploaded_by_id'),
+    ):
+        totals = model.objects.aggregate(total=Count('pk'), active=Count('pk', filter=Q(is_active=True)))
+        values[name] = totals['total']
+        values[f'{name}:active'] = totals['active']
+        for owner_id, total in model.objects.values_list(owner).annotate(total=Count('pk')).order_by():
+            values[user_key(owner_id, name)] = total
+    values['results'] = Result.objects.count()
+    for student_id, total in Result.objects.values_list('student_id').annotate(total=Count('pk')).order_by():
+        values[user_key(student_id, 'results')] = total
+    for faculty_id, total in Result.objects.values_list('exam__faculty_id').annotate(total=Count('pk')).order_by():
+        values[user_key(faculty_id, 'exam_results')] = total
+    return values
+
+
+def reconcile():
+    """
+    Rewrite the counter table from compute_all().
+
+    Returns {key: (stored, actual)} for every counter that had drifted.
+    """
+    with transaction.atomic():
+        actual = compute_all()
+        stored = dict(DashboardCounter.objects.select_for_update().values_list('key', 'value'))
+        drift = {
+            key: (stored.get(key, 0), actual.get(key, 0))
+            for key in set(stored) | set(actual)
+            if stored.get(key, 0) != actual.get(key, 0)
+        }
+        DashboardCounter.objects.all().delete()
+        DashboardCounter.objects.bulk_create(
+            [DashboardCounter(key=key, value=value) for key, value in actual.items() if value],
+            batch_size=1000,
+        )
+    return drift
+
+
+def read(keys):
+    """Fetch counters by key in one query; missing counters read as zero"""
+    values = dict(DashboardCounter.objects.filter(key__in=keys).values_list('key', 'value'))
+    return {key: values.get(key, 0) for key in keys}
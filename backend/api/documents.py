@@ -0,0 +1,85 @@
+"""
+MongoDB documents mirrored for each model row.
+
+Used by the mirror receivers in api/signals.py and accounts/signals.py, and
+by api/bulkdata.py for rows loaded with bulk_create.
+"""
+from accounts.models import User
+
+from .models import Event, Exam, Result, StudyMaterial
+
+
+def user_doc(user: User):
+    return {
+        "_id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "role": user.role,
+        "student_id": user.student_id,
+        "faculty_id": user.faculty_id,
+        "phone": user.phone,
+        "address": user.address,
+        "created_at": user.created_at,
+        "updated_at": user.updated_at,
+    }
+
+
+def event_doc(event: Event):
+    return {
+        "title": event.title,
+        "description": event.description,
+        "date": event.date,
+        "location": event.location,
+        "created_by_id": event.created_by_id,
+        "created_at": event.created_at,
+        "updated_at": event.updated_at,
+        "is_active": event.is_active,
+    }
+
+
+def exam_doc(exam: Exam):
+    return {
+        "title": exam.title,
+        "description": exam.description,
+        "date": exam.date,
+        "subject": exam.subject,
+        "faculty_id": exam.faculty_id,
+        "created_at": exam.created_at,
+        "updated_at": exam.updated_at,
+        "is_active": exam.is_active,
+    }
+
+
+def result_doc(result: Result):
+    return {
+        "exam_id": result.exam_id,
+        "student_id": result.student_id,
+        "marks_obtained": float(result.marks_obtained),
+        "total_marks": float(result.total_marks),
+        "grade": result.grade,
+        "created_at": result.created_at,
+        "updated_at": result.updated_at,
+    }
+
+
+def material_doc(material: StudyMaterial):
+    try:
+        file_url = material.file.url
+    except Exception:
+        file_url = None
+    return {
+        "title": material.title,
+        "description": material.description,
+        "material_type": material.material_type,
+        "subject": material.subject,
+        "uploaded_by_id": material.uploaded_by_id,
+        "file": file_url,
+        "file_size_kb": material.file_size,
+        "checksum": material.checksum,
+        "mime_type": material.mime_type,
+        "created_at": material.created_at,
+        "updated_at": material.updated_at,
+        "is_active": material.is_active,
+    }
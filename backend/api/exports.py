@@ -0,0 +1,186 @@
+"""
+Streaming spreadsheet exports.
+
+Rows are read with QuerySet.iterator(chunk_size=EXPORT_CHUNK_SIZE), which
+uses a server-side cursor where the database supports it. They are encoded
+one chunk at a time for a StreamingHttpResponse, so memory stays flat
+however many rows are exported and the first bytes go out as soon as the
+first chunk is read.
+
+XLSX files are written without a spreadsheet library: the workbook is a zip
+of a few fixed XML parts plus one worksheet of inline strings, streamed
+through zipfile onto a non-seekable sink.
+"""
+import csv
+import io
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+
+from .models import calculate_percentage
+
+# (header, queryset lookup) for each exported result column
+RESULT_COLUMNS = [
+    ('Result ID', 'id'),
+    ('Exam ID', 'exam_id'),
+    ('Exam', 'exam__title'),
+    ('Subject', 'exam__subject'),
+    ('Exam Date', 'exam__date'),
+    ('Student ID', 'student_id'),
+    ('Username', 'student__username'),
+    ('Student Number', 'student__student_id'),
+    ('First Name', 'student__first_name'),
+    ('Last Name', 'student__last_name'),
+    ('Marks Obtained', 'marks_obtained'),
+    ('Total Marks', 'total_marks'),
+    ('Percentage', None),
+    ('Grade', 'grade'),
+    ('Remarks', 'remarks'),
+]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Spreadsheet apps run cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# Characters XML 1.0 cannot represent at all
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def result_rows(queryset):
+    """Header row, then one list of cell values per result, read in chunks"""
+    lookups = [lookup for _, lookup in RESULT_COLUMNS if lookup]
+    percentage_at = [header for header, _ in RESULT_COLUMNS].index('Percentage')
+    yield [header for header, _ in RESULT_COLUMNS]
+    # (exam, student) is the unique index, so rows come back in index order without a sort
+    rows = queryset.order_by('exam_id', 'student_id').values_list(*lookups)
+    for row in rows.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        row = list(row)
+        marks, total = row[lookups.index('marks_obtained')], row[lookups.index('total_marks')]
+        row.insert(percentage_at, calculate_percentage(marks, total))
+        yield row
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    value = str(value)
+    if value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(rows, chunk_rows=None):
+    chunk_rows = chunk_rows or settings.EXPORT_CHUNK_SIZE
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel reads the file as UTF-8
+    yield '\ufeff'.encode()
+    for count, row in enumerate(rows, 1):
+        writer.writerow([value if isinstance(value, (int, float, Decimal)) else _text(value) for value in row])
+        if count % chunk_rows == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+class _Sink:
+    """Write-only file for zipfile; the generator drains what was written"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+
+
+def _xlsx_cell(value):
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c><v>{value}</v></c>'
+    text = escape(INVALID_XML_CHARS.sub('', _text(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def stream_xlsx(rows, sheet_name='Sheet1', chunk_rows=None):
+    chunk_rows = chunk_rows or settings.EXPORT_CHUNK_SIZE
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr('xl/workbook.xml', WORKBOOK.format(name=escape(sheet_name[:31], {'"': '&quot;'})))
+        yield sink.drain()
+        # force_zip64: the size of the sheet is not known up front
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            lines = []
+            for row in rows:
+                lines.append('<row>' + ''.join(_xlsx_cell(value) for value in row) + '</row>')
+                if len(lines) >= chunk_rows:
+                    sheet.write(''.join(lines).encode())
+                    lines.clear()
+                    yield sink.drain()
+            sheet.write(''.join(lines).encode() + b'</sheetData></worksheet>')
+    yield sink.drain()
+
+
+def stream(fmt, rows, sheet_name='Sheet1'):
+    if fmt == 'xlsx':
+        return stream_xlsx(rows, sheet_name)
+    return stream_csv(rows)
@@ -0,0 +1,35 @@
+from django.db.models import Q
+from rest_framework.filters import SearchFilter
+
+from .search import get_backend
+
+
+class IndexedSearchFilter(SearchFilter):
+    """
+    ``?search=`` backed by the full-text index instead of LIKE scans.
+
+    Views map each searchable kind to the lookup it filters, e.g.
+    ``search_kinds = {'student': 'student_id', 'exam': 'exam_id'}``, and may
+    restrict a kind to some document columns with ``search_columns``, e.g.
+    ``{'exam': ['title']}``. As with SearchFilter every term has to match,
+    but any kind may match it. Terms are matched as word prefixes rather than
+    arbitrary substrings. Unlike /api/search/ the filter is neither ranked nor
+    limited, so list counts and pages cover every match.
+    """
+
+    def get_search_kinds(self, view):
+        return getattr(view, 'search_kinds', None)
+
+    def filter_queryset(self, request, queryset, view):
+        kinds = self.get_search_kinds(view)
+        terms = self.get_search_terms(request)
+        if not kinds or not terms:
+            return super().filter_queryset(request, queryset, view)
+        backend = get_backend()
+        columns = getattr(view, 'search_columns', {})
+        for term in terms:
+            condition = Q()
+            for kind, lookup in kinds.items():
+                condition |= Q(**{f'{lookup}__in': backend.matching(term, kind, columns.get(kind))})
+            queryset = queryset.filter(condition)
+        return queryset
@@ -0,0 +1,294 @@
+"""
+Per-request timing: wall time, SQL, Mongo and serializer time.
+
+InstrumentationMiddleware opens a RequestMetrics for each request in a
+context variable. Three hooks add to it:
+
+- SQL: an execute wrapper installed on every database connection when it
+  opens (connection_created), so it covers every alias and thread;
+- Mongo: api.mongo records each guarded collection call (col()/acol());
+- serializers: TimedSerializerMixin times to_representation().
+
+Outside a request the hooks find no RequestMetrics and do nothing. The
+middleware reports the figures in a Server-Timing header and adds them to
+per-route histograms, served by /api/metrics/. Histograms are kept per
+process.
+
+A request carrying ``X-Profile: <PROFILE_TOKEN>`` (or picked at random with
+PROFILE_SAMPLE_RATE) is run under cProfile and its stats are written to
+PROFILE_DIR for `python -m pstats` or snakeviz.
+"""
+import cProfile
+import hmac
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is open-ended
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+PROFILE_HEADER = 'X-Profile'
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('sql_count', 'sql_ms', 'mongo_count', 'mongo_ms', 'serialize_ms', 'serialize_depth')
+
+    def __init__(self):
+        self.sql_count = self.mongo_count = self.serialize_depth = 0
+        self.sql_ms = self.mongo_ms = self.serialize_ms = 0.0
+
+
+def record_mongo(elapsed_ms):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.mongo_count += 1
+        metrics.mongo_ms += elapsed_ms
+
+
+def _time_sql(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_count += 1
+        metrics.sql_ms += (time.perf_counter() - started) * 1000
+
+
+def install_sql_timer(sender, connection, **kwargs):
+    # Wrappers stay on the connection object across reconnects
+    if _time_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_sql)
+
+
+connection_created.connect(install_sql_timer, dispatch_uid='api.instrumentation.sql_timer')
+
+
+class TimedSerializerMixin:
+    """
+    Count to_representation() time towards the request's serializer time.
+
+    Nested serializers run inside their parent's timing and are not counted twice.
+    """
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        if metrics is None or metrics.serialize_depth:
+            return super().to_representation(instance)
+        metrics.serialize_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serialize_depth -= 1
+            metrics.serialize_ms += (time.perf_counter() - started) * 1000
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS_MS, value)] += 1
+        self.total += value
+
+    def quantile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations"""
+        rank = fraction * sum(self.counts)
+        seen = 0
+        for bound, count in zip((*BUCKETS_MS, None), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self):
+        count = sum(self.counts)
+        return {
+            'count': count,
+            'sum_ms': round(self.total, 2),
+            'mean_ms': round(self.total / count, 2) if count else None,
+            'p50_le_ms': self.quantile(0.5) if count else None,
+            'p95_le_ms': self.quantile(0.95) if count else None,
+            'p99_le_ms': self.quantile(0.99) if count else None,
+            'buckets': {
+                f'le_{bound}' if bound is not None else 'le_inf': count
+                for bound, count in zip((*BUCKETS_MS, None), self.counts)
+            },
+        }
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.sql_queries = 0
+        self.mongo_operations = 0
+        self.wall = Histogram()
+        self.sql = Histogram()
+        self.mongo = Histogram()
+        self.serialize = Histogram()
+
+    def observe(self, status_code, wall_ms, metrics):
+        self.requests += 1
+        if status_code >= 500:
+            self.errors += 1
+        self.sql_queries += metrics.sql_count
+        self.mongo_operations += metrics.mongo_count
+        self.wall.observe(wall_ms)
+        self.sql.observe(metrics.sql_ms)
+        self.mongo.observe(metrics.mongo_ms)
+        self.serialize.observe(metrics.serialize_ms)
+
+    def snapshot(self):
+        return {
+            'requests': self.requests,
+            'server_errors': self.errors,
+            'sql_queries_per_request': round(self.sql_queries / self.requests, 2) if self.requests else None,
+            'mongo_operations_per_request': (
+                round(self.mongo_operations / self.requests, 2) if self.requests else None
+            ),
+            'wall': self.wall.snapshot(),
+            'sql': self.sql.snapshot(),
+            'mongo': self.mongo.snapshot(),
+            'serialize': self.serialize.snapshot(),
+        }
+
+
+class Registry:
+    """Histograms per 'METHOD route' for the life of the process"""
+
+    def __init__(self):
+        self.routes = {}
+        self.started = timezone.now()
+        self._lock = threading.Lock()
+
+    def observe(self, key, status_code, wall_ms, metrics):
+        with self._lock:
+            route = self.routes.get(key)
+            if route is None:
+                route = self.routes[key] = RouteMetrics()
+            route.observe(status_code, wall_ms, metrics)
+
+    def snapshot(self):
+        with self._lock:
+            routes = {key: route.snapshot() for key, route in sorted(self.routes.items())}
+        return {'pid': os.getpid(), 'since': self.started, 'buckets_ms': list(BUCKETS_MS), 'routes': routes}
+
+    def reset(self):
+        with self._lock:
+            self.routes.clear()
+            self.started = timezone.now()
+
+
+registry = Registry()
+
+
+def route_key(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return f'{request.method} /{match.route}'
+
+
+def server_timing(wall_ms, metrics, profile=None):
+    entries = [
+        f'app;dur={wall_ms:.1f}',
+        f'db;desc="SQL x{metrics.sql_count}";dur={metrics.sql_ms:.1f}',
+        f'mongo;desc="Mongo x{metrics.mongo_count}";dur={metrics.mongo_ms:.1f}',
+        f'serialize;dur={metrics.serialize_ms:.1f}',
+    ]
+    if profile:
+        entries.append(f'profile;desc="{profile}"')
+    return ', '.join(entries)
+
+
+def wants_profile(request):
+    token = settings.PROFILE_TOKEN
+    header = request.headers.get(PROFILE_HEADER)
+    # Constant-time, so response timing does not reveal how much of a guess matched
+    if token and header and hmac.compare_digest(header.encode(), token.encode()):
+        return True
+    return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+
+def save_profile(profiler, request):
+    """Write the stats to PROFILE_DIR and keep only the newest PROFILE_KEEP files"""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+    name = f'{timezone.now():%Y%m%dT%H%M%S%f}-{request.method.lower()}-{slug[:60]}.prof'
+    profiler.dump_stats(os.path.join(settings.PROFILE_DIR, name))
+    profiles = sorted(entry for entry in os.listdir(settings.PROFILE_DIR) if entry.endswith('.prof'))
+    for stale in profiles[:-max(1, settings.PROFILE_KEEP)]:
+        try:
+            os.remove(os.path.join(settings.PROFILE_DIR, stale))
+        except FileNotFoundError:
+            pass
+    return name
+
+
+class InstrumentationMiddleware:
+    """Time each request and report it in Server-Timing and /api/metrics/"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.INSTRUMENTATION_ENABLED:
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        profiler = cProfile.Profile() if wants_profile(request) else None
+        started = time.perf_counter()
+        try:
+            if profiler is None:
+                response = self.get_response(request)
+            else:
+                response = profiler.runcall(self.get_response, request)
+        finally:
+            _current.reset(token)
+        profile = save_profile(profiler, request) if profiler is not None else None
+        return self.finish(request, response, started, metrics, profile)
+
+    async def __acall__(self, request):
+        if not settings.INSTRUMENTATION_ENABLED:
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        # Context variables follow the request into sync_to_async threads
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        # cProfile sees one thread only, so async requests are not profiled
+        return self.finish(request, response, started, metrics)
+
+    def finish(self, request, response, started, metrics, profile=None):
+        wall_ms = (time.perf_counter() - started) * 1000
+        key = route_key(request)
+        if key is not None:
+            registry.observe(key, response.status_code, wall_ms, metrics)
+        if settings.SERVER_TIMING_ENABLED or profile:
+            response['Server-Timing'] = server_timing(wall_ms, metrics, profile)
+        return response
@@ -0,0 +1,177 @@
+"""
+Durable background jobs stored in the ``jobs`` table.
+
+Requests call enqueue() inside their transaction, so a job exists exactly
+when the work that produced it was committed; no broker is needed. The
+``run_jobs`` management command claims due jobs in batches and hands every
+batch of one kind to its registered handler at once, which lets the email
+handler send a whole batch over a single SMTP connection. Failed jobs are
+retried with exponential backoff until max_attempts is reached.
+"""
+import logging
+import random
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# kind -> callable(list of jobs) returning {job id: error message} for the jobs that failed
+HANDLERS = {}
+
+
+def handler(kind):
+    """Register the batch handler for a job kind"""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload, delay=0, max_attempts=None):
+    return Job.objects.create(
+        kind=kind,
+        payload=payload,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number `attempts`, with 10% jitter"""
+    delay = min(settings.JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_DELAY)
+    return delay * random.uniform(1.0, 1.1)
+
+
+def _claimable(now):
+    # Running jobs whose worker died are picked up again once their lock expires
+    stale = now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    return Q(status='pending', run_at__lte=now) | Q(status='running', locked_at__lt=stale)
+
+
+def claim(limit):
+    """Mark up to `limit` due jobs as running for this worker and return them"""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    candidates = list(
+        Job.objects.filter(_claimable(now)).order_by('run_at', 'pk').values_list('pk', flat=True)[:limit]
+    )
+    if not candidates:
+        return []
+    # The conditions are re-checked by the UPDATE, so concurrent workers never claim the same job
+    Job.objects.filter(_claimable(now), pk__in=candidates).update(
+        status='running', locked_at=now, locked_by=token, attempts=F('attempts') + 1,
+    )
+    return list(Job.objects.filter(locked_by=token, status='running').order_by('run_at', 'pk'))
+
+
+def run_pending(limit=None):
+    """Claim and run one batch of due jobs; return how many were run"""
+    jobs = claim(limit or settings.JOB_BATCH_SIZE)
+    by_kind = {}
+    for job in jobs:
+        by_kind.setdefault(job.kind, []).append(job)
+    for kind, batch in by_kind.items():
+        func = HANDLERS.get(kind)
+        if func is None:
+            errors = {job.pk: f'No handler registered for {kind!r}' for job in batch}
+        else:
+            try:
+                errors = func(batch) or {}
+            except Exception as exc:
+                logger.exception("Job handler %s failed", kind)
+                errors = {job.pk: f'{type(exc).__name__}: {exc}' for job in batch}
+        for job in batch:
+            finish(job, errors.get(job.pk))
+    return len(jobs)
+
+
+def finish(job, error=None):
+    now = timezone.now()
+    job.locked_at = None
+    job.locked_by = ''
+    if error is None:
+        job.status = 'done'
+        job.last_error = ''
+        job.finished_at = now
+    elif job.attempts >= job.max_attempts:
+        job.status = 'failed'
+        job.last_error = error
+        job.finished_at = now
+        logger.error("Job %s gave up after %d attempt(s): %s", job, job.attempts, error)
+    else:
+        job.status = 'pending'
+        job.last_error = error
+        job.run_at = now + timedelta(seconds=backoff(job.attempts))
+    job.save(update_fields=['status', 'last_error', 'finished_at', 'run_at', 'locked_at', 'locked_by'])
+
+
+def prune(days=None):
+    """Delete finished jobs older than JOB_RETENTION_DAYS; failed jobs are kept for inspection"""
+    cutoff = timezone.now() - timedelta(days=days if days is not None else settings.JOB_RETENTION_DAYS)
+    deleted, _ = Job.objects.filter(status='done', finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def stats():
+    """Queue depth by status and the age of the oldest pending job, in one query"""
+    now = timezone.now()
+    counts = Job.objects.aggregate(
+        pending=Count('pk', filter=Q(status='pending')),
+        due=Count('pk', filter=Q(status='pending', run_at__lte=now)),
+        running=Count('pk', filter=Q(status='running')),
+        failed=Count('pk', filter=Q(status='failed')),
+        done=Count('pk', filter=Q(status='done')),
+        oldest_pending=Min('created_at', filter=Q(status='pending')),
+    )
+    oldest = counts.pop('oldest_pending')
+    counts['oldest_pending_seconds'] = round((now - oldest).total_seconds(), 1) if oldest else None
+    return counts
+
+
+# Handlers
+
+def send_email_later(subject, body, to, reply_to=None, from_email=None):
+    """Queue an email for the `send_email` handler; call inside the request's transaction"""
+    return enqueue('send_email', {
+        'subject': subject,
+        'body': body,
+        'to': list(to),
+        'reply_to': [reply_to] if reply_to else [],
+        'from_email': from_email or settings.DEFAULT_FROM_EMAIL,
+    })
+
+
+@handler('send_email')
+def send_emails(jobs):
+    # One SMTP connection (and TLS handshake) for the whole batch
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        return {job.pk: f'Could not connect to the mail server: {exc}' for job in jobs}
+    errors = {}
+    try:
+        for job in jobs:
+            payload = job.payload
+            message = EmailMessage(
+                payload['subject'],
+                payload['body'],
+                payload.get('from_email') or settings.DEFAULT_FROM_EMAIL,
+                payload['to'],
+                reply_to=payload.get('reply_to') or None,
+                connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as exc:
+                errors[job.pk] = f'{type(exc).__name__}: {exc}'
+    finally:
+        connection.close()
+    return errors
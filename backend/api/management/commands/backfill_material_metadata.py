@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from api.models import StudyMaterial
+
+
+class Command(BaseCommand):
+    help = 'Store file size, checksum and MIME type for study materials uploaded before they were tracked'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute metadata for every material, not only rows without a checksum',
+        )
+        parser.add_argument('--chunk-size', type=int, default=200, help='Rows fetched per query')
+
+    def handle(self, *args, **options):
+        materials = StudyMaterial.objects.exclude(file='').order_by('pk')
+        if not options['all']:
+            materials = materials.filter(checksum='')
+
+        updated = missing = 0
+        for material in materials.iterator(chunk_size=options['chunk_size']):
+            try:
+                material.capture_file_metadata()
+            except (FileNotFoundError, OSError) as exc:
+                missing += 1
+                self.stderr.write(f'Skipped material {material.pk} ({material.file.name}): {exc}')
+                continue
+            material.save(update_fields=['file_size_bytes', 'checksum', 'mime_type'])
+            updated += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Updated metadata for {updated} material(s); {missing} file(s) missing')
+        )
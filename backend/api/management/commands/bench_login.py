@@ -0,0 +1,91 @@
+import os
+import statistics
+import threading
+import time
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.hashing import LoginOverloaded, VerificationPool, verify
+
+HASHERS = {
+    'pbkdf2': 'pbkdf2_sha256',
+    'argon2': 'argon2',
+}
+
+
+class Command(BaseCommand):
+    help = ('Measure password verification throughput (logins per second per core) for each hasher, '
+            'serially and through the bounded login hashing pool under concurrent load.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200, help='Verifications per measurement')
+        parser.add_argument('--concurrency', type=int, default=(os.cpu_count() or 1) * 8,
+                            help='Simultaneous clients hitting the pool')
+        parser.add_argument('--workers', type=int, default=settings.LOGIN_HASH_WORKERS, help='Pool threads')
+        parser.add_argument('--queue', type=int, default=settings.LOGIN_HASH_QUEUE, help='Pool wait queue size')
+        parser.add_argument('--hasher', choices=['all', 'default', *HASHERS], default='all')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        names = {'all': list(HASHERS), 'default': [None]}.get(options['hasher'], [options['hasher']])
+        cpus = os.cpu_count() or 1
+        self.stdout.write(f'{cpus} CPU(s), pool of {options["workers"]} worker(s), '
+                          f'queue {options["queue"]}, {options["concurrency"]} concurrent client(s)')
+        self.stdout.write(f'{"hasher":16} {"serial/s":>9} {"pool/s":>9} {"per core/s":>11} '
+                          f'{"p50 ms":>8} {"p95 ms":>8} {"shed":>6}')
+        for name in names:
+            if name == 'argon2' and find_spec('argon2') is None:
+                self.stdout.write(f'{"argon2":16} skipped (pip install argon2-cffi)')
+                continue
+            hasher = get_hasher(HASHERS[name] if name else 'default')
+            encoded = hasher.encode('bench-password', hasher.salt())
+            serial = self.serial_rate(encoded, max(10, options['logins'] // 10))
+            rate, latencies, shed = self.pool_rate(encoded, options)
+            busy_cores = min(options['workers'], cpus)
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0
+            self.stdout.write(
+                f'{hasher.algorithm:16} {serial:9.1f} {rate:9.1f} {rate / busy_cores:11.1f} '
+                f'{statistics.median(latencies) if latencies else 0:8.1f} {p95:8.1f} {shed:6d}'
+            )
+
+    def serial_rate(self, encoded, count):
+        started = time.perf_counter()
+        for _ in range(count):
+            verify('bench-password', encoded)
+        return count / (time.perf_counter() - started)
+
+    def pool_rate(self, encoded, options):
+        pool = VerificationPool(options['workers'], options['queue'], settings.LOGIN_HASH_TIMEOUT)
+        remaining = [options['logins']]
+        lock = threading.Lock()
+        latencies = []
+        shed = [0]
+
+        def client():
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                started = time.perf_counter()
+                try:
+                    pool.run(verify, 'bench-password', encoded)
+                except LoginOverloaded:
+                    with lock:
+                        shed[0] += 1
+                    continue
+                with lock:
+                    latencies.append((time.perf_counter() - started) * 1000)
+
+        threads = [threading.Thread(target=client) for _ in range(options['concurrency'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return len(latencies) / elapsed, sorted(latencies), shed[0]
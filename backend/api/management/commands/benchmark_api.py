@@ -0,0 +1,292 @@
+import io
+import json
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import nullcontext
+from importlib.util import find_spec
+from unittest import mock
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.authentication import ClaimsRefreshToken
+from api import mongo as mongo_module
+from api.mirror import mirror
+from api.models import Event, Exam, Result, StudyMaterial
+
+User = get_user_model()
+
+PERCENTILES = (50, 90, 95, 99)
+
+# One timed request; path and data may be callables of the iteration number
+Endpoint = namedtuple('Endpoint', 'name role method path data multipart', defaults=(None, False))
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the REST API hot paths (latency percentiles, queries and allocations per request) '
+            'on datasets generated by seed_data, in a throwaway SQLite test database with mongomock '
+            'standing in for MongoDB. Writes JSON for comparing commits.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='500,5000',
+                            help='Comma-separated numbers of students; one dataset is generated per size')
+        parser.add_argument('--exams', type=int, help='Exams per dataset (default: one per 10 students)')
+        parser.add_argument('--results-per-exam', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=50, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per endpoint')
+        parser.add_argument('--alloc-repeat', type=int, default=5,
+                            help='Requests per endpoint traced with tracemalloc (separately from the timing)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--endpoint', action='append', default=[],
+                            help='Only run endpoints whose name contains this (repeatable)')
+        parser.add_argument('--with-cache', action='store_true',
+                            help='Keep the response cache on (by default the views themselves are measured)')
+        parser.add_argument('--real-mongo', action='store_true',
+                            help='Use MONGO_URI instead of mongomock (writes go to that server)')
+        parser.add_argument('--output', metavar='FILE', help='Write the results as JSON')
+        parser.add_argument('--compare', metavar='FILE', help='JSON from an earlier run to compare against')
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help='Percent p95 slowdown that counts as a regression in --compare')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        baseline = self.load(options['compare']) if options['compare'] else None
+
+        report = {'meta': self.meta(options), 'sizes': {}}
+        with self.mongo_stand_in(options['real_mongo']):
+            for size in sizes:
+                report['sizes'][str(size)] = self.run_size(size, options)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+            self.stdout.write(f'Results written to {options["output"]}')
+        if baseline is not None:
+            regressions = self.compare(baseline, report, options['threshold'])
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s): ' + ', '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def meta(self, options):
+        return {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'mongo': 'server' if options['real_mongo'] else 'mongomock',
+            'response_cache': options['with_cache'],
+            'repeat': options['repeat'],
+            'seed': options['seed'],
+            'results_per_exam': options['results_per_exam'],
+        }
+
+    def load(self, path):
+        try:
+            with open(path, encoding='utf-8') as baseline:
+                return json.load(baseline)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Cannot read baseline {path}: {exc}')
+
+    def mongo_stand_in(self, real):
+        if real:
+            return nullcontext()
+        if find_spec('mongomock') is None:
+            raise CommandError('mongomock is not installed (pip install mongomock), or pass --real-mongo')
+        import mongomock
+        # The manager opens its client lazily; drop any open one so the stand-in is used
+        mongo_module.mongo.close()
+        return mock.patch.object(mongo_module, 'MongoClient', mongomock.MongoClient)
+
+    def run_size(self, size, options):
+        old_name = connection.settings_dict['NAME']
+        media_root = tempfile.mkdtemp()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # The test database exists on the primary only, so list views must not read from a replica
+            with override_settings(MEDIA_ROOT=media_root, ALLOWED_HOSTS=['*'], THROTTLE_ENABLED=False,
+                                   RESPONSE_CACHE_ENABLED=options['with_cache'], DATABASE_REPLICA_ALIAS=None):
+                started = time.perf_counter()
+                call_command(
+                    'seed_data', students=size, exams=options['exams'] or max(1, size // 10),
+                    results_per_exam=options['results_per_exam'], seed=options['seed'],
+                    prefix='bench', skip_mongo=True, stdout=io.StringIO(),
+                )
+                self.stdout.write(f'\n{size} students: dataset of {Result.objects.count()} results ready '
+                                  f'in {time.perf_counter() - started:.1f}s')
+                self.stdout.write(f'{"endpoint":28} {"p50 ms":>8} {"p90 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+                                  f'{"queries":>8} {"peak KiB":>9}')
+                results = {}
+                for endpoint in self.endpoints():
+                    if options['endpoint'] and not any(part in endpoint.name for part in options['endpoint']):
+                        continue
+                    results[endpoint.name] = result = self.measure(endpoint, options)
+                    self.stdout.write(
+                        f'{endpoint.name:28} {result["p50_ms"]:8.2f} {result["p90_ms"]:8.2f} '
+                        f'{result["p95_ms"]:8.2f} {result["p99_ms"]:8.2f} {result["queries"]:8d} '
+                        f'{result["peak_kib"]:9.1f}'
+                    )
+                mirror.flush()
+                return results
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def endpoints(self):
+        """Hot paths of api/urls.py and accounts/urls.py against the generated dataset"""
+        admin = User.objects.create_user('bench_admin', role='admin')
+        faculty = User.objects.filter(role='faculty').order_by('pk').first()
+        student = User.objects.filter(role='student', results__isnull=False).order_by('pk').first()
+        self.clients = {role: self.client_for(user) for role, user in
+                        (('admin', admin), ('faculty', faculty), ('student', student))}
+        event = Event.objects.order_by('pk').first()
+        exam = Exam.objects.filter(faculty=faculty).order_by('pk').first()
+        result = Result.objects.filter(student=student).order_by('pk').first()
+        material = StudyMaterial.objects.order_by('pk').first()
+        # Results are unique per (exam, student), so each created result goes to a new student
+        target = Exam.objects.create(title='Benchmark target', date=timezone.now(), subject='Benchmarks',
+                                     faculty=faculty)
+        students = list(User.objects.filter(role='student').order_by('pk').values_list('pk', flat=True))
+        date = timezone.now().isoformat()
+
+        endpoints = []
+        for resource, pk in (('events', event.pk), ('exams', exam.pk), ('results', result.pk),
+                             ('materials', material.pk)):
+            for role in ('student', 'faculty', 'admin'):
+                endpoints.append(Endpoint(f'{resource}.list[{role}]', role, 'get', f'/api/{resource}/'))
+            # Only the student a result belongs to may read it
+            detail_role = 'student' if resource == 'results' else 'admin'
+            endpoints.append(Endpoint(f'{resource}.detail', detail_role, 'get', f'/api/{resource}/{pk}/'))
+        endpoints += [
+            Endpoint('events.create', 'faculty', 'post', '/api/events/',
+                     lambda i: {'title': f'Bench event {i}', 'description': 'Benchmark', 'date': date,
+                                'location': 'Hall 1'}),
+            Endpoint('exams.create', 'faculty', 'post', '/api/exams/',
+                     lambda i: {'title': f'Bench exam {i}', 'description': 'Benchmark', 'date': date,
+                                'subject': 'Benchmarks'}),
+            Endpoint('results.create', 'faculty', 'post', '/api/results/',
+                     lambda i: {'exam': target.pk, 'student': students[i % len(students)],
+                                'marks_obtained': 40 + i % 60, 'total_marks': 100}),
+            Endpoint('materials.create', 'faculty', 'post', '/api/materials/',
+                     lambda i: {'title': f'Bench material {i}', 'material_type': 'lecture_notes',
+                                'subject': 'Benchmarks',
+                                'file': SimpleUploadedFile(f'bench_{i}.pdf', b'%PDF-1.4 benchmark',
+                                                           content_type='application/pdf')},
+                     multipart=True),
+            Endpoint('dashboard_stats[admin]', 'admin', 'get', '/api/dashboard-stats/'),
+            Endpoint('dashboard_stats[student]', 'student', 'get', '/api/dashboard-stats/'),
+            # seed_data gives generated students the password student123
+            Endpoint('login_view', None, 'post', '/api/auth/login/',
+                     {'username': student.username, 'password': 'student123'}),
+            Endpoint('post_message', 'student', 'post', '/api/messages/',
+                     lambda i: {'name': 'Bench', 'email': 'bench@example.com', 'message': f'Benchmark {i}'}),
+        ]
+        return endpoints
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')
+        return client
+
+    def request(self, endpoint, iteration):
+        client = self.clients[endpoint.role] if endpoint.role else APIClient()
+        data = endpoint.data(iteration) if callable(endpoint.data) else endpoint.data
+        if endpoint.method == 'get':
+            return client.get(endpoint.path)
+        return client.post(endpoint.path, data, format='multipart' if endpoint.multipart else 'json')
+
+    def measure(self, endpoint, options):
+        iteration = 0
+
+        def call():
+            nonlocal iteration
+            response = self.request(endpoint, iteration)
+            iteration += 1
+            if response.status_code >= 400:
+                raise CommandError(f'{endpoint.name} returned {response.status_code}: {response.content[:200]!r}')
+            return response
+
+        for _ in range(options['warmup']):
+            call()
+        latencies = []
+        queries = []
+        for _ in range(options['repeat']):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                call()
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+
+        peaks = []
+        allocated = []
+        tracemalloc.start()
+        try:
+            for _ in range(options['alloc_repeat']):
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+                call()
+                current, peak = tracemalloc.get_traced_memory()
+                peaks.append((peak - before) / 1024)
+                allocated.append((current - before) / 1024)
+        finally:
+            tracemalloc.stop()
+
+        result = {f'p{q}_ms': round(self.percentile(sorted(latencies), q), 3) for q in PERCENTILES}
+        result.update({
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'queries': int(statistics.median(queries)),
+            'max_queries': max(queries),
+            'peak_kib': round(statistics.median(peaks), 1) if peaks else 0.0,
+            'retained_kib': round(statistics.median(allocated), 1) if allocated else 0.0,
+            'requests': len(latencies),
+        })
+        return result
+
+    @staticmethod
+    def percentile(ordered, q):
+        """Linear interpolation between closest ranks"""
+        position = (len(ordered) - 1) * q / 100
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+    def compare(self, baseline, report, threshold):
+        """Print p95 and query deltas per endpoint; return the regressions"""
+        regressions = []
+        self.stdout.write(f'\nCompared with {baseline["meta"].get("created", "baseline")}')
+        self.stdout.write(f'{"size":>7} {"endpoint":28} {"p95 ms":>20} {"change":>8} {"queries":>10}')
+        for size, results in report['sizes'].items():
+            before_size = baseline['sizes'].get(size, {})
+            for name, after in results.items():
+                before = before_size.get(name)
+                if before is None:
+                    continue
+                change = (after['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+                flags = []
+                if change > threshold:
+                    flags.append('slower')
+                if after['queries'] > before['queries']:
+                    flags.append('queries')
+                self.stdout.write(
+                    f'{size:>7} {name:28} {before["p95_ms"]:8.2f} -> {after["p95_ms"]:8.2f} {change:+7.1f}% '
+                    f'{before["queries"]:4d} -> {after["queries"]:<4d} {" ".join(flags)}'
+                )
+                if flags:
+                    regressions.append(f'{name}@{size} ({", ".join(flags)})')
+        return regressions
@@ -0,0 +1,115 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.bulkdata import DatasetGenerator
+from api.mirror import mirror
+from api.models import Event, Exam, Result, StudyMaterial
+
+User = get_user_model()
+
+INDEXED_MODELS = [Event, Exam, Result, StudyMaterial, User]
+
+
+class Command(BaseCommand):
+    help = ('Compare query plans and latency of the API hot paths with and without the '
+            'composite indexes, on a generated dataset in a throwaway test database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000, help='Number of users (5%% faculty)')
+        parser.add_argument('--results', type=int, default=1_000_000, help='Approximate number of results')
+        parser.add_argument('--results-per-exam', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with mirror.suspended():
+                self.populate(options)
+                self.run(options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def populate(self, options):
+        faculty = max(1, options['users'] // 20)
+        per_exam = options['results_per_exam']
+        exams = max(1, options['results'] // per_exam)
+        self.stdout.write(f'Generating {options["users"]} users, {exams} exams and '
+                          f'{exams * per_exam} results...')
+        started = time.perf_counter()
+        DatasetGenerator(seed=options['seed'], log=self.stdout.write if options['verbosity'] > 1 else None).generate(
+            students=options['users'] - faculty,
+            faculty=faculty,
+            exams=exams,
+            results_per_exam=per_exam,
+            events=exams,
+            materials=exams,
+        )
+        with connection.cursor() as cursor:
+            # Give the planner row statistics, as a long-running database would have
+            cursor.execute('ANALYZE')
+        self.stdout.write(f'Dataset ready in {time.perf_counter() - started:.1f}s')
+
+    def hot_paths(self):
+        """The querysets behind each list view, as api/views.py builds them"""
+        faculty = User.objects.filter(role='faculty').order_by('pk').first()
+        student = User.objects.filter(role='student', results__isnull=False).order_by('pk').first()
+        return [
+            ('events (student)', Event.objects.filter(is_active=True).order_by('-date')),
+            ('events (admin)', Event.objects.order_by('-date')),
+            ('events by creator', Event.objects.filter(created_by=faculty).order_by('-date')),
+            ('exams (student)', Exam.objects.filter(is_active=True).order_by('-date')),
+            ('exams (faculty)', Exam.objects.filter(faculty=faculty).order_by('-date')),
+            ('results (student)', Result.objects.filter(student=student).order_by('-created_at')),
+            ('results (faculty)', Result.objects.filter(exam__faculty=faculty).order_by('-created_at')),
+            ('results (admin)', Result.objects.order_by('-created_at')),
+            ('materials (student)', StudyMaterial.objects.filter(is_active=True).order_by('-created_at')),
+            ('materials (faculty)', StudyMaterial.objects.filter(uploaded_by=faculty).order_by('-created_at')),
+            ('students roster', User.objects.filter(role='student').order_by('first_name', 'last_name')),
+        ]
+
+    def measure(self, queryset, repeat):
+        plan = queryset[:20].explain()
+        list(queryset[:20])  # warm the page cache before timing
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset[:20])
+            timings.append(time.perf_counter() - started)
+        return plan, statistics.median(timings) * 1000
+
+    def run(self, repeat):
+        paths = self.hot_paths()
+        with_indexes = {name: self.measure(qs, repeat) for name, qs in paths}
+        self.set_indexes(enabled=False)
+        try:
+            without_indexes = {name: self.measure(qs, repeat) for name, qs in paths}
+        finally:
+            self.set_indexes(enabled=True)
+
+        self.stdout.write('')
+        self.stdout.write(f'{"query":22} {"no index ms":>12} {"indexed ms":>12} {"speedup":>9}')
+        for name, _ in paths:
+            before = without_indexes[name][1]
+            after = with_indexes[name][1]
+            speedup = before / after if after else float('inf')
+            self.stdout.write(f'{name:22} {before:12.3f} {after:12.3f} {speedup:8.1f}x')
+        for name, _ in paths:
+            self.stdout.write('')
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write('  without indexes: ' + without_indexes[name][0].replace('\n', '\n    '))
+            self.stdout.write('  with indexes:    ' + with_indexes[name][0].replace('\n', '\n    '))
+
+    def set_indexes(self, enabled):
+        with connection.schema_editor() as editor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    if enabled:
+                        editor.add_index(model, index)
+                    else:
+                        editor.remove_index(model, index)
@@ -0,0 +1,199 @@
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.authentication import ClaimsRefreshToken
+from api.bulkdata import DatasetGenerator
+from api.mirror import mirror
+from api.models import Exam
+
+User = get_user_model()
+
+READ_PATHS = ['/api/results/', '/api/exams/', '/api/events/', '/api/dashboard-stats/']
+
+
+class Command(BaseCommand):
+    help = ('Measure API read throughput on a file-backed SQLite database while marks sheets are being '
+            'entered, with the default SQLite settings and with the SQLITE_TUNED profile (WAL and pragmas).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='default,tuned', help='Comma-separated: default, tuned')
+        parser.add_argument('--readers', type=int, default=4, help='Processes issuing list and dashboard GETs')
+        parser.add_argument('--writers', type=int, default=1, help='Processes entering results')
+        parser.add_argument('--writes', choices=['bulk', 'single'], default='bulk',
+                            help='Marks sheets through /api/results/bulk/, or one POST /api/results/ per row')
+        parser.add_argument('--batch', type=int, default=200, help='Rows per marks sheet')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per phase')
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--exams', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The default database is not SQLite')
+        profiles = [profile.strip() for profile in options['profiles'].split(',')]
+        unknown = set(profiles) - {'default', 'tuned'}
+        if unknown:
+            raise CommandError(f'Unknown profile(s): {", ".join(sorted(unknown))}')
+
+        self.stdout.write(f'{options["readers"]} reader(s), {options["writers"]} {options["writes"]} writer(s), '
+                          f'{options["duration"]:.0f}s per phase')
+        self.stdout.write(f'{"profile":8} {"phase":13} {"reads/s":>9} {"p50 ms":>8} {"p95 ms":>8} '
+                          f'{"rows/s":>8} {"write p95":>10} {"errors":>7}')
+        for profile in profiles:
+            for phase, result in self.run_profile(profile == 'tuned', options):
+                self.stdout.write(
+                    f'{profile:8} {phase:13} {result["reads_per_s"]:9.1f} {result["read_p50"]:8.1f} '
+                    f'{result["read_p95"]:8.1f} {result["rows_per_s"]:8.1f} {result["write_p95"]:10.1f} '
+                    f'{result["errors"]:7d}'
+                )
+
+    def run_profile(self, tuned, options):
+        """A fresh file-backed test database per profile; journal_mode=WAL persists in the file"""
+        directory = tempfile.mkdtemp()
+        old_name = connection.settings_dict['NAME']
+        old_test_name = connection.settings_dict['TEST'].get('NAME')
+        # A file rather than the usual in-memory test database, so journaling and fsyncs are real
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        try:
+            with override_settings(SQLITE_TUNED=tuned, ALLOWED_HOSTS=['*'], THROTTLE_ENABLED=False,
+                                   RESPONSE_CACHE_ENABLED=False, DATABASE_REPLICA_ALIAS=None), mirror.suspended():
+                connection.close()
+                connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                # Reconnect so the pragmas of this profile apply
+                connection.close()
+                self.populate(options)
+                connection.close()
+                return [
+                    ('reads only', self.run_phase(options, writers=0)),
+                    ('reads+writes', self.run_phase(options, writers=options['writers'])),
+                ]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            connection.settings_dict['TEST']['NAME'] = old_test_name
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def populate(self, options):
+        DatasetGenerator(seed=options['seed']).generate(
+            students=options['students'],
+            faculty=max(1, options['students'] // 50),
+            exams=options['exams'],
+            results_per_exam=min(50, options['students']),
+            events=options['exams'],
+        )
+        self.faculty = User.objects.filter(role='faculty').order_by('pk').first()
+        self.student_ids = list(User.objects.filter(role='student').order_by('pk').values_list('pk', flat=True))
+        self.token = str(ClaimsRefreshToken.for_user(self.faculty).access_token)
+
+    def client(self):
+        client = APIClient(raise_request_exception=False)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        return client
+
+    def run_phase(self, options, writers):
+        """Readers and writers in separate processes, as under a multi-worker server"""
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        deadline = time.time() + options['duration']
+        workers = [context.Process(target=self.work, args=(self.read, i, deadline, options, results))
+                   for i in range(options['readers'])]
+        workers += [context.Process(target=self.work, args=(self.write, i, deadline, options, results))
+                    for i in range(writers)]
+        # Children must open their own connections
+        connections.close_all()
+        started = time.time()
+        for worker in workers:
+            worker.start()
+        reports = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        elapsed = time.time() - started
+
+        reads = sorted(latency for report in reports if report['kind'] == 'read' for latency in report['latencies'])
+        writes = sorted(latency for report in reports if report['kind'] == 'write' for latency in report['latencies'])
+
+        def p95(values):
+            return values[min(len(values) - 1, int(len(values) * 0.95))] if values else 0.0
+
+        return {
+            'reads_per_s': len(reads) / elapsed,
+            'read_p50': statistics.median(reads) if reads else 0.0,
+            'read_p95': p95(reads),
+            'rows_per_s': sum(report['rows'] for report in reports) / elapsed,
+            'write_p95': p95(writes),
+            'errors': sum(report['errors'] for report in reports),
+        }
+
+    def work(self, task, number, deadline, options, results):
+        try:
+            report = task(number, deadline, options)
+        except Exception as exc:
+            report = {'kind': task.__name__, 'latencies': [], 'rows': 0, 'errors': 1, 'failure': repr(exc)}
+        finally:
+            connections.close_all()
+        results.put(report)
+
+    def read(self, number, deadline, options):
+        client = self.client()
+        latencies = []
+        errors = 0
+        i = number
+        while time.time() < deadline:
+            started = time.perf_counter()
+            response = client.get(READ_PATHS[i % len(READ_PATHS)])
+            if response.status_code == 200:
+                latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                errors += 1
+            i += 1
+        return {'kind': 'read', 'latencies': latencies, 'rows': 0, 'errors': errors}
+
+    def write(self, number, deadline, options):
+        client = self.client()
+        latencies = []
+        rows = errors = 0
+        sheet = number
+        while time.time() < deadline:
+            sheet += options['writers']
+            try:
+                exam = Exam.objects.create(title=f'Benchmark sheet {sheet}', date=timezone.now(),
+                                           subject='Benchmarks', faculty=self.faculty)
+            except DatabaseError:
+                errors += 1
+                continue
+            students = [self.student_ids[(sheet + i) % len(self.student_ids)]
+                        for i in range(min(options['batch'], len(self.student_ids)))]
+            marks = [40 + (sheet + i) % 60 for i in range(len(students))]
+            started = time.perf_counter()
+            if options['writes'] == 'bulk':
+                response = client.post('/api/results/bulk/', {'exam': exam.pk, 'results': [
+                    {'student': student, 'marks_obtained': mark, 'total_marks': 100}
+                    for student, mark in zip(students, marks)
+                ]}, format='json')
+                if response.status_code in (200, 201, 207):
+                    rows += len(students)
+                else:
+                    errors += 1
+            else:
+                for student, mark in zip(students, marks):
+                    response = client.post('/api/results/', {
+                        'exam': exam.pk, 'student': student, 'marks_obtained': mark, 'total_marks': 100,
+                    }, format='json')
+                    if response.status_code == 201:
+                        rows += 1
+                    else:
+                        errors += 1
+                    if time.time() >= deadline:
+                        break
+            latencies.append((time.perf_counter() - started) * 1000)
+        return {'kind': 'write', 'latencies': latencies, 'rows': rows, 'errors': errors}
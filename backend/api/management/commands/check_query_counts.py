@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import get_runner
+
+TEST_LABEL = 'api.tests.ListQueryCountTests'
+
+
+class Command(BaseCommand):
+    help = ('Fail when an API list endpoint issues more queries as its page grows (N+1 guard). '
+            f'Runs {TEST_LABEL}, which is also part of "manage.py test".')
+
+    def handle(self, *args, **options):
+        runner = get_runner(settings)(verbosity=options['verbosity'], interactive=False)
+        if runner.run_tests([TEST_LABEL]):
+            raise CommandError('Query count grows with page size')
+        self.stdout.write(self.style.SUCCESS('Query counts are independent of page size'))
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Target:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        if parts.scheme != 'http' or not parts.hostname:
+            raise CommandError(f'Only plain http:// URLs are supported: {url}')
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+
+    def request(self, method, body=None, token=None):
+        lines = [f'{method} {self.path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Connection: keep-alive']
+        if token:
+            lines.append(f'Authorization: Bearer {token}')
+        if body is not None:
+            lines += ['Content-Type: application/json', f'Content-Length: {len(body)}']
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode() + (body or b'')
+
+
+async def read_response(reader):
+    """Return (status, body, keep_alive) for one HTTP/1.1 response"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed by server')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = b''
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            chunk = await reader.readexactly(size + 2)
+            if not size:
+                break
+            body += chunk[:-2]
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    else:
+        body = await reader.read()
+        return status, body, False
+    connection = headers.get('connection', '').lower()
+    if status_line.startswith(b'HTTP/1.0'):
+        return status, body, connection == 'keep-alive'
+    return status, body, connection != 'close'
+
+
+class Command(BaseCommand):
+    help = ('Measure how many concurrent connections a running server sustains on one endpoint, '
+            'e.g. the WSGI deployment against the ASGI one with --compare.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Endpoint to load, e.g. http://127.0.0.1:8000/api/messages/')
+        parser.add_argument('--compare', metavar='URL', help='Same endpoint on a second server')
+        parser.add_argument('--method', default='GET')
+        parser.add_argument('--data', help='JSON request body (sent with POST/PUT/PATCH)')
+        parser.add_argument('--token', help='Bearer access token')
+        parser.add_argument('--login', metavar='USERNAME:PASSWORD',
+                            help='Log in through /api/auth/login/ on each server to get a token')
+        parser.add_argument('--levels', default='10,50,100,250,500',
+                            help='Comma-separated numbers of concurrent connections')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per level')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Seconds before a request counts as timed out')
+        parser.add_argument('--slo', type=float, default=500.0,
+                            help='p95 latency (ms) a level must stay under to count towards capacity')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['levels'].split(',')]
+        except ValueError:
+            raise CommandError('--levels must be comma-separated integers')
+        body = None
+        if options['data'] is not None:
+            try:
+                body = json.dumps(json.loads(options['data'])).encode()
+            except ValueError as exc:
+                raise CommandError(f'--data is not valid JSON: {exc}')
+
+        targets = [Target(options['url'])] + ([Target(options['compare'])] if options['compare'] else [])
+        summary = {}
+        for target in targets:
+            token = options['token'] or (self.login(target, options['login']) if options['login'] else None)
+            self.stdout.write(f'\n{target.url}')
+            self.stdout.write(f'{"conns":>6} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+                              f'{"errors":>7} {"429":>6} {"timeouts":>9}')
+            capacity = 0
+            for level in levels:
+                result = asyncio.run(self.run_level(target, level, options, body, token))
+                self.stdout.write(
+                    f'{level:6d} {result["rps"]:9.1f} {result["p50"]:8.1f} {result["p95"]:8.1f} '
+                    f'{result["p99"]:8.1f} {result["errors"]:7d} {result["throttled"]:6d} {result["timeouts"]:9d}'
+                )
+                healthy = result['ok'] and result['error_rate'] < 0.01 and result['p95'] <= options['slo']
+                if healthy:
+                    capacity = level
+            summary[target.url] = capacity
+            self.stdout.write(f'Sustained {capacity} concurrent connection(s) within a p95 of {options["slo"]:.0f} ms')
+
+        if len(targets) == 2:
+            first, second = (summary[target.url] for target in targets)
+            self.stdout.write(f'\nCapacity: {first} vs {second} concurrent connection(s)')
+
+    def login(self, target, credentials):
+        username, _, password = credentials.partition(':')
+        login = Target(f'http://{target.host}:{target.port}/api/auth/login/')
+        body = json.dumps({'username': username, 'password': password}).encode()
+
+        async def fetch():
+            reader, writer = await asyncio.open_connection(login.host, login.port)
+            try:
+                writer.write(login.request('POST', body))
+                await writer.drain()
+                return await read_response(reader)
+            finally:
+                writer.close()
+
+        status, payload, _ = asyncio.run(fetch())
+        if status != 200:
+            raise CommandError(f'Login on {target.host}:{target.port} failed with {status}: {payload[:200]!r}')
+        return json.loads(payload)['tokens']['access']
+
+    async def run_level(self, target, connections, options, body, token):
+        request = target.request(options['method'].upper(), body, token)
+        deadline = time.monotonic() + options['duration']
+        latencies = []
+        counts = {'attempts': 0, 'errors': 0, 'throttled': 0, 'timeouts': 0}
+
+        async def client():
+            reader = writer = None
+            while time.monotonic() < deadline:
+                counts['attempts'] += 1
+                started = time.perf_counter()
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.wait_for(
+                            asyncio.open_connection(target.host, target.port), options['timeout'])
+                    writer.write(request)
+                    await writer.drain()
+                    status, _, keep_alive = await asyncio.wait_for(read_response(reader), options['timeout'])
+                except asyncio.TimeoutError:
+                    counts['timeouts'] += 1
+                    status, keep_alive = None, False
+                except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+                    counts['errors'] += 1
+                    status, keep_alive = None, False
+                if status is not None:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if status == 429:
+                        counts['throttled'] += 1
+                    elif status >= 400:
+                        counts['errors'] += 1
+                if not keep_alive and writer is not None:
+                    writer.close()
+                    reader = writer = None
+            if writer is not None:
+                writer.close()
+
+        started = time.monotonic()
+        await asyncio.gather(*(client() for _ in range(connections)))
+        elapsed = time.monotonic() - started
+        latencies.sort()
+        failed = counts['errors'] + counts['timeouts'] + counts['throttled']
+
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] if latencies else 0.0
+
+        return {
+            'rps': len(latencies) / elapsed,
+            'p50': statistics.median(latencies) if latencies else 0.0,
+            'p95': percentile(0.95),
+            'p99': percentile(0.99),
+            'ok': bool(latencies),
+            'error_rate': failed / max(1, counts['attempts']),
+            **counts,
+        }
@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api import search
+from api.models import Event, Exam, StudyMaterial
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from the database (needed after bulk loads that skip signals)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows indexed per batch')
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        chunk_size = options['chunk_size']
+        sources = [
+            ('events', Event.objects.all()),
+            ('exams', Exam.objects.all()),
+            ('materials', StudyMaterial.objects.all()),
+            ('students', User.objects.filter(role='student')),
+        ]
+        with transaction.atomic():
+            backend.clear()
+            for label, queryset in sources:
+                indexed = 0
+                batch = []
+                for instance in queryset.order_by('pk').iterator(chunk_size=chunk_size):
+                    batch.append(search.document_for(instance))
+                    if len(batch) >= chunk_size:
+                        backend.index(batch)
+                        indexed += len(batch)
+                        batch = []
+                backend.index(batch)
+                indexed += len(batch)
+                self.stdout.write(f'Indexed {indexed} {label}')
+        backend.optimize()
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt ({type(backend).__name__})'))
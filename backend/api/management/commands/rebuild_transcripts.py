@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api import transcripts
+from api.models import Result, StudentSummary
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized student transcripts from results (after migrating or bulk loads that skip signals)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=transcripts.BATCH_SIZE,
+                            help='Students recomputed per grouped query')
+
+    def handle(self, *args, **options):
+        # Students with results, plus stale summaries of students who no longer have any
+        student_ids = set(Result.objects.values_list('student_id', flat=True).distinct())
+        student_ids.update(StudentSummary.objects.values_list('student_id', flat=True))
+        rebuilt = transcripts.rebuild(student_ids, options['batch_size'])
+        removed = len(student_ids) - rebuilt
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} transcript(s), removed {removed} stale'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from api import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard counters from the source tables and correct any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-drift', action='store_true', help='Print every counter that had drifted')
+
+    def handle(self, *args, **options):
+        drift = counters.reconcile()
+        if options['verbose_drift']:
+            for key in sorted(drift):
+                stored, actual = drift[key]
+                self.stdout.write(f'{key}: {stored} -> {actual}')
+        self.stdout.write(self.style.SUCCESS(f'Counters reconciled; {len(drift)} had drifted'))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (e.g. contact form emails) until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run every job that is due now, then exit')
+        parser.add_argument('--batch-size', type=int, default=None, help='Jobs claimed per batch')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when idle')
+        parser.add_argument('--max-runtime', type=float, default=None,
+                            help='Exit after this many seconds (for cron-driven workers)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        processed = 0
+        last_prune = 0.0
+        try:
+            while True:
+                if time.monotonic() - last_prune > 3600:
+                    jobs.prune()
+                    last_prune = time.monotonic()
+                ran = jobs.run_pending(options['batch_size'])
+                processed += ran
+                if ran and options['verbosity'] > 1:
+                    self.stdout.write(f'Ran {ran} job(s); queue: {jobs.stats()}')
+                if options['max_runtime'] is not None and time.monotonic() - started >= options['max_runtime']:
+                    break
+                if not ran:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} job(s)'))
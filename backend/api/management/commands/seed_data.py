@@ -2,16 +2,40 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import datetime, timedelta
+from api import bulkdata, counters, roster, transcripts
+from api import cache as response_cache
+from api.mirror import mirror
 from api.models import Event, Exam, Result, StudyMaterial
 import random
+import time
 
 User = get_user_model()
 
 
 class Command(BaseCommand):
-    help = 'Seed the database with sample data'
+    help = ('Seed the database with sample data, or with a generated dataset of any size '
+            'when --students is given (bulk mode)')
+
+    def add_arguments(self, parser):
+        bulk = parser.add_argument_group('bulk mode')
+        bulk.add_argument('--students', type=int, help='Generate this many students with bulk inserts')
+        bulk.add_argument('--faculty', type=int, help='Faculty members (default: one per 20 students)')
+        bulk.add_argument('--exams', type=int, default=100)
+        bulk.add_argument('--results-per-exam', type=int, default=50,
+                          help='Students given a result in each exam (capped at --students)')
+        bulk.add_argument('--events', type=int, help='Events (default: same as --exams)')
+        bulk.add_argument('--materials', type=int, help='Study materials (default: same as --exams)')
+        bulk.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same dataset')
+        bulk.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk insert and Mongo bulk write')
+        bulk.add_argument('--prefix', default='seed',
+                          help='Username prefix; rerunning with the same prefix reuses existing users')
+        bulk.add_argument('--skip-mongo', action='store_true', help='Do not mirror the generated rows to MongoDB')
 
     def handle(self, *args, **options):
+        if options['students'] is not None:
+            self.bulk_seed(options)
+            return
+
         self.stdout.write('Starting to seed database...')
         
         # Create users
@@ -33,6 +57,56 @@ class Command(BaseCommand):
             self.style.SUCCESS('Successfully seeded database with sample data!')
         )
 
+    def bulk_seed(self, options):
+        """
+        Generate a dataset with chunked bulk_create while the Mongo mirror is
+        suspended, then bring the derived state up to date in bulk: Mongo,
+        dashboard counters, search index, transcripts and cache versions.
+        """
+        students = options['students']
+        exams = options['exams']
+        started = time.perf_counter()
+        since = bulkdata.high_water_marks()
+        generator = bulkdata.DatasetGenerator(
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            prefix=options['prefix'],
+            log=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        with mirror.suspended():
+            created = generator.generate(
+                students=students,
+                faculty=options['faculty'] if options['faculty'] is not None else max(1, students // 20),
+                exams=exams,
+                results_per_exam=options['results_per_exam'],
+                events=options['events'] if options['events'] is not None else exams,
+                materials=options['materials'] if options['materials'] is not None else exams,
+            )
+        self.stdout.write('Created ' + ', '.join(f'{count} {name}' for name, count in created.items())
+                          + f' in {time.perf_counter() - started:.1f}s')
+
+        if not options['skip_mongo']:
+            step = time.perf_counter()
+            written = bulkdata.load_mongo(since, options['chunk_size'],
+                                          log=self.stdout.write if options['verbosity'] > 1 else None)
+            self.stdout.write(f'Mirrored {sum(written.values())} documents to MongoDB '
+                              f'in {time.perf_counter() - step:.1f}s')
+
+        step = time.perf_counter()
+        counters.reconcile()
+        indexed = bulkdata.index_new_rows(since, options['chunk_size'])
+        graded_students = (
+            Result.objects.filter(pk__gt=since[Result]).values_list('student_id', flat=True).distinct()
+        )
+        summaries = transcripts.rebuild(graded_students)
+        response_cache.bump('event', 'exam', 'material', 'user',
+                            *(roster.version_name(role) for role in roster.ROLES))
+        self.stdout.write(f'Reconciled counters, indexed {indexed} documents and built {summaries} '
+                          f'transcripts in {time.perf_counter() - step:.1f}s')
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded database in {time.perf_counter() - started:.1f}s (seed {options["seed"]})'
+        ))
+
     def create_users(self):
         """Create sample users"""
         # Admin user
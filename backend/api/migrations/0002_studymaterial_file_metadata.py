@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studymaterial',
+            name='checksum',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='studymaterial',
+            name='file_size_bytes',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='studymaterial',
+            name='mime_type',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_dashboard_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['-date', '-id'], name='events_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-date', '-id'], name='events_active_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['created_by', '-date'], name='events_creator_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exam',
+            index=models.Index(fields=['-date', '-id'], name='exams_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exam',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-date', '-id'], name='exams_active_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exam',
+            index=models.Index(fields=['faculty', '-date'], name='exams_faculty_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['-created_at', '-id'], name='results_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['student', '-created_at'], name='results_student_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['exam', '-created_at'], name='results_exam_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studymaterial',
+            index=models.Index(fields=['-created_at', '-id'], name='materials_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studymaterial',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-id'], name='materials_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studymaterial',
+            index=models.Index(fields=['uploaded_by', '-created_at'], name='materials_uploader_created_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Keyset pagination orders by id after the date column. The indexes 0004
+    creates already end with -id, so each is built once rather than built
+    in 0004 and rebuilt here under the same name.
+    """
+
+    dependencies = [
+        ('api', '0004_hot_path_indexes'),
+    ]
+
+    operations = []
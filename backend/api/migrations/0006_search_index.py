@@ -0,0 +1,75 @@
+from django.db import migrations, transaction
+from django.db.utils import OperationalError
+
+# Full-text index used by api.search.SQLiteFTSBackend. The rowid packs the
+# object id with a 3-bit kind code so a document can be replaced by key.
+CREATE_INDEX = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+    kind UNINDEXED,
+    is_active UNINDEXED,
+    title,
+    body,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+POPULATE_INDEX = [
+    """
+    INSERT INTO search_index (rowid, kind, is_active, title, body)
+    SELECT (id << 3) | 1, 'event', is_active, title,
+           TRIM(COALESCE(description, '') || ' ' || COALESCE(location, ''))
+    FROM events
+    """,
+    """
+    INSERT INTO search_index (rowid, kind, is_active, title, body)
+    SELECT (id << 3) | 2, 'exam', is_active, title,
+           TRIM(COALESCE(description, '') || ' ' || COALESCE(subject, ''))
+    FROM exams
+    """,
+    """
+    INSERT INTO search_index (rowid, kind, is_active, title, body)
+    SELECT (id << 3) | 3, 'material', is_active, title,
+           TRIM(COALESCE(description, '') || ' ' || COALESCE(subject, '') || ' ' || material_type)
+    FROM study_materials
+    """,
+    """
+    INSERT INTO search_index (rowid, kind, is_active, title, body)
+    SELECT (id << 3) | 4, 'student', is_active, TRIM(first_name || ' ' || last_name),
+           TRIM(username || ' ' || COALESCE(student_id, ''))
+    FROM users WHERE role = 'student'
+    """,
+]
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(CREATE_INDEX)
+    except OperationalError:
+        # SQLite built without FTS5; api.search falls back to DatabaseSearchBackend
+        return
+    with connection.cursor() as cursor:
+        for statement in POPULATE_INDEX:
+            cursor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_keyset_tiebreak_indexes'),
+        ('accounts', '0002_role_name_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_role_name_index'),
+        ('api', '0007_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSummary',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('results_count', models.PositiveIntegerField(default=0)),
+                ('graded_count', models.PositiveIntegerField(default=0)),
+                ('marks_obtained', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_marks', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('percentage', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('grade_points', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('gpa', models.DecimalField(decimal_places=2, default=0, max_digits=4)),
+                ('subjects', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'student_summaries',
+            },
+        ),
+    ]
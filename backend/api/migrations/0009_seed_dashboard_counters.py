@@ -0,0 +1,62 @@
+from collections import Counter
+
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+def user_key(user_id, name):
+    return f"user:{user_id}:{name}"
+
+
+def seed_counters(apps, schema_editor):
+    """
+    Fill dashboard_counters from the existing rows, as reconcile_counters does.
+
+    Migration 0003 created the table empty, so databases with data read zeros
+    until then; recomputing from scratch is also correct where it was maintained.
+    """
+    db = schema_editor.connection.alias
+    User = apps.get_model('accounts', 'User')
+    Event = apps.get_model('api', 'Event')
+    Exam = apps.get_model('api', 'Exam')
+    Result = apps.get_model('api', 'Result')
+    StudyMaterial = apps.get_model('api', 'StudyMaterial')
+    DashboardCounter = apps.get_model('api', 'DashboardCounter')
+
+    values = Counter()
+    values['users'] = User.objects.using(db).count()
+    for model, name, owner in (
+        (Event, 'events', 'created_by_id'),
+        (Exam, 'exams', 'faculty_id'),
+        (StudyMaterial, 'materials', 'uploaded_by_id'),
+    ):
+        rows = model.objects.using(db)
+        totals = rows.aggregate(total=Count('pk'), active=Count('pk', filter=Q(is_active=True)))
+        values[name] = totals['total']
+        values[f'{name}:active'] = totals['active']
+        for owner_id, total in rows.values_list(owner).annotate(total=Count('pk')).order_by():
+            values[user_key(owner_id, name)] = total
+    results = Result.objects.using(db)
+    values['results'] = results.count()
+    for student_id, total in results.values_list('student_id').annotate(total=Count('pk')).order_by():
+        values[user_key(student_id, 'results')] = total
+    for faculty_id, total in results.values_list('exam__faculty_id').annotate(total=Count('pk')).order_by():
+        values[user_key(faculty_id, 'exam_results')] = total
+
+    DashboardCounter.objects.using(db).all().delete()
+    DashboardCounter.objects.using(db).bulk_create(
+        [DashboardCounter(key=key, value=value) for key, value in values.items() if value],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_role_name_index'),
+        ('api', '0008_student_summaries'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,437 @@
+"""
+Background pipeline that mirrors model changes into MongoDB.
+
+Signal receivers hand their documents to ``mirror`` instead of talking to
+Mongo directly. Operations are queued once the surrounding transaction
+commits and a worker thread coalesces them per document before flushing
+each collection with a single ``bulk_write``.
+
+While Mongo is unreachable (the circuit in api.mongo is open, or a write
+fails with a connection error) operations are appended to a local spool file.
+Once Mongo is back the spool is replayed before the next write, and writes
+queue behind it in the spool while any of it is still pending.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from bson import json_util
+from django.conf import settings
+from django.db import transaction
+from pymongo import DeleteOne, InsertOne, ReplaceOne, UpdateOne
+
+from api.mongo import UNAVAILABLE_ERRORS, MongoUnavailable, col, mongo
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def coalesce(ops):
+    """
+    Collapse a sequence of (action, collection, doc_id, doc) operations so
+    that each document is written at most once, preserving the end state.
+    """
+    merged = {}
+    for action, collection, doc_id, doc in ops:
+        if action == 'insert':
+            # Inserts (e.g. audit events) have no identity to merge on; each one is kept
+            merged[(collection, ('insert', len(merged)))] = ('insert', dict(doc))
+            continue
+        key = (collection, doc_id)
+        previous = merged.get(key)
+        if action == 'delete':
+            merged[key] = ('delete', None)
+        elif previous is None:
+            merged[key] = ('upsert', dict(doc))
+        elif previous[0] == 'delete':
+            # The document was removed first, so the new state replaces it entirely
+            merged[key] = ('replace', dict(doc))
+        else:
+            previous[1].update(doc)
+    return merged
+
+
+def build_requests(merged):
+    """Group coalesced operations into pymongo bulk requests per collection."""
+    requests = {}
+    for (collection, doc_id), (action, doc) in merged.items():
+        if action == 'insert':
+            request = InsertOne(doc)
+        elif action == 'delete':
+            request = DeleteOne({"_id": doc_id})
+        elif action == 'replace':
+            request = ReplaceOne({"_id": doc_id}, doc, upsert=True)
+        else:
+            request = UpdateOne({"_id": doc_id}, {"$set": doc}, upsert=True)
+        requests.setdefault(collection, []).append(request)
+    return requests
+
+
+def expand(merged):
+    """Turn coalesced operations back into plain ops that coalesce() reproduces"""
+    for (collection, doc_id), (action, doc) in merged.items():
+        if action == 'replace':
+            yield ('delete', collection, doc_id, None)
+            yield ('upsert', collection, doc_id, doc)
+        elif action == 'insert':
+            yield ('insert', collection, None, doc)
+        else:
+            yield (action, collection, doc_id, doc)
+
+
+class Spool:
+    """
+    Append-only JSON lines file of operations that could not reach Mongo.
+
+    Documents are encoded with bson.json_util so datetimes and decimals
+    survive the round trip. Each process appends whole lines; a replay
+    renames the file to ``<path>.<pid>.replay`` first so concurrent appends
+    start a fresh spool. A replay file left behind by a process that died
+    mid-replay is picked up by the next replay, before the spool itself.
+
+    size() keeps a line count per file (by inode, which a rename keeps) and
+    only reads what was appended since it last looked.
+    """
+    suffix = '.replay'
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        # One replay at a time per process; they share the claimed file name
+        self._replay_lock = threading.Lock()
+        # {(device, inode): (bytes counted, lines in them)}
+        self._counted = {}
+
+    def append(self, ops):
+        lines = [json_util.dumps(list(op)) + '\n' for op in ops]
+        if not lines:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as spool:
+                spool.write(''.join(lines))
+
+    def claimed(self):
+        return f'{self.path}.{os.getpid()}{self.suffix}'
+
+    def orphans(self):
+        """Replay files of processes that are no longer running, oldest first"""
+        directory, name = os.path.split(self.path)
+        try:
+            entries = os.listdir(directory or '.')
+        except FileNotFoundError:
+            return []
+        orphans = []
+        for entry in entries:
+            pid = entry[len(name) + 1:-len(self.suffix)]
+            if (entry.startswith(f'{name}.') and entry.endswith(self.suffix) and pid.isdigit()
+                    and int(pid) != os.getpid() and not _running(int(pid))):
+                orphans.append(os.path.join(directory, entry))
+        return sorted(orphans, key=_mtime)
+
+    def files(self):
+        """Every file holding operations still to be replayed, oldest first"""
+        return [path for path in [self.claimed(), *self.orphans(), self.path] if os.path.exists(path)]
+
+    def pending(self):
+        return bool(self.files())
+
+    def size(self):
+        """Number of spooled operations"""
+        counted = {}
+        with self._lock:
+            for path in self.files():
+                try:
+                    with open(path, 'rb') as spool:
+                        key, offset, lines = self._counted_so_far(spool)
+                        spool.seek(offset)
+                        for chunk in iter(lambda: spool.read(1 << 16), b''):
+                            lines += chunk.count(b'\n')
+                        counted[key] = (spool.tell(), lines)
+                except FileNotFoundError:
+                    continue
+            self._counted = counted
+        return sum(lines for _, lines in counted.values())
+
+    def _counted_so_far(self, spool):
+        stat = os.fstat(spool.fileno())
+        key = (stat.st_dev, stat.st_ino)
+        offset, lines = self._counted.get(key, (0, 0))
+        if stat.st_size < offset:
+            # A new file that reuses the inode of a removed one
+            offset, lines = 0, 0
+        return key, offset, lines
+
+    def drain(self, batch_size):
+        """Take the spool over, along with orphaned replay files, and yield its operations in batches"""
+        claimed = self.claimed()
+        with self._replay_lock:
+            # Left over from a replay in this process that stopped half way
+            if os.path.exists(claimed):
+                yield from self._read(claimed, batch_size)
+            for orphan in self.orphans():
+                try:
+                    os.replace(orphan, claimed)
+                except FileNotFoundError:
+                    # Another process took it over first
+                    continue
+                yield from self._read(claimed, batch_size)
+            with self._lock:
+                try:
+                    os.replace(self.path, claimed)
+                except FileNotFoundError:
+                    return
+            yield from self._read(claimed, batch_size)
+
+    def _read(self, path, batch_size):
+        batch = []
+        with open(path, encoding='utf-8') as spool:
+            stat = os.fstat(spool.fileno())
+            for line in spool:
+                if line.strip():
+                    batch.append(tuple(json_util.loads(line)))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+        os.remove(path)
+        with self._lock:
+            self._counted.pop((stat.st_dev, stat.st_ino), None)
+
+
+def _running(pid):
+    if os.name == 'nt':
+        # os.kill() would terminate the process; assume it is alive
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return 0
+
+
+class MirrorPipeline:
+    """
+    Bounded queue of Mongo write operations drained by a daemon thread.
+
+    When the queue is full, producers wait up to ``enqueue_timeout`` seconds
+    and then write their own operation synchronously, so a stalled Mongo
+    slows writers down instead of growing memory without limit.
+    """
+
+    def __init__(self, enabled=True, max_queue=10000, batch_size=500,
+                 flush_interval=0.5, enqueue_timeout=2.0, linger=0.0, spool=None):
+        self.enabled = enabled
+        self.spool = spool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.linger = linger
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._suspended = 0
+
+    # Producer API
+
+    def upsert(self, collection, doc_id, doc):
+        self.submit('upsert', collection, doc_id, doc)
+
+    def delete(self, collection, doc_id):
+        self.submit('delete', collection, doc_id, None)
+
+    def insert(self, collection, doc):
+        """Append a new document, e.g. an audit event; batched with the other writes."""
+        self.submit('insert', collection, None, doc)
+
+    def upsert_many(self, collection, docs):
+        """Queue upserts for a {doc_id: doc} mapping with a single commit hook."""
+        if self._suspended:
+            return
+        ops = [('upsert', collection, doc_id, doc) for doc_id, doc in docs.items()]
+        transaction.on_commit(lambda: self.put_many(ops))
+
+    def submit(self, action, collection, doc_id, doc):
+        if self._suspended:
+            return
+        op = (action, collection, doc_id, doc)
+        transaction.on_commit(lambda: self.put(op))
+
+    def put_many(self, ops):
+        if not self.enabled:
+            self.write(ops)
+            return
+        for op in ops:
+            self.put(op)
+
+    def put(self, op):
+        if not self.enabled:
+            self.write([op])
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put(op, timeout=self.enqueue_timeout)
+        except queue.Full:
+            logger.warning("Mongo mirror queue is full; writing %s/%s inline", op[1], op[2])
+            self.write([op])
+
+    def load(self, collection, docs):
+        """
+        Write a {doc_id: doc} mapping straight to Mongo, replacing existing
+        documents, e.g. to mirror rows loaded while the mirror was suspended.
+        Returns the number written; the rest go to the spool.
+        """
+        merged = {(collection, doc_id): ('replace', dict(doc)) for doc_id, doc in docs.items()}
+        failed = self.write_merged(merged) if mongo.available() else merged
+        if failed:
+            self.divert(failed)
+        return len(merged) - len(failed)
+
+    @contextmanager
+    def suspended(self):
+        """Discard operations submitted inside the block, e.g. during bulk loads."""
+        self._suspended += 1
+        try:
+            yield
+        finally:
+            self._suspended -= 1
+
+    # Worker
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so pre-forking servers get a fresh worker per process
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='mongo-mirror', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = []
+            stop = False
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                stop = True
+            else:
+                batch.append(item)
+            # Keep collecting for up to `linger` seconds so bursts share one bulk_write
+            deadline = time.monotonic() + self.linger
+            while not stop and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+            try:
+                if batch:
+                    self.write(batch)
+            finally:
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def write(self, ops):
+        merged = coalesce(ops)
+        if self.spool is not None and self.spool.pending():
+            # Spooled operations are older and go first, or they would overwrite newer state
+            if mongo.available():
+                self.replay()
+            if self.spool.pending():
+                self.divert(merged)
+                return
+        failed = self.write_merged(merged) if mongo.available() else merged
+        if failed:
+            self.divert(failed)
+
+    def write_merged(self, merged):
+        """Bulk write each collection; return the operations that could not reach Mongo"""
+        failed = {}
+        for collection, requests in build_requests(merged).items():
+            try:
+                col(collection).bulk_write(requests, ordered=False)
+            except (MongoUnavailable, *UNAVAILABLE_ERRORS):
+                failed.update((key, value) for key, value in merged.items() if key[0] == collection)
+            except Exception:
+                logger.exception("Failed to mirror %d operation(s) to Mongo collection %s",
+                                 len(requests), collection)
+        return failed
+
+    def divert(self, merged):
+        if self.spool is None:
+            logger.error("Mongo is unavailable; dropped %d mirror operation(s)", len(merged))
+            return
+        logger.warning("Mongo is unavailable; spooling %d mirror operation(s)", len(merged))
+        self.spool.append(expand(merged))
+
+    def replay(self):
+        """Write spooled operations; whatever fails again goes back to the spool"""
+        replayed = 0
+        for batch in self.spool.drain(self.batch_size):
+            merged = coalesce(batch)
+            failed = self.write_merged(merged) if mongo.available() else merged
+            if failed:
+                self.spool.append(expand(failed))
+            replayed += len(merged) - len(failed)
+        if replayed:
+            logger.info("Replayed %d spooled mirror operation(s)", replayed)
+
+    # Lifecycle
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def spooled(self):
+        return self.spool.size() if self.spool is not None else 0
+
+    def flush(self):
+        """Block until every queued operation has been written."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def shutdown(self):
+        """Drain the queue and stop the worker; registered with atexit."""
+        if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+
+mirror = MirrorPipeline(
+    enabled=settings.MONGO_MIRROR_ASYNC,
+    max_queue=settings.MONGO_MIRROR_QUEUE_SIZE,
+    batch_size=settings.MONGO_MIRROR_BATCH_SIZE,
+    flush_interval=settings.MONGO_MIRROR_FLUSH_INTERVAL,
+    enqueue_timeout=settings.MONGO_MIRROR_ENQUEUE_TIMEOUT,
+    linger=settings.MONGO_MIRROR_LINGER,
+    spool=Spool(settings.MONGO_SPOOL_PATH) if settings.MONGO_SPOOL_PATH else None,
+)
+atexit.register(mirror.shutdown)
@@ -0,0 +1,20 @@
+class SelectRelatedMixin:
+    """
+    Join the relations a view's serializer reads.
+
+    Serializers list the foreign keys they dereference in
+    ``Meta.select_related``; the joins are applied to every queryset the view
+    lists or looks objects up from, so a page costs one query regardless of
+    how many rows it holds.
+    """
+
+    def get_select_related(self):
+        meta = getattr(self.get_serializer_class(), 'Meta', None)
+        return tuple(getattr(meta, 'select_related', ()))
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        related = self.get_select_related()
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset
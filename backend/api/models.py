@@ -1,3 +1,7 @@
+import hashlib
+import mimetypes
+from bisect import bisect_right
+
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -5,6 +9,51 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 User = get_user_model()
 
 
+# Minimum percentage for each grade, highest first
+GRADE_THRESHOLDS = [
+    (90, 'A+'),
+    (80, 'A'),
+    (70, 'B+'),
+    (60, 'B'),
+    (50, 'C'),
+]
+FAILING_GRADE = 'F'
+
+# Points per grade on a 10-point scale, for cumulative grade points and GPA
+GRADE_POINTS = {'A+': 10, 'A': 9, 'B+': 8, 'B': 7, 'C': 6, FAILING_GRADE: 0}
+
+
+def calculate_grade(marks_obtained, total_marks):
+    """Return the letter grade for a score; total_marks must be positive"""
+    percentage = (marks_obtained / total_marks) * 100
+    for minimum, grade in GRADE_THRESHOLDS:
+        if percentage >= minimum:
+            return grade
+    return FAILING_GRADE
+
+
+def calculate_percentage(marks_obtained, total_marks):
+    """Percentage rounded to 2 places, or 0 when there is no positive total"""
+    if total_marks > 0:
+        return round((marks_obtained / total_marks) * 100, 2)
+    return 0
+
+
+def calculate_grades(scores):
+    """
+    Grade a whole marks sheet in one pass.
+
+    `scores` is an iterable of (marks_obtained, total_marks) pairs; rows with
+    a non-positive total get None, matching Result.save() leaving grade unset.
+    """
+    cutoffs = [minimum for minimum, _ in reversed(GRADE_THRESHOLDS)]
+    labels = [FAILING_GRADE] + [grade for _, grade in reversed(GRADE_THRESHOLDS)]
+    return [
+        labels[bisect_right(cutoffs, (marks / total) * 100)] if total > 0 else None
+        for marks, total in scores
+    ]
+
+
 class Event(models.Model):
     """
     Event model for campus events
@@ -21,6 +70,11 @@ class Event(models.Model):
     class Meta:
         ordering = ['-date']
         db_table = 'events'
+        indexes = [
+            models.Index(fields=['-date', '-id'], name='events_date_idx'),
+            models.Index(fields=['-date', '-id'], condition=models.Q(is_active=True), name='events_active_date_idx'),
+            models.Index(fields=['created_by', '-date'], name='events_creator_date_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -42,6 +96,11 @@ class Exam(models.Model):
     class Meta:
         ordering = ['-date']
         db_table = 'exams'
+        indexes = [
+            models.Index(fields=['-date', '-id'], name='exams_date_idx'),
+            models.Index(fields=['-date', '-id'], condition=models.Q(is_active=True), name='exams_active_date_idx'),
+            models.Index(fields=['faculty', '-date'], name='exams_faculty_date_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -64,6 +123,11 @@ class Result(models.Model):
         unique_together = ['exam', 'student']
         ordering = ['-created_at']
         db_table = 'results'
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='results_created_idx'),
+            models.Index(fields=['student', '-created_at'], name='results_student_created_idx'),
+            models.Index(fields=['exam', '-created_at'], name='results_exam_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.username} - {self.exam.title}"
@@ -71,19 +135,7 @@ class Result(models.Model):
     def save(self, *args, **kwargs):
         # Calculate percentage and grade
         if self.total_marks > 0:
-            percentage = (self.marks_obtained / self.total_marks) * 100
-            if percentage >= 90:
-                self.grade = 'A+'
-            elif percentage >= 80:
-                self.grade = 'A'
-            elif percentage >= 70:
-                self.grade = 'B+'
-            elif percentage >= 60:
-                self.grade = 'B'
-            elif percentage >= 50:
-                self.grade = 'C'
-            else:
-                self.grade = 'F'
+            self.grade = calculate_grade(self.marks_obtained, self.total_marks)
         super().save(*args, **kwargs)
 
 
@@ -105,6 +157,10 @@ class StudyMaterial(models.Model):
     file = models.FileField(upload_to='study_materials/')
     subject = models.CharField(max_length=100, blank=True, null=True)
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploaded_materials')
+    # File metadata captured once at upload time so listings never touch storage
+    file_size_bytes = models.BigIntegerField(default=0, editable=False, db_index=True)
+    checksum = models.CharField(max_length=64, blank=True, default='', editable=False)
+    mime_type = models.CharField(max_length=100, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
@@ -112,13 +168,118 @@ class StudyMaterial(models.Model):
     class Meta:
         ordering = ['-created_at']
         db_table = 'study_materials'
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='materials_created_idx'),
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_active=True), name='materials_active_created_idx'),
+            models.Index(fields=['uploaded_by', '-created_at'], name='materials_uploader_created_idx'),
+        ]
     
     def __str__(self):
         return self.title
     
+    def save(self, *args, **kwargs):
+        # A new upload is still in memory here; read its metadata before storage does
+        if self.file and not self.file._committed:
+            self.capture_file_metadata()
+        super().save(*args, **kwargs)
+    
+    def capture_file_metadata(self):
+        """Record size, SHA-256 checksum and MIME type of the attached file"""
+        digest = hashlib.sha256()
+        size = 0
+        stored = self.file._committed
+        # Only fresh uploads carry the browser-reported content type
+        content_type = None if stored else getattr(self.file.file, 'content_type', None)
+        if stored:
+            self.file.open('rb')
+        try:
+            for chunk in self.file.chunks():
+                digest.update(chunk)
+                size += len(chunk)
+        finally:
+            if stored:
+                self.file.close()
+        self.file_size_bytes = size
+        self.checksum = digest.hexdigest()
+        self.mime_type = (
+            content_type
+            or mimetypes.guess_type(self.file.name)[0]
+            or 'application/octet-stream'
+        )
+    
     @property
     def file_size(self):
         """Return file size in KB"""
-        if self.file:
-            return round(self.file.size / 1024, 2)
-        return 0
+        return round(self.file_size_bytes / 1024, 2)
+
+
+class DashboardCounter(models.Model):
+    """
+    Precomputed count backing the dashboard, maintained by api.counters
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    value = models.BigIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'dashboard_counters'
+    
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+
+class Job(models.Model):
+    """
+    Background task stored in the database and executed by `run_jobs` (see api.jobs)
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_at = models.DateTimeField(blank=True, null=True)
+    locked_by = models.CharField(max_length=64, blank=True, default='')
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'jobs'
+        indexes = [
+            # Claiming picks the oldest due jobs of a status
+            models.Index(fields=['status', 'run_at'], name='jobs_status_run_at_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class StudentSummary(models.Model):
+    """
+    Materialized transcript totals for one student (maintained by api.transcripts)
+    """
+    student = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    results_count = models.PositiveIntegerField(default=0)
+    # Totals over graded results (a positive total); percentage is weighted by total marks
+    graded_count = models.PositiveIntegerField(default=0)
+    marks_obtained = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_marks = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    percentage = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    grade_points = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    gpa = models.DecimalField(max_digits=4, decimal_places=2, default=0)
+    # {subject: {"results", "graded", "marks_obtained", "total_marks", "percentage", "grade_points", "gpa"}}
+    subjects = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'student_summaries'
+    
+    def __str__(self):
+        return f"Summary for student #{self.student_id}"
@@ -1,10 +1,320 @@
-from pymongo import MongoClient
+"""
+Managed MongoDB access.
+
+The client is created on first use rather than at import time, with an
+explicit connection pool and per-operation timeouts, and is recreated after
+a fork. Calls go through a circuit breaker: after MONGO_BREAKER_THRESHOLD
+consecutive connection failures the circuit opens and calls fail fast with
+MongoUnavailable for MONGO_BREAKER_RESET seconds, after which one probe call
+is let through. Latency and error counts are kept for the health endpoint.
+
+Async views use acol(): a native asyncio driver (pymongo's AsyncMongoClient,
+or motor) when one is installed, otherwise the blocking call runs on a worker
+thread. Both share the breaker and statistics with the synchronous client.
+"""
+import asyncio
+import os
+import statistics
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, NetworkTimeout, WTimeoutError
+
+from api import instrumentation
+
+# Errors that say Mongo is unreachable or too slow, as opposed to a bad request
+UNAVAILABLE_ERRORS = (ConnectionFailure, ExecutionTimeout, NetworkTimeout, WTimeoutError)
+
+# Collection methods that talk to the server and are timed and guarded
+GUARDED_METHODS = frozenset({
+    'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+    'delete_one', 'delete_many', 'bulk_write', 'find_one', 'find_one_and_update',
+    'count_documents', 'estimated_document_count', 'aggregate', 'create_index',
+})
+
+
+# Guarded methods that are coroutines on the async drivers (motor's aggregate returns a cursor)
+ASYNC_GUARDED_METHODS = GUARDED_METHODS - {'aggregate'}
+
+
+def async_client_class():
+    """The installed asyncio MongoDB client class, or None"""
+    try:
+        from pymongo import AsyncMongoClient
+        return AsyncMongoClient
+    except ImportError:
+        pass
+    try:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return AsyncIOMotorClient
+    except ImportError:
+        return None
+
+
+class MongoUnavailable(Exception):
+    """Raised instead of calling Mongo while the circuit is open"""
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let a single probe through; its outcome closes or reopens the circuit
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+
+class LatencyStats:
+    """Rolling window of operation latencies in milliseconds"""
+
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_ms, failed=False):
+        with self._lock:
+            self.samples.append(elapsed_ms)
+            self.calls += 1
+            if failed:
+                self.errors += 1
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        with self._lock:
+            samples = sorted(self.samples)
+            calls, errors, rejected = self.calls, self.errors, self.rejected
+        latency = None
+        if samples:
+            latency = {
+                'p50_ms': round(statistics.median(samples), 2),
+                'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+                'max_ms': round(samples[-1], 2),
+            }
+        return {'calls': calls, 'errors': errors, 'rejected': rejected, 'latency': latency}
+
+
+class GuardedCollection:
+    """Collection wrapper that routes server calls through the manager"""
+
+    def __init__(self, manager, collection):
+        self._manager = manager
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in GUARDED_METHODS:
+            return attr
+
+        def call(*args, **kwargs):
+            return self._manager.call(attr, *args, **kwargs)
+        return call
+
+
+class AsyncGuardedCollection:
+    """
+    Awaitable counterpart of GuardedCollection.
+
+    `collection` is a native async collection, or a GuardedCollection whose
+    calls are then run on a worker thread.
+    """
+
+    def __init__(self, manager, collection, native):
+        self._manager = manager
+        self._collection = collection
+        self._native = native
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in ASYNC_GUARDED_METHODS:
+            return attr
+        if self._native:
+            async def call(*args, **kwargs):
+                return await self._manager.acall(attr, *args, **kwargs)
+        else:
+            async def call(*args, **kwargs):
+                return await sync_to_async(attr, thread_sensitive=False)(*args, **kwargs)
+        return call
+
+
+class MongoManager:
+    def __init__(self, uri, db_name, max_pool_size=20, min_pool_size=0, connect_timeout_ms=2000,
+                 server_selection_timeout_ms=2000, socket_timeout_ms=5000, breaker=None):
+        self.uri = uri
+        self.db_name = db_name
+        self.options = {
+            'maxPoolSize': max_pool_size,
+            'minPoolSize': min_pool_size,
+            'connectTimeoutMS': connect_timeout_ms,
+            'serverSelectionTimeoutMS': server_selection_timeout_ms,
+            'socketTimeoutMS': socket_timeout_ms,
+        }
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = LatencyStats()
+        self._client = None
+        self._pid = None
+        self._async_client = None
+        self._async_loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # MongoClient is not fork-safe; each process opens its own pool
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self._client = MongoClient(self.uri, connect=False, **self.options)
+                    self._pid = os.getpid()
+        return self._client
+
+    @property
+    def async_client(self):
+        """Client for the running event loop, or None without an async driver"""
+        client_class = async_client_class()
+        if client_class is None:
+            return None
+        # Async clients are bound to the event loop they were created on
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = client_class(self.uri, **self.options)
+            self._async_loop = loop
+        return self._async_client
+
+    def collection(self, name):
+        return GuardedCollection(self, self.client[self.db_name][name])
+
+    def async_collection(self, name):
+        """Must be called from a coroutine"""
+        client = self.async_client
+        if client is None:
+            return AsyncGuardedCollection(self, self.collection(name), native=False)
+        return AsyncGuardedCollection(self, client[self.db_name][name], native=True)
+
+    def available(self):
+        return not self.breaker.is_open
+
+    def call(self, method, *args, **kwargs):
+        self._admit()
+        started = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except Exception as exc:
+            self._record(started, exc)
+            raise
+        self._record(started)
+        return result
+
+    async def acall(self, method, *args, **kwargs):
+        self._admit()
+        started = time.perf_counter()
+        try:
+            result = await method(*args, **kwargs)
+        except Exception as exc:
+            self._record(started, exc)
+            raise
+        self._record(started)
+        return result
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self.stats.reject()
+            raise MongoUnavailable('MongoDB circuit is open')
+
+    def _record(self, started, exc=None):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats.record(elapsed_ms, failed=exc is not None)
+        instrumentation.record_mongo(elapsed_ms)
+        if isinstance(exc, UNAVAILABLE_ERRORS):
+            self.breaker.record_failure()
+        else:
+            # The server answered, so the connection is healthy even if the request was bad
+            self.breaker.record_success()
+
+    def ping(self):
+        """Round-trip time of a ping in milliseconds, or None if Mongo is unreachable"""
+        started = time.perf_counter()
+        try:
+            self.call(self.client.admin.command, 'ping')
+        except (MongoUnavailable, *UNAVAILABLE_ERRORS):
+            return None
+        return round((time.perf_counter() - started) * 1000, 2)
+
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            # Async clients are closed with their event loop
+            self._async_client = None
+            self._async_loop = None
+
+    def health(self, ping=True):
+        return {
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'ping_ms': self.ping() if ping else None,
+            'pool': {'max': self.options['maxPoolSize'], 'min': self.options['minPoolSize']},
+            **self.stats.snapshot(),
+        }
+
+
+mongo = MongoManager(
+    settings.MONGO_URI,
+    settings.MONGO_DB,
+    max_pool_size=settings.MONGO_MAX_POOL_SIZE,
+    min_pool_size=settings.MONGO_MIN_POOL_SIZE,
+    connect_timeout_ms=settings.MONGO_CONNECT_TIMEOUT_MS,
+    server_selection_timeout_ms=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    socket_timeout_ms=settings.MONGO_SOCKET_TIMEOUT_MS,
+    breaker=CircuitBreaker(settings.MONGO_BREAKER_THRESHOLD, settings.MONGO_BREAKER_RESET),
+)
 
-_client = MongoClient(settings.MONGO_URI)
-_db = _client[settings.MONGO_DB]
 
 def col(name: str):
-    return _db[name]
+    return mongo.collection(name)
 
 
+def acol(name: str):
+    """Awaitable collection for async views"""
+    return mongo.async_collection(name)
@@ -0,0 +1,130 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on a view's ``cursor_ordering``: an ordering field
+    followed by the primary key in the same direction, e.g. ('-date', '-id').
+
+    Each page is fetched with a WHERE on the last row's (value, id) pair, so
+    page N costs the same as page 1 and no COUNT query is issued. The id
+    breaks ties between rows that share the same ordering value.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    # Cursor encoding
+
+    def encode_cursor(self, row, reverse):
+        value = getattr(row, self.field)
+        payload = {'v': value.isoformat() if hasattr(value, 'isoformat') else value, 'id': row.pk, 'r': int(reverse)}
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, encoded):
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            value = self.model._meta.get_field(self.field).to_python(payload['v'])
+            return value, int(payload['id']), bool(payload.get('r'))
+        except (binascii.Error, ValueError, KeyError, TypeError, ValidationError):
+            raise NotFound('Invalid cursor')
+
+    # Pagination
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = view.cursor_ordering
+        self.descending = ordering[0].startswith('-')
+        self.field = ordering[0].lstrip('-')
+        self.model = queryset.model
+        self.request = request
+        self.size = self.get_page_size(request)
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        reverse = False
+        if encoded:
+            value, pk, reverse = self.decode_cursor(encoded)
+            # Moving forward along a descending ordering means smaller values
+            before = self.descending != reverse
+            lookup = 'lt' if before else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}': value}) | Q(**{self.field: value, f'pk__{lookup}': pk})
+            )
+
+        if reverse:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+        rows = list(queryset.order_by(*ordering)[:self.size + 1])
+        has_more = len(rows) > self.size
+        rows = rows[:self.size]
+        if reverse:
+            rows.reverse()
+
+        # In reverse mode the extra row tells us about the previous page instead
+        self.has_next = has_more if not reverse else bool(rows)
+        self.has_previous = bool(encoded) if not reverse else has_more
+        self.first = rows[0] if rows else None
+        self.last = rows[-1] if rows else None
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last, reverse=False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.first is None:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.first, reverse=True))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class StandardPagination(PageNumberPagination):
+    """
+    Page-number pagination, with opt-in keyset pagination.
+
+    Views that declare ``cursor_ordering`` switch to KeysetPagination when
+    the request carries a ``cursor`` parameter (empty for the first page).
+    In that mode the ``ordering`` parameter is ignored and no count is returned.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if getattr(view, 'cursor_ordering', None) and KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination(self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
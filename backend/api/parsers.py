@@ -0,0 +1,39 @@
+import csv
+import io
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+def read_csv_rows(text):
+    """Parse CSV text with a header row into a list of dicts, dropping blank cells"""
+    # Spreadsheet exports often prefix the file with a byte order mark
+    reader = csv.DictReader(io.StringIO(text.lstrip('\ufeff')))
+    if not reader.fieldnames:
+        raise ParseError("CSV data must start with a header row")
+    rows = []
+    for row in reader:
+        cleaned = {
+            (key or '').strip(): value.strip()
+            for key, value in row.items()
+            if key and value is not None and value.strip() != ''
+        }
+        if cleaned:
+            rows.append(cleaned)
+    return rows
+
+
+class CSVParser(BaseParser):
+    """
+    Parses a text/csv request body into a list of row dicts
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        try:
+            text = stream.read().decode(encoding)
+        except UnicodeDecodeError as exc:
+            raise ParseError(f"CSV parse error - {exc}")
+        return read_csv_rows(text)
@@ -14,6 +14,14 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         return request.user.is_authenticated and request.user.is_admin
 
 
+class IsAdmin(permissions.BasePermission):
+    """
+    Custom permission to only allow admins to access.
+    """
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.is_admin
+
+
 class IsFacultyOrAdmin(permissions.BasePermission):
     """
     Custom permission to only allow faculty and admins to access.
@@ -42,11 +50,12 @@ class IsOwnerOrAdmin(permissions.BasePermission):
             return request.user.is_authenticated
         
         # Write permissions only for the owner or admin
-        owner = getattr(obj, 'created_by', None)
-        if owner is None:
+        # Compared by id: request.user may be built from token claims (accounts.authentication)
+        owner_id = getattr(obj, 'created_by_id', None)
+        if owner_id is None:
             # exams use 'faculty' as owner; materials use 'uploaded_by'
-            owner = getattr(obj, 'uploaded_by', None) or getattr(obj, 'faculty', None)
-        return request.user.is_admin or owner == request.user
+            owner_id = getattr(obj, 'uploaded_by_id', None) or getattr(obj, 'faculty_id', None)
+        return request.user.is_admin or owner_id == request.user.id
 
 
 class IsStudentOrReadOnly(permissions.BasePermission):
@@ -58,6 +67,6 @@ class IsStudentOrReadOnly(permissions.BasePermission):
     
     def has_object_permission(self, request, view, obj):
         # Students can only view their own results
-        if hasattr(obj, 'student'):
-            return obj.student == request.user
+        if hasattr(obj, 'student_id'):
+            return obj.student_id == request.user.id
         return request.user.is_admin or request.user.is_faculty
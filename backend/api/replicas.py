@@ -0,0 +1,84 @@
+"""
+Primary/replica database routing.
+
+Writes, and every read by default, go to the primary ('default'). Views
+that only read and can tolerate replication lag (the list endpoints, the
+dashboard, rosters) run their queries inside ``replica_reads()``, which
+sets a context variable the router consults, so their reads go to the
+replica alias when one is configured (DATABASE_REPLICA_* settings).
+
+Reads inside a transaction on the primary stay there, so a view never
+reads older data than it has just written. Pages stored in the response
+cache are built under ``primary_reads()``: a page read from a lagging
+replica right after a write would otherwise be cached under the new
+version and served long after the replica caught up.
+"""
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def replica_alias():
+    """The replica alias, or None without a replica configured"""
+    alias = settings.DATABASE_REPLICA_ALIAS
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def replica_reads():
+    token = _read_alias.set(replica_alias())
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary even inside replica_reads()"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def reads_from_replica(view):
+    """Decorator for function views: run the view's queries with replica_reads()"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaListMixin:
+    """Serve ``list()`` (GET on a list view) from the replica"""
+
+    def list(self, request, *args, **kwargs):
+        with replica_reads():
+            return super().list(request, *args, **kwargs)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives the schema through replication
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,106 @@
+"""
+Prebuilt student and faculty rosters for the dropdown endpoints.
+
+A roster is built once per version from a single values_list() query and
+kept in the Django cache; each process also keeps the last roster it used,
+with a sorted word index for typeahead prefix lookups and the full list
+pre-rendered as JSON. The receivers in api/signals.py bump a role's version
+only when a save changes what the roster shows.
+"""
+import json
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+from accounts.models import User
+from . import cache as response_cache, stored
+
+ROLES = ('student', 'faculty')
+# Fields the roster renders; saves that change none of them keep the snapshot
+ROSTER_FIELDS = ('username', 'first_name', 'last_name', 'role')
+SNAPSHOT_PREFIX = 'roster-snapshot:'
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+stored.register(User, *ROSTER_FIELDS)
+
+_built = {}
+
+
+def version_name(role):
+    return f'roster:{role}'
+
+
+class Roster:
+    def __init__(self, role, version, rows):
+        self.role = role
+        self.version = version
+        self.rows = rows
+        self.content = json.dumps(rows, separators=(',', ':')).encode()
+        entries = []
+        for position, row in enumerate(rows):
+            full_name = row['full_name'].lower()
+            words = {row['username'].lower(), full_name, *full_name.split()}
+            entries.extend((word, position) for word in words if word)
+        entries.sort()
+        self.words = [word for word, _ in entries]
+        self.positions = [position for _, position in entries]
+
+    def filter(self, prefix, limit=None):
+        """Rows with a name or username word starting with prefix, in roster order"""
+        prefix = prefix.lower()
+        matched = set()
+        index = bisect_left(self.words, prefix)
+        while index < len(self.words) and self.words[index].startswith(prefix):
+            matched.add(self.positions[index])
+            index += 1
+        rows = [self.rows[position] for position in sorted(matched)]
+        return rows[:limit] if limit else rows
+
+
+def _load_rows(role):
+    users = (
+        User.objects.filter(role=role)
+        .order_by('first_name', 'last_name')
+        .values_list('id', 'username', 'first_name', 'last_name', 'role')
+    )
+    # {id, username, full_name, role}, as the student and faculty lists have always returned
+    return [
+        {'id': pk, 'username': username, 'full_name': f'{first_name} {last_name}'.strip(), 'role': role}
+        for pk, username, first_name, last_name, role in users
+    ]
+
+
+def get_roster(role):
+    version = response_cache.get_versions([version_name(role)])[version_name(role)]
+    roster = _built.get(role)
+    if roster is not None and roster.version == version:
+        return roster
+    key = f'{SNAPSHOT_PREFIX}{role}:{version}'
+    rows = cache.get(key)
+    if rows is None:
+        rows = _load_rows(role)
+        cache.set(key, rows, SNAPSHOT_TIMEOUT)
+    roster = _built[role] = Roster(role, version, rows)
+    return roster
+
+
+def stored_state(instance, update_fields=None):
+    """Roster fields of the instance's database row, or None if it has none yet"""
+    if instance.pk is None or instance._state.adding:
+        return None
+    if update_fields is not None and not set(ROSTER_FIELDS).intersection(update_fields):
+        return current_state(instance)
+    values = stored.row(instance)
+    return None if values is None else tuple(values[field] for field in ROSTER_FIELDS)
+
+
+def current_state(instance):
+    return tuple(getattr(instance, field) for field in ROSTER_FIELDS)
+
+
+def invalidate(*states):
+    """Bump the rosters of every role appearing in the given states"""
+    roles = {state[ROSTER_FIELDS.index('role')] for state in states if state is not None}
+    names = [version_name(role) for role in ROLES if role in roles]
+    if names:
+        response_cache.bump(*names)
@@ -0,0 +1,289 @@
+"""
+Full-text search over events, exams, study materials and students.
+
+Documents are written to a search backend from the post_save/post_delete
+receivers in api/signals.py and accounts/signals.py. The default backend on
+SQLite is an FTS5 inverted index with BM25 ranking and prefix matching; other
+databases fall back to DatabaseSearchBackend, which runs the same icontains
+lookups the list views used before. Set SEARCH_BACKEND to a dotted path to
+plug in a different implementation.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from accounts.models import User
+from .models import Event, Exam, StudyMaterial
+
+# Kind codes are folded into the FTS rowid so documents can be replaced by key
+KINDS = {
+    'event': 1,
+    'exam': 2,
+    'material': 3,
+    'student': 4,
+}
+KIND_CODE_BITS = 3
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchDocument:
+    __slots__ = ('kind', 'object_id', 'title', 'body', 'is_active')
+
+    def __init__(self, kind, object_id, title, body, is_active=True):
+        self.kind = kind
+        self.object_id = object_id
+        self.title = title or ''
+        self.body = body or ''
+        self.is_active = is_active
+
+
+def _join(*parts):
+    return ' '.join(part for part in parts if part)
+
+
+def document_for(instance):
+    """Build the search document for a model instance, or None if it is not searchable"""
+    if isinstance(instance, Event):
+        return SearchDocument('event', instance.pk, instance.title,
+                              _join(instance.description, instance.location), instance.is_active)
+    if isinstance(instance, Exam):
+        return SearchDocument('exam', instance.pk, instance.title,
+                              _join(instance.description, instance.subject), instance.is_active)
+    if isinstance(instance, StudyMaterial):
+        return SearchDocument('material', instance.pk, instance.title,
+                              _join(instance.description, instance.subject, instance.material_type),
+                              instance.is_active)
+    if isinstance(instance, User) and instance.role == 'student':
+        return SearchDocument('student', instance.pk, instance.get_full_name(),
+                              _join(instance.username, instance.student_id), instance.is_active)
+    return None
+
+
+# Fields whose changes require re-indexing, per model
+INDEXED_FIELDS = {
+    Event: {'title', 'description', 'location', 'is_active'},
+    Exam: {'title', 'description', 'subject', 'is_active'},
+    StudyMaterial: {'title', 'description', 'subject', 'material_type', 'is_active'},
+    User: {'first_name', 'last_name', 'username', 'student_id', 'role', 'is_active'},
+}
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+class BaseSearchBackend:
+    """Interface every search backend implements"""
+
+    def index(self, documents):
+        raise NotImplementedError
+
+    def remove(self, kind, object_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def optimize(self):
+        """Compact the index after a bulk load"""
+
+    def search(self, query, kinds=None, active_only=False, limit=20):
+        """Return [(kind, object_id, score)] best match first"""
+        raise NotImplementedError
+
+    def matching(self, query, kind, columns=None):
+        """
+        Every matching object id of one kind, unranked and unlimited, as a value
+        or subquery for ``__in`` filters. ``columns`` restricts the match to
+        some of the document columns ('title', 'body').
+        """
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    FTS5 index in the default SQLite database (table created by migration 0006).
+
+    Every query token is matched as a prefix, so "calc mid" finds
+    "Calculus Midterm"; results are ordered by BM25 with titles weighted
+    above bodies. Ranking is bounded to the newest SEARCH_RANK_WINDOW
+    matches so one-letter queries stay fast on large indexes.
+    """
+    table = 'search_index'
+    title_weight = 10.0
+    body_weight = 1.0
+
+    def __init__(self):
+        self.rank_window = settings.SEARCH_RANK_WINDOW
+
+    @staticmethod
+    def rowid(kind, object_id):
+        return (object_id << KIND_CODE_BITS) | KINDS[kind]
+
+    def index(self, documents):
+        rows = [
+            (self.rowid(doc.kind, doc.object_id), doc.kind, int(doc.is_active), doc.title, doc.body)
+            for doc in documents
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, kind, is_active, title, body) VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove(self, kind, object_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table} WHERE rowid = %s',
+                [(self.rowid(kind, object_id),) for object_id in object_ids],
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def optimize(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+
+    @staticmethod
+    def match_expression(tokens, columns=None):
+        prefix = f'{{{" ".join(columns)}}} : ' if columns else ''
+        return ' '.join(f'{prefix}"{token}"*' for token in tokens)
+
+    def matching(self, query, kind, columns=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        return RawSQL(
+            f'SELECT rowid >> {KIND_CODE_BITS} FROM {self.table} WHERE {self.table} MATCH %s AND kind = %s',
+            (self.match_expression(tokens, columns), kind),
+        )
+
+    def search(self, query, kinds=None, active_only=False, limit=20):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        match = self.match_expression(tokens)
+        where = f'{self.table} MATCH %s'
+        params = [match]
+        if kinds:
+            where += f' AND kind IN ({", ".join(["%s"] * len(kinds))})'
+            params.extend(kinds)
+        if active_only:
+            where += ' AND is_active = 1'
+        # BM25 scores every match, which is slow for short prefixes that hit a
+        # large share of the index. Only the newest rank_window matches (by
+        # rowid, i.e. by object id) are ranked; walking rowids is cheap.
+        sql = (
+            f'SELECT rowid, bm25({self.table}, 0, 0, {self.title_weight}, {self.body_weight}) AS score '
+            f'FROM {self.table} WHERE {where} AND rowid >= COALESCE(('
+            f'SELECT rowid FROM {self.table} WHERE {where} ORDER BY rowid DESC LIMIT 1 OFFSET %s'
+            f'), 0) ORDER BY score LIMIT %s'
+        )
+        params = params + params + [self.rank_window, limit]
+        names = {code: kind for kind, code in KINDS.items()}
+        mask = (1 << KIND_CODE_BITS) - 1
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            # bm25() is lower-is-better; flip the sign so higher scores rank first
+            return [(names[rowid & mask], rowid >> KIND_CODE_BITS, -score) for rowid, score in cursor.fetchall()]
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Portable fallback that keeps no index and searches the tables directly
+    """
+    lookups = {
+        'event': (Event, ['title', 'description', 'location']),
+        'exam': (Exam, ['title', 'description', 'subject']),
+        'material': (StudyMaterial, ['title', 'description', 'subject']),
+        'student': (User, ['username', 'first_name', 'last_name', 'student_id']),
+    }
+    # The fields behind the 'title' column of each kind's documents
+    title_fields = {
+        'event': ['title'],
+        'exam': ['title'],
+        'material': ['title'],
+        'student': ['first_name', 'last_name'],
+    }
+
+    def index(self, documents):
+        pass
+
+    def remove(self, kind, object_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def matches(self, kind, tokens, fields=None, active_only=False):
+        model, all_fields = self.lookups[kind]
+        queryset = model.objects.all()
+        if kind == 'student':
+            queryset = queryset.filter(role='student')
+        if active_only:
+            queryset = queryset.filter(is_active=True)
+        for token in tokens:
+            condition = Q()
+            for field in fields or all_fields:
+                condition |= Q(**{f'{field}__icontains': token})
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def matching(self, query, kind, columns=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        fields = None
+        if columns and 'body' not in columns:
+            fields = self.title_fields[kind]
+        return self.matches(kind, tokens, fields).values('pk')
+
+    def search(self, query, kinds=None, active_only=False, limit=20):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        hits = []
+        for kind in kinds or KINDS:
+            queryset = self.matches(kind, tokens, active_only=active_only)
+            hits.extend((kind, pk, 0.0) for pk in queryset.order_by('-pk').values_list('pk', flat=True)[:limit])
+        return hits[:limit]
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite' and SQLiteFTSBackend.table in connection.introspection.table_names():
+        return SQLiteFTSBackend()
+    return DatabaseSearchBackend()
+
+
+def index_instance(instance, update_fields=None):
+    """Index (or un-index) an instance once the current transaction commits"""
+    if update_fields and not INDEXED_FIELDS[type(instance)].intersection(update_fields):
+        return
+    document = document_for(instance)
+    if document is not None:
+        transaction.on_commit(lambda: get_backend().index([document]))
+    elif isinstance(instance, User):
+        # A user who stops being a student drops out of the index
+        transaction.on_commit(lambda: get_backend().remove('student', [instance.pk]))
+
+
+def remove_instance(instance):
+    document = document_for(instance)
+    if document is not None:
+        kind, object_id = document.kind, document.object_id
+        transaction.on_commit(lambda: get_backend().remove(kind, [object_id]))
@@ -1,11 +1,9 @@
 from rest_framework import serializers
-from django.contrib.auth import get_user_model
-from .models import Event, Exam, Result, StudyMaterial
+from .models import Event, Exam, Result, StudyMaterial, calculate_percentage
+from .instrumentation import TimedSerializerMixin
 
-User = get_user_model()
 
-
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Event model
     """
@@ -15,10 +13,11 @@ class EventSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
         fields = '__all__'
+        select_related = ('created_by',)
         read_only_fields = ('created_by', 'created_at', 'updated_at')
 
 
-class EventCreateSerializer(serializers.ModelSerializer):
+class EventCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for creating events
     """
@@ -27,11 +26,11 @@ class EventCreateSerializer(serializers.ModelSerializer):
         fields = ('title', 'description', 'date', 'location')
     
     def create(self, validated_data):
-        validated_data['created_by'] = self.context['request'].user
+        validated_data['created_by_id'] = self.context['request'].user.id
         return super().create(validated_data)
 
 
-class ExamSerializer(serializers.ModelSerializer):
+class ExamSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Exam model
     """
@@ -41,10 +40,11 @@ class ExamSerializer(serializers.ModelSerializer):
     class Meta:
         model = Exam
         fields = '__all__'
+        select_related = ('faculty',)
         read_only_fields = ('faculty', 'created_at', 'updated_at')
 
 
-class ExamCreateSerializer(serializers.ModelSerializer):
+class ExamCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for creating exams
     """
@@ -53,11 +53,11 @@ class ExamCreateSerializer(serializers.ModelSerializer):
         fields = ('title', 'description', 'date', 'subject')
     
     def create(self, validated_data):
-        validated_data['faculty'] = self.context['request'].user
+        validated_data['faculty_id'] = self.context['request'].user.id
         return super().create(validated_data)
 
 
-class ResultSerializer(serializers.ModelSerializer):
+class ResultSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Result model
     """
@@ -69,15 +69,14 @@ class ResultSerializer(serializers.ModelSerializer):
     class Meta:
         model = Result
         fields = '__all__'
+        select_related = ('student', 'exam')
         read_only_fields = ('created_at', 'updated_at', 'grade')
     
     def get_percentage(self, obj):
-        if obj.total_marks > 0:
-            return round((obj.marks_obtained / obj.total_marks) * 100, 2)
-        return 0
+        return calculate_percentage(obj.marks_obtained, obj.total_marks)
 
 
-class ResultCreateSerializer(serializers.ModelSerializer):
+class ResultCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for creating results
     """
@@ -100,7 +99,7 @@ class ResultCreateSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class StudyMaterialSerializer(serializers.ModelSerializer):
+class StudyMaterialSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Study Material model
     """
@@ -111,10 +110,11 @@ class StudyMaterialSerializer(serializers.ModelSerializer):
     class Meta:
         model = StudyMaterial
         fields = '__all__'
+        select_related = ('uploaded_by',)
         read_only_fields = ('uploaded_by', 'created_at', 'updated_at')
 
 
-class StudyMaterialCreateSerializer(serializers.ModelSerializer):
+class StudyMaterialCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for creating study materials
     """
@@ -123,16 +123,31 @@ class StudyMaterialCreateSerializer(serializers.ModelSerializer):
         fields = ('title', 'description', 'material_type', 'file', 'subject')
     
     def create(self, validated_data):
-        validated_data['uploaded_by'] = self.context['request'].user
+        validated_data['uploaded_by_id'] = self.context['request'].user.id
         return super().create(validated_data)
 
 
-class UserBasicSerializer(serializers.ModelSerializer):
+class ResultBulkRowSerializer(serializers.Serializer):
     """
-    Basic user serializer for dropdowns and references
+    One row of a bulk marks sheet; the student may be given by id or username
     """
-    full_name = serializers.CharField(source='get_full_name', read_only=True)
-    
-    class Meta:
-        model = User
-        fields = ('id', 'username', 'full_name', 'role')
+    student = serializers.IntegerField(required=False)
+    username = serializers.CharField(required=False)
+    marks_obtained = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0)
+    total_marks = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0)
+    remarks = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+    def validate(self, attrs):
+        if attrs.get('student') is None and not attrs.get('username'):
+            raise serializers.ValidationError("Either student or username is required")
+        if attrs['marks_obtained'] > attrs['total_marks']:
+            raise serializers.ValidationError("Marks obtained cannot exceed total marks")
+        return attrs
+
+
+class ResultBulkCreateSerializer(serializers.Serializer):
+    """
+    Serializer for the envelope of a bulk result upload
+    """
+    exam = serializers.PrimaryKeyRelatedField(queryset=Exam.objects.all())
+    results = serializers.ListField(child=serializers.DictField(), allow_empty=False)
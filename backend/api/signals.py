@@ -1,83 +1,208 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from collections import Counter
+
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete
+from django.dispatch import receiver, Signal
 from .models import Event, Exam, Result, StudyMaterial
-from api.mongo import col
+from accounts.models import User
+from api import cache as response_cache, counters, documents, roster, search, stats, stored, transcripts
+from api.mirror import mirror
+
+# Sent with `instances` after Result.objects.bulk_create(), which skips post_save
+results_bulk_created = Signal()
 
 
 @receiver(post_save, sender=Event)
 def sync_event(sender, instance: Event, **kwargs):
-    col("events").update_one(
-        {"_id": instance.id},
-        {"$set": {
-            "title": instance.title,
-            "description": instance.description,
-            "date": instance.date,
-            "location": instance.location,
-            "created_by_id": instance.created_by_id,
-            "created_at": instance.created_at,
-            "updated_at": instance.updated_at,
-            "is_active": instance.is_active,
-        }},
-        upsert=True,
-    )
+    mirror.upsert("events", instance.id, documents.event_doc(instance))
 
 
 @receiver(post_save, sender=Exam)
 def sync_exam(sender, instance: Exam, **kwargs):
-    col("exams").update_one(
-        {"_id": instance.id},
-        {"$set": {
-            "title": instance.title,
-            "description": instance.description,
-            "date": instance.date,
-            "subject": instance.subject,
-            "faculty_id": instance.faculty_id,
-            "created_at": instance.created_at,
-            "updated_at": instance.updated_at,
-            "is_active": instance.is_active,
-        }},
-        upsert=True,
-    )
+    mirror.upsert("exams", instance.id, documents.exam_doc(instance))
 
 
 @receiver(post_save, sender=Result)
 def sync_result(sender, instance: Result, **kwargs):
-    col("results").update_one(
-        {"_id": instance.id},
-        {"$set": {
-            "exam_id": instance.exam_id,
-            "student_id": instance.student_id,
-            "marks_obtained": float(instance.marks_obtained),
-            "total_marks": float(instance.total_marks),
-            "grade": instance.grade,
-            "created_at": instance.created_at,
-            "updated_at": instance.updated_at,
-        }},
-        upsert=True,
-    )
+    mirror.upsert("results", instance.id, documents.result_doc(instance))
+
+
+@receiver(results_bulk_created, sender=Result)
+def sync_results_bulk(sender, instances, **kwargs):
+    mirror.upsert_many("results", {result.id: documents.result_doc(result) for result in instances})
 
 
 @receiver(post_save, sender=StudyMaterial)
 def sync_material(sender, instance: StudyMaterial, **kwargs):
-    try:
-        file_url = instance.file.url
-    except Exception:
-        file_url = None
-    col("materials").update_one(
-        {"_id": instance.id},
-        {"$set": {
-            "title": instance.title,
-            "description": instance.description,
-            "material_type": instance.material_type,
-            "subject": instance.subject,
-            "uploaded_by_id": instance.uploaded_by_id,
-            "file": file_url,
-            "file_size_kb": instance.file_size,
-            "created_at": instance.created_at,
-            "updated_at": instance.updated_at,
-            "is_active": instance.is_active,
-        }},
-        upsert=True,
-    )
+    mirror.upsert("materials", instance.id, documents.material_doc(instance))
+
+
+# Dashboard counters
+@receiver(pre_save, sender=Event)
+@receiver(pre_save, sender=Exam)
+@receiver(pre_save, sender=Result)
+@receiver(pre_save, sender=StudyMaterial)
+@receiver(pre_save, sender=User)
+def remember_counted_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    instance._counted_state = counters.stored_state(instance, update_fields)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_save, sender=Exam)
+@receiver(post_save, sender=Result)
+@receiver(post_save, sender=StudyMaterial)
+@receiver(post_save, sender=User)
+def update_counters(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_counted_state', None)
+    if before is counters.UNCHANGED:
+        return
+    counters.record_change(sender, before, counters.current_state(instance))
+    if sender is Exam and before is not None:
+        counters.move_exam_results(instance, before[0])
+
+
+@receiver(results_bulk_created, sender=Result)
+def update_counters_bulk(sender, instances, **kwargs):
+    total = Counter()
+    for result in instances:
+        total.update(counters.contribution(Result, counters.current_state(result)))
+    counters.adjust(total)
+
+
+@receiver(pre_delete, sender=Event)
+@receiver(pre_delete, sender=Exam)
+@receiver(pre_delete, sender=Result)
+@receiver(pre_delete, sender=StudyMaterial)
+@receiver(pre_delete, sender=User)
+def remember_deleted_state(sender, instance, origin=None, **kwargs):
+    # Read the state now; related rows may already be gone by post_delete
+    instance._counted_state = counters.deleted_state(instance, origin)
+
+
+@receiver(post_delete, sender=Event)
+@receiver(post_delete, sender=Exam)
+@receiver(post_delete, sender=Result)
+@receiver(post_delete, sender=StudyMaterial)
+@receiver(post_delete, sender=User)
+def discount_deleted(sender, instance, **kwargs):
+    counters.record_change(sender, getattr(instance, '_counted_state', None), None)
+
+
+# Full-text search index
+@receiver(post_save, sender=Event)
+@receiver(post_save, sender=Exam)
+@receiver(post_save, sender=StudyMaterial)
+@receiver(post_save, sender=User)
+def index_for_search(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    search.index_instance(instance, update_fields)
+
+
+@receiver(post_delete, sender=Event)
+@receiver(post_delete, sender=Exam)
+@receiver(post_delete, sender=StudyMaterial)
+@receiver(post_delete, sender=User)
+def remove_from_search(sender, instance, **kwargs):
+    search.remove_instance(instance)
+
+
+# Response cache versions
+CACHE_NAMES = {Event: 'event', Exam: 'exam', StudyMaterial: 'material', User: 'user'}
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_save, sender=Exam)
+@receiver(post_save, sender=StudyMaterial)
+@receiver(post_save, sender=User)
+def invalidate_cached_responses(sender, instance, update_fields=None, **kwargs):
+    if sender is User and not response_cache.user_display_changed(update_fields):
+        return
+    response_cache.bump(CACHE_NAMES[sender])
+
+
+@receiver(post_delete, sender=Event)
+@receiver(post_delete, sender=Exam)
+@receiver(post_delete, sender=StudyMaterial)
+@receiver(post_delete, sender=User)
+def invalidate_cached_responses_on_delete(sender, instance, **kwargs):
+    response_cache.bump(CACHE_NAMES[sender])
+
+
+# Exam statistics and student transcripts
+stored.register(Result, 'exam_id', 'student_id')
+stored.register(Exam, 'subject')
+
+
+@receiver(pre_save, sender=Result)
+def remember_result_refs(sender, instance, raw=False, update_fields=None, **kwargs):
+    # An edit may move a result to another exam or student; both sides change then
+    instance._stored_refs = None
+    if raw or instance._state.adding or (update_fields is not None and not {'exam', 'student'} & set(update_fields)):
+        return
+    values = stored.row(instance)
+    if values is not None:
+        instance._stored_refs = (values['exam_id'], values['student_id'])
+
+
+@receiver(post_save, sender=Result)
+def refresh_result_aggregates(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    exam_id, student_id = getattr(instance, '_stored_refs', None) or (None, None)
+    stats.invalidate(instance.exam_id, exam_id)
+    transcripts.mark_changed(instance.student_id, student_id)
+
+
+@receiver(post_delete, sender=Result)
+def refresh_result_aggregates_on_delete(sender, instance, **kwargs):
+    stats.invalidate(instance.exam_id)
+    transcripts.mark_changed(instance.student_id)
+
+
+@receiver(results_bulk_created, sender=Result)
+def refresh_result_aggregates_bulk(sender, instances, **kwargs):
+    stats.invalidate(*{result.exam_id for result in instances})
+    transcripts.mark_changed(*{result.student_id for result in instances})
+
+
+@receiver(pre_save, sender=Exam)
+def remember_exam_subject(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._stored_subject = None
+    if raw or instance._state.adding or (update_fields is not None and 'subject' not in update_fields):
+        return
+    values = stored.row(instance)
+    instance._stored_subject = None if values is None else values['subject']
+
+
+@receiver(post_save, sender=Exam)
+def regroup_transcripts(sender, instance, raw=False, **kwargs):
+    # Transcripts break marks down by subject
+    stored = getattr(instance, '_stored_subject', None)
+    if raw or stored is None or stored == instance.subject:
+        return
+    transcripts.mark_changed(*Result.objects.filter(exam_id=instance.pk).values_list('student_id', flat=True))
+
+
+# Dropdown rosters
+@receiver(pre_save, sender=User)
+def remember_roster_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    instance._roster_state = roster.stored_state(instance, update_fields)
+
+
+@receiver(post_save, sender=User)
+def invalidate_roster(sender, instance, raw=False, **kwargs):
+    before = getattr(instance, '_roster_state', None)
+    after = roster.current_state(instance)
+    if before != after:
+        roster.invalidate(before, after)
 
 
+@receiver(post_delete, sender=User)
+def invalidate_roster_on_delete(sender, instance, **kwargs):
+    roster.invalidate(roster.current_state(instance))
@@ -0,0 +1,46 @@
+"""
+Opt-in SQLite performance profile for single-node deployments (SQLITE_TUNED).
+
+Every new SQLite connection gets the SQLITE_PRAGMAS: WAL journaling, so
+readers keep reading while a writer commits; synchronous=NORMAL, which in
+WAL mode syncs at checkpoints rather than on every commit; a larger page
+cache and memory-mapped reads; and a busy timeout so writers queue for the
+lock instead of failing.
+
+Transactions on the primary are also opened with BEGIN IMMEDIATE. A
+deferred transaction that reads and then writes cannot wait for the write
+lock in WAL mode and fails with "database is locked" at once. An immediate
+one takes the lock up front and honours the busy timeout. Replicas only
+read, so their transactions stay deferred.
+"""
+import django
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Django 5.1 added OPTIONS['transaction_mode'], which settings.py sets. Before that the
+# backend always issues a deferred BEGIN, from the private method replaced below (as of
+# Django 4.2); recheck it when upgrading to a version that still lacks the option.
+OVERRIDE_BEGIN = django.VERSION < (5, 1)
+
+
+def _begin_immediate(connection):
+    def start_transaction_under_autocommit():
+        connection.cursor().execute('BEGIN IMMEDIATE')
+    return start_transaction_under_autocommit
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or not settings.SQLITE_TUNED:
+        return
+    # The raw connection, so the pragmas are neither timed nor logged as queries
+    cursor = connection.connection.cursor()
+    try:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+    if OVERRIDE_BEGIN and connection.alias == DEFAULT_DB_ALIAS:
+        connection._start_transaction_under_autocommit = _begin_immediate(connection)
@@ -0,0 +1,150 @@
+"""
+Score statistics per exam.
+
+Scores are percentages, since results of one exam may be out of different
+totals; results without a positive total are counted as ungraded and left
+out. The marks of an exam are read in one query and summarised in a single
+vectorized pass with NumPy when it is installed, or in plain Python with the
+same definitions otherwise (population standard deviation, percentiles
+interpolated linearly between the closest ranks).
+
+Summaries are cached per exam under a version token that every result
+write for the exam replaces (api/signals.py), so repeated requests are a
+cache read until the marks change.
+"""
+import math
+import statistics
+from bisect import bisect_right
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from . import cache as response_cache
+from .models import FAILING_GRADE, GRADE_THRESHOLDS, Result
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PERCENTILES = (10, 25, 50, 75, 90)
+# Lowest percentage that earns a passing grade
+PASS_PERCENTAGE = GRADE_THRESHOLDS[-1][0]
+HISTOGRAM_BINS = 10
+
+_CUTOFFS = [minimum for minimum, _ in reversed(GRADE_THRESHOLDS)]
+# Worst to best, indexed by bisect_right(_CUTOFFS, percentage)
+_GRADES = [FAILING_GRADE] + [grade for _, grade in reversed(GRADE_THRESHOLDS)]
+
+
+def version_name(exam_id):
+    return f'exam-results:{exam_id}'
+
+
+def invalidate(*exam_ids):
+    names = [version_name(exam_id) for exam_id in set(exam_ids) if exam_id is not None]
+    if names:
+        response_cache.bump(*names)
+
+
+def exam_statistics(exam_id):
+    version = response_cache.get_versions([version_name(exam_id)])[version_name(exam_id)]
+    key = f'exam-stats:{exam_id}:{version}'
+    summary = cache.get(key)
+    if summary is None:
+        summary = {'exam': exam_id, **summarize(_scores(exam_id))}
+        cache.set(key, summary, settings.EXAM_STATS_CACHE_TIMEOUT)
+    return summary
+
+
+def _scores(exam_id):
+    return list(
+        Result.objects.filter(exam_id=exam_id)
+        .values_list(Cast('marks_obtained', FloatField()), Cast('total_marks', FloatField()))
+    )
+
+
+def summarize(scores):
+    """Statistics for (marks_obtained, total_marks) pairs"""
+    summary = _summarize_numpy(scores) if np is not None else _summarize_python(scores)
+    summary['pass_percentage'] = PASS_PERCENTAGE
+    summary['engine'] = 'numpy' if np is not None else 'python'
+    return summary
+
+
+def _empty(ungraded):
+    return {
+        'count': 0, 'ungraded': ungraded, 'mean': None, 'std': None, 'min': None, 'max': None,
+        'median': None, 'percentiles': {f'p{q}': None for q in PERCENTILES}, 'pass_rate': None,
+        'grades': {grade: 0 for grade in reversed(_GRADES)},
+        'histogram': _histogram([0] * HISTOGRAM_BINS),
+    }
+
+
+def _histogram(counts):
+    width = 100 // HISTOGRAM_BINS
+    return [{'range': f'{i * width}-{(i + 1) * width}', 'count': int(count)} for i, count in enumerate(counts)]
+
+
+def _round(value):
+    return round(float(value), 2)
+
+
+def _summarize_numpy(scores):
+    data = np.asarray(scores, dtype=float).reshape(-1, 2)
+    graded = data[:, 1] > 0
+    values = data[graded, 0] / data[graded, 1] * 100
+    if not values.size:
+        return _empty(int((~graded).sum()))
+    grades = np.bincount(np.searchsorted(_CUTOFFS, values, side='right'), minlength=len(_GRADES))
+    # 100% (and anything above) falls in the top bin
+    bins = np.bincount(np.clip((values // (100 / HISTOGRAM_BINS)).astype(int), 0, HISTOGRAM_BINS - 1),
+                       minlength=HISTOGRAM_BINS)
+    return {
+        'count': int(values.size),
+        'ungraded': int((~graded).sum()),
+        'mean': _round(values.mean()),
+        'std': _round(values.std()),
+        'min': _round(values.min()),
+        'max': _round(values.max()),
+        'median': _round(np.median(values)),
+        'percentiles': {f'p{q}': _round(v) for q, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))},
+        'pass_rate': _round((values >= PASS_PERCENTAGE).mean() * 100),
+        'grades': {grade: int(grades[i]) for i, grade in reversed(list(enumerate(_GRADES)))},
+        'histogram': _histogram(bins),
+    }
+
+
+def _percentile(ordered, q):
+    """Linear interpolation between closest ranks, as numpy.percentile does by default"""
+    position = (len(ordered) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _summarize_python(scores):
+    values = sorted(marks / total * 100 for marks, total in scores if total > 0)
+    ungraded = len(scores) - len(values)
+    if not values:
+        return _empty(ungraded)
+    grades = [0] * len(_GRADES)
+    bins = [0] * HISTOGRAM_BINS
+    for value in values:
+        grades[bisect_right(_CUTOFFS, value)] += 1
+        bins[min(max(int(value // (100 / HISTOGRAM_BINS)), 0), HISTOGRAM_BINS - 1)] += 1
+    return {
+        'count': len(values),
+        'ungraded': ungraded,
+        'mean': _round(statistics.fmean(values)),
+        'std': _round(statistics.pstdev(values)),
+        'min': _round(values[0]),
+        'max': _round(values[-1]),
+        'median': _round(statistics.median(values)),
+        'percentiles': {f'p{q}': _round(_percentile(values, q)) for q in PERCENTILES},
+        'pass_rate': _round(sum(1 for value in values if value >= PASS_PERCENTAGE) / len(values) * 100),
+        'grades': {grade: grades[i] for i, grade in reversed(list(enumerate(_GRADES)))},
+        'histogram': _histogram(bins),
+    }
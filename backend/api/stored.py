@@ -0,0 +1,37 @@
+"""
+The stored values of a row that is about to be saved, read once per save.
+
+Several pre_save receivers compare a row before and after a save: the
+dashboard counters, the transcript and exam statistics receivers, the
+rosters and token revocation. Each registers the columns it needs with
+register(); the first receiver to call row() during a save reads all of
+them for that model in one query, and the others reuse the result.
+"""
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+_fields = {}
+
+
+def register(model, *lookups):
+    """Include lookups (column names or related lookups) in the stored row of model"""
+    fields = _fields.setdefault(model, [])
+    fields.extend(lookup for lookup in lookups if lookup not in fields)
+
+
+def row(instance):
+    """{lookup: value} for every registered lookup, or None if the row is not stored"""
+    if '_stored_row' not in instance.__dict__:
+        model = type(instance)
+        instance._stored_row = (
+            None if instance.pk is None
+            else model._default_manager.filter(pk=instance.pk).values(*_fields[model]).first()
+        )
+    return instance._stored_row
+
+
+# Connected when this module is first imported, which is before the receivers that call
+# row() (they import it), so a save never sees the row read for a previous save
+@receiver(pre_save)
+def forget_stored_row(sender, instance, **kwargs):
+    instance.__dict__.pop('_stored_row', None)
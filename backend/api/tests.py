@@ -0,0 +1,717 @@
+"""
+Tests for the api app, and for the account signals it depends on.
+
+Mongo is not available to the test run, so the mirror is suspended unless a
+test patches in mongomock.
+"""
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from importlib.util import find_spec
+from unittest import mock, skipIf
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.authentication import ClaimsRefreshToken
+from accounts.models import User
+from . import counters, mongo as mongo_module, stats, throttling, transcripts
+from .mirror import MirrorPipeline, Spool, mirror
+from .models import DashboardCounter, Event, Exam, Result, StudyMaterial
+from .replicas import PrimaryReplicaRouter, primary_reads, replica_reads
+
+REPLICA = 'replica'
+
+LIST_ENDPOINTS = [
+    '/api/events/',
+    '/api/exams/',
+    '/api/results/',
+    '/api/materials/',
+    '/api/auth/users/',
+]
+
+
+class MirrorSuspendedMixin:
+    """Suspends the Mongo mirror and starts from an empty cache"""
+
+    def setUp(self):
+        super().setUp()
+        suspended = mirror.suspended()
+        suspended.__enter__()
+        self.addCleanup(suspended.__exit__, None, None, None)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+
+class TemporaryMediaMixin:
+    """Stores uploads in a directory removed after the test"""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+@override_settings(DATABASE_REPLICA_ALIAS=REPLICA)
+class PrimaryReplicaRouterTests(MirrorSuspendedMixin, TransactionTestCase):
+    """
+    Primary/replica routing (api/replicas.py) against a second SQLite file.
+
+    Each test copies the test database into a replica file with SQLite's backup
+    API and registers it under DATABASE_REPLICA_ALIAS. Rows written to the
+    primary afterwards are missing from the replica, which shows where a read
+    was served from.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user('admin', role='admin')
+        self.create_event('Replicated')
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'replica.sqlite3')
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        replica = sqlite3.connect(path)
+        primary.connection.backup(replica)
+        replica.close()
+
+        databases = mock.patch.dict(settings.DATABASES, {REPLICA: {**primary.settings_dict, 'NAME': path}})
+        databases.start()
+        self.addCleanup(databases.stop)
+        self.addCleanup(self.close_replica)
+        self.router = PrimaryReplicaRouter()
+
+    @staticmethod
+    def close_replica():
+        connections[REPLICA].close()
+        del connections[REPLICA]
+
+    def create_event(self, title):
+        return Event.objects.create(title=title, description='', date=timezone.now(), location='Hall',
+                                    created_by=self.admin)
+
+    def test_reads_use_replica_inside_replica_reads(self):
+        self.assertEqual(self.router.db_for_read(Event), DEFAULT_DB_ALIAS)
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Event), REPLICA)
+            with primary_reads():
+                self.assertEqual(self.router.db_for_read(Event), DEFAULT_DB_ALIAS)
+
+    def test_reads_stay_on_primary_inside_atomic(self):
+        with replica_reads(), transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Event), DEFAULT_DB_ALIAS)
+            self.create_event('Unreplicated')
+            self.assertEqual(Event.objects.count(), 2)
+
+    def test_writes_go_to_primary(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_write(Event), DEFAULT_DB_ALIAS)
+            self.create_event('Unreplicated')
+        self.assertEqual(Event.objects.using(DEFAULT_DB_ALIAS).count(), 2)
+        self.assertEqual(Event.objects.using(REPLICA).count(), 1)
+
+    def test_queries_follow_the_router(self):
+        self.create_event('Unreplicated')
+        self.assertEqual(Event.objects.count(), 2)
+        with replica_reads():
+            self.assertEqual(Event.objects.count(), 1)
+
+    def test_no_replica_configured(self):
+        with override_settings(DATABASE_REPLICA_ALIAS=None), replica_reads():
+            self.assertEqual(self.router.db_for_read(Event), DEFAULT_DB_ALIAS)
+
+    def test_only_primary_is_migrated(self):
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'api'))
+        self.assertFalse(self.router.allow_migrate(REPLICA, 'api'))
+
+    def test_list_view_reads_replica_but_caches_primary_pages(self):
+        self.create_event('Unreplicated')
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with override_settings(RESPONSE_CACHE_ENABLED=False):
+            self.assertEqual(client.get('/api/events/').data['count'], 1)
+        with override_settings(RESPONSE_CACHE_ENABLED=True):
+            self.assertEqual(client.get('/api/events/').data['count'], 2)
+
+
+@override_settings(TOKEN_CLAIMS_TRUSTED=True)
+class TokenRevocationTests(MirrorSuspendedMixin, TestCase):
+    """Changes to the claims, password or is_active revoke outstanding access tokens"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('student', password='secret-1', role='student')
+        self.token = ClaimsRefreshToken.for_user(self.user).access_token
+
+    def get_status(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        return client.get('/api/dashboard-stats/').status_code
+
+    def test_unrelated_change_keeps_token(self):
+        self.user.first_name = 'Ada'
+        self.user.save()
+        self.assertEqual(self.get_status(), 200)
+
+    def test_save_reads_the_stored_row_once(self):
+        # Token revocation and the rosters compare against the same stored row
+        self.user.first_name = 'Ada'
+        with CaptureQueriesContext(connection) as queries:
+            self.user.save()
+        reads = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(len(reads), 1, reads)
+
+    def test_revoked_in_the_second_the_token_was_issued(self):
+        # iat is whole seconds; a revocation later in the same second still applies
+        with mock.patch('accounts.authentication.time.time', return_value=self.token['iat'] + 0.9):
+            self.user.role = 'faculty'
+            self.user.save()
+        self.assertEqual(self.get_status(), 401)
+
+    def test_token_issued_after_revocation_is_accepted(self):
+        with mock.patch('accounts.authentication.time.time', return_value=self.token['iat'] - 1):
+            self.user.role = 'faculty'
+            self.user.save()
+        self.assertEqual(self.get_status(), 200)
+
+    def test_role_change_revokes(self):
+        self.user.role = 'faculty'
+        self.user.save(update_fields=['role'])
+        self.assertEqual(self.get_status(), 401)
+
+    def test_password_change_revokes(self):
+        self.user.set_password('secret-2')
+        self.user.save()
+        self.assertEqual(self.get_status(), 401)
+
+    def test_password_rehash_keeps_token(self):
+        self.user._password_rehash = True
+        self.user.set_password('secret-1')
+        self.user.save(update_fields=['password'])
+        self.assertEqual(self.get_status(), 200)
+
+    def test_deactivation_revokes(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_status(), 401)
+
+    def test_delete_revokes(self):
+        self.user.delete()
+        self.assertEqual(self.get_status(), 401)
+
+    def test_untrusted_claims_load_the_user(self):
+        with override_settings(TOKEN_CLAIMS_TRUSTED=False):
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            self.assertEqual(self.get_status(), 401)
+
+
+# Measure the views themselves, not the response cache in front of them
+@override_settings(RESPONSE_CACHE_ENABLED=False, DATABASE_REPLICA_ALIAS=None)
+class ListQueryCountTests(TemporaryMediaMixin, MirrorSuspendedMixin, TestCase):
+    """
+    N+1 guard: every list endpoint issues as many queries for a large page as
+    for a small one, as each role.
+    """
+    small = 2
+    large = 10
+
+    def setUp(self):
+        super().setUp()
+        self.users = [
+            User.objects.create_user('qc_admin', role='admin'),
+            User.objects.create_user('qc_faculty', role='faculty'),
+            User.objects.create_user('qc_student', role='student'),
+        ]
+        self.faculty, self.student = self.users[1:]
+
+    def populate(self, count):
+        now = timezone.now()
+        start = Exam.objects.count()
+        for i in range(start, start + count):
+            Event.objects.create(title=f'Event {i}', description='Check', date=now, created_by=self.faculty)
+            exam = Exam.objects.create(title=f'Exam {i}', date=now, subject='Checks', faculty=self.faculty)
+            other = User.objects.create_user(f'qc_student_{i}', role='student')
+            Result.objects.create(exam=exam, student=self.student, marks_obtained=80, total_marks=100)
+            Result.objects.create(exam=exam, student=other, marks_obtained=40, total_marks=100)
+            StudyMaterial.objects.create(
+                title=f'Material {i}', uploaded_by=self.faculty,
+                file=ContentFile(b'query count check', name=f'material_{i}.txt'),
+            )
+
+    def measure(self):
+        counts = {}
+        for user in self.users:
+            client = APIClient()
+            # A real token, so authentication's own queries are counted too
+            token = ClaimsRefreshToken.for_user(user).access_token
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            for url in LIST_ENDPOINTS:
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                self.assertEqual(response.status_code, 200, f'GET {url} as {user.role}')
+                counts[(user.role, url)] = len(queries)
+        return counts
+
+    def test_query_counts_do_not_grow_with_page_size(self):
+        self.populate(self.small)
+        before = self.measure()
+        self.populate(self.large - self.small)
+        after = self.measure()
+        for (role, url), count in before.items():
+            with self.subTest(role=role, url=url):
+                self.assertEqual(after[(role, url)], count)
+
+
+class BulkResultEntryTests(MirrorSuspendedMixin, TestCase):
+    """POST /api/results/bulk/: ownership, per-row errors and the CSV inputs"""
+
+    def setUp(self):
+        super().setUp()
+        self.faculty = User.objects.create_user('owner', role='faculty')
+        self.exam = Exam.objects.create(title='Midterm', date=timezone.now(), subject='Physics', faculty=self.faculty)
+        self.students = [User.objects.create_user(f'student_{i}', role='student') for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.faculty)
+
+    def row(self, student, marks=70, **extra):
+        return {'student': student.id, 'marks_obtained': marks, 'total_marks': 100, **extra}
+
+    def post(self, rows):
+        return self.client.post('/api/results/bulk/', {'exam': self.exam.id, 'results': rows}, format='json')
+
+    def test_other_faculty_is_forbidden(self):
+        self.client.force_authenticate(User.objects.create_user('other', role='faculty'))
+        response = self.post([self.row(self.students[0])])
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Result.objects.exists())
+
+    def test_admin_may_enter_any_exam(self):
+        self.client.force_authenticate(User.objects.create_user('admin', role='admin'))
+        response = self.post([self.row(self.students[0])])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+
+    def test_invalid_rows_are_reported_by_index(self):
+        Result.objects.create(exam=self.exam, student=self.students[2], marks_obtained=50, total_marks=100)
+        response = self.post([
+            self.row(self.students[0]),
+            {'username': self.students[1].username, 'marks_obtained': 80, 'total_marks': 100},
+            {'student': 999999, 'marks_obtained': 60, 'total_marks': 100},
+            self.row(self.students[0], marks=90),
+            self.row(self.faculty),
+            self.row(self.students[2]),
+            {'username': 'nobody', 'marks_obtained': 60, 'total_marks': 100},
+            {'marks_obtained': 60, 'total_marks': 100},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        messages = {error['row']: str(error['errors']['non_field_errors'][0]) for error in response.data['errors']}
+        self.assertEqual(messages, {
+            2: 'Student not found',
+            3: 'Duplicate row for this student',
+            4: 'Selected user is not a student',
+            5: 'Result for this student and exam already exists',
+            6: 'Student not found',
+            7: 'Either student or username is required',
+        })
+        self.assertEqual(
+            set(Result.objects.filter(exam=self.exam).values_list('student_id', 'marks_obtained')),
+            {(self.students[0].id, 70), (self.students[1].id, 80), (self.students[2].id, 50)},
+        )
+
+    def test_marks_above_total_are_rejected(self):
+        response = self.post([self.row(self.students[0], marks=101), self.row(self.students[1], marks=100)])
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 0)
+        self.assertEqual(str(response.data['errors'][0]['errors']['non_field_errors'][0]),
+                         'Marks obtained cannot exceed total marks')
+
+    def test_no_valid_rows(self):
+        response = self.post([self.row(self.faculty)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['failed'], 1)
+
+    def test_csv_body(self):
+        body = (
+            'student,marks_obtained,total_marks,remarks\n'
+            f'{self.students[0].id},75,100,Good\n'
+            '999999,60,100,\n'
+        )
+        response = self.client.post(f'/api/results/bulk/?exam={self.exam.id}', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [1])
+        self.assertEqual(Result.objects.get(exam=self.exam).remarks, 'Good')
+
+    def test_csv_upload(self):
+        sheet = SimpleUploadedFile('marks.csv', (
+            'username,marks_obtained,total_marks\n'
+            f'{self.students[0].username},75,100\n'
+            f'{self.students[1].username},85,100\n'
+        ).encode(), content_type='text/csv')
+        response = self.client.post('/api/results/bulk/', {'exam': self.exam.id, 'file': sheet}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(Result.objects.filter(exam=self.exam).count(), 2)
+
+
+class ResultAggregateTests(MirrorSuspendedMixin, TestCase):
+    """Transcripts and exam statistics follow results that move or go away"""
+
+    def setUp(self):
+        super().setUp()
+        faculty = User.objects.create_user('examiner', role='faculty')
+        self.physics = Exam.objects.create(title='Optics', date=timezone.now(), subject='Physics', faculty=faculty)
+        self.maths = Exam.objects.create(title='Algebra', date=timezone.now(), subject='Maths', faculty=faculty)
+        self.alice = User.objects.create_user('alice', role='student')
+        self.bob = User.objects.create_user('bob', role='student')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.result = Result.objects.create(exam=self.physics, student=self.alice,
+                                                marks_obtained=80, total_marks=100)
+        # Cache the statistics, so a missed invalidation shows
+        self.assertEqual(self.count(self.physics), 1)
+        self.assertEqual(self.count(self.maths), 0)
+
+    @staticmethod
+    def count(exam):
+        return stats.exam_statistics(exam.pk)['count']
+
+    @staticmethod
+    def subjects(student):
+        return {row['subject']: row['results'] for row in transcripts.transcript(student.pk)['subjects']}
+
+    def save(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.result.save(**kwargs)
+
+    def test_move_to_another_exam(self):
+        self.result.exam = self.maths
+        self.save()
+        self.assertEqual((self.count(self.physics), self.count(self.maths)), (0, 1))
+        self.assertEqual(self.subjects(self.alice), {'Maths': 1})
+
+    def test_move_to_another_exam_with_update_fields(self):
+        self.result.exam = self.maths
+        self.save(update_fields=['exam'])
+        self.assertEqual((self.count(self.physics), self.count(self.maths)), (0, 1))
+        self.assertEqual(self.subjects(self.alice), {'Maths': 1})
+
+    def test_move_to_another_student(self):
+        self.result.student = self.bob
+        self.save()
+        self.assertEqual(self.subjects(self.alice), {})
+        self.assertEqual(self.subjects(self.bob), {'Physics': 1})
+        self.assertEqual(transcripts.transcript(self.bob.pk)['marks_obtained'], '80.00')
+
+    def test_marks_change(self):
+        self.result.marks_obtained = 40
+        self.save(update_fields=['marks_obtained'])
+        self.assertEqual(stats.exam_statistics(self.physics.pk)['mean'], 40)
+        self.assertEqual(transcripts.transcript(self.alice.pk)['marks_obtained'], '40.00')
+
+    def test_exam_subject_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.physics.subject = 'Optics'
+            self.physics.save()
+        self.assertEqual(self.subjects(self.alice), {'Optics': 1})
+
+    def test_exam_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.physics.delete()
+        self.assertEqual(self.count(self.physics), 0)
+        self.assertEqual(self.subjects(self.alice), {})
+        self.assertEqual(transcripts.transcript(self.alice.pk)['results'], 0)
+
+
+class DashboardCounterTests(TemporaryMediaMixin, MirrorSuspendedMixin, TestCase):
+    """The incrementally maintained counters match a recount after every kind of write"""
+
+    def setUp(self):
+        super().setUp()
+        self.faculty = User.objects.create_user('lecturer', role='faculty')
+        self.other_faculty = User.objects.create_user('reader', role='faculty')
+        self.students = [User.objects.create_user(f'pupil_{i}', role='student') for i in range(3)]
+        self.event = Event.objects.create(title='Fair', description='', date=timezone.now(), location='Hall',
+                                          created_by=self.faculty)
+        self.exam = self.create_exam('Final')
+        self.material = StudyMaterial.objects.create(
+            title='Notes', uploaded_by=self.faculty, file=ContentFile(b'notes', name='notes.txt'),
+        )
+        for student in self.students[:2]:
+            Result.objects.create(exam=self.exam, student=student, marks_obtained=50, total_marks=100)
+
+    def create_exam(self, title):
+        return Exam.objects.create(title=title, date=timezone.now(), subject='Physics', faculty=self.faculty)
+
+    def assertCountersMatch(self):
+        actual = counters.compute_all()
+        keys = set(actual) | set(DashboardCounter.objects.values_list('key', flat=True))
+        self.assertEqual(counters.read(keys), {key: actual.get(key, 0) for key in keys})
+        # What reconcile_counters would have corrected: nothing
+        self.assertEqual(counters.reconcile(), {})
+
+    def test_create(self):
+        self.assertCountersMatch()
+        self.assertEqual(counters.read(['results', counters.user_key(self.faculty.pk, 'exam_results')]),
+                         {'results': 2, counters.user_key(self.faculty.pk, 'exam_results'): 2})
+
+    def test_update(self):
+        self.event.title = 'Spring fair'
+        self.event.save()
+        result = Result.objects.get(student=self.students[0])
+        result.marks_obtained = 90
+        result.save(update_fields=['marks_obtained'])
+        result.student = self.students[2]
+        result.save()
+        self.assertCountersMatch()
+
+    def test_activate_and_deactivate(self):
+        for instance in (self.event, self.exam, self.material):
+            instance.is_active = False
+            instance.save()
+        self.assertCountersMatch()
+        self.assertEqual(counters.read(['exams:active'])['exams:active'], 0)
+        self.exam.is_active = True
+        self.exam.save(update_fields=['is_active'])
+        self.assertCountersMatch()
+
+    def test_owner_change(self):
+        self.exam.faculty = self.other_faculty
+        self.exam.save()
+        self.event.created_by = self.other_faculty
+        self.event.save(update_fields=['created_by'])
+        result = Result.objects.get(student=self.students[0])
+        result.exam = self.create_exam('Resit')
+        result.save()
+        self.assertCountersMatch()
+
+    def test_cascaded_user_delete(self):
+        self.students[0].delete()
+        self.assertCountersMatch()
+        self.faculty.delete()
+        self.assertCountersMatch()
+        self.assertEqual(counters.read(['results', 'exams', 'events', 'materials']),
+                         {'results': 0, 'exams': 0, 'events': 0, 'materials': 0})
+
+    def test_cascaded_exam_delete(self):
+        self.exam.delete()
+        self.assertCountersMatch()
+
+    def test_queryset_delete(self):
+        Exam.objects.filter(pk=self.exam.pk).delete()
+        Result.objects.all().delete()
+        self.assertCountersMatch()
+
+    def test_bulk_insert(self):
+        client = APIClient()
+        client.force_authenticate(self.faculty)
+        exam = self.create_exam('Quiz')
+        rows = [{'student': student.pk, 'marks_obtained': 60, 'total_marks': 100} for student in self.students]
+        response = client.post('/api/results/bulk/', {'exam': exam.pk, 'results': rows}, format='json')
+        self.assertEqual(response.data['created'], 3)
+        self.assertCountersMatch()
+
+
+@skipIf(find_spec('mongomock') is None, 'mongomock is not installed')
+class MirrorSpoolTests(SimpleTestCase):
+    """Operations spooled while Mongo is unreachable are replayed in order, and none are lost"""
+
+    def setUp(self):
+        import mongomock
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'mirror.spool')
+        # The manager opens its client lazily; drop any open one so the stand-in is used
+        mongo_module.mongo.close()
+        self.addCleanup(mongo_module.mongo.close)
+        for patcher in (
+            mock.patch.object(mongo_module, 'MongoClient', mongomock.MongoClient),
+            mock.patch.object(mongo_module.mongo, 'breaker', mongo_module.CircuitBreaker(1, 60)),
+            mock.patch('api.mirror.logger.disabled', True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.db = mongo_module.mongo.client[mongo_module.mongo.db_name]
+
+    def pipeline(self, batch_size=2):
+        # Synchronous, so each put() is written (or spooled) before it returns
+        return MirrorPipeline(enabled=False, batch_size=batch_size, spool=Spool(self.path))
+
+    def open_circuit(self):
+        mongo_module.mongo.breaker.record_failure()
+
+    def close_circuit(self):
+        mongo_module.mongo.breaker.record_success()
+
+    def docs(self, collection):
+        return {doc.pop('_id'): doc for doc in self.db[collection].find()}
+
+    def test_spools_while_circuit_is_open(self):
+        pipeline = self.pipeline()
+        self.open_circuit()
+        pipeline.put(('upsert', 'events', 1, {'title': 'Fair'}))
+        pipeline.put(('insert', 'logins', None, {'user_id': 1}))
+        self.assertEqual(self.docs('events'), {})
+        self.assertTrue(pipeline.spool.pending())
+        self.assertEqual(pipeline.spooled(), 2)
+
+    def test_replays_in_order_once_circuit_closes(self):
+        pipeline = self.pipeline()
+        self.open_circuit()
+        pipeline.put(('upsert', 'events', 1, {'title': 'Fair', 'location': 'Hall'}))
+        pipeline.put(('delete', 'events', 1, None))
+        pipeline.put(('upsert', 'events', 1, {'title': 'Spring fair'}))
+        pipeline.put(('upsert', 'events', 2, {'title': 'Talk'}))
+        pipeline.put(('upsert', 'events', 2, {'title': 'Keynote'}))
+        self.assertEqual(pipeline.spooled(), 5)
+
+        self.close_circuit()
+        # The next write replays the spool first, so it is not overwritten by older state
+        pipeline.put(('upsert', 'events', 2, {'location': 'Lab'}))
+        self.assertEqual(self.docs('events'), {
+            1: {'title': 'Spring fair'},
+            2: {'title': 'Keynote', 'location': 'Lab'},
+        })
+        self.assertFalse(pipeline.spool.pending())
+        self.assertEqual(pipeline.spooled(), 0)
+
+    def test_failed_replay_goes_back_to_the_spool(self):
+        pipeline = self.pipeline(batch_size=1)
+        self.open_circuit()
+        for doc_id in range(1, 4):
+            pipeline.put(('upsert', 'events', doc_id, {'title': f'Event {doc_id}'}))
+        self.close_circuit()
+        write_merged = pipeline.write_merged
+
+        def fail_after_first(merged):
+            # Mongo goes away again after the first replayed batch
+            if self.docs('events'):
+                self.open_circuit()
+            return write_merged(merged)
+
+        with mock.patch.object(pipeline, 'write_merged', fail_after_first):
+            pipeline.replay()
+        self.assertEqual(len(self.docs('events')), 1)
+        self.assertEqual(pipeline.spooled(), 2)
+
+        self.close_circuit()
+        pipeline.replay()
+        self.assertEqual(set(self.docs('events')), {1, 2, 3})
+        self.assertEqual(pipeline.spooled(), 0)
+
+    def test_no_loss_across_two_pipelines(self):
+        first, second = self.pipeline(), self.pipeline()
+        self.open_circuit()
+        for doc_id in range(1, 7):
+            (first if doc_id % 2 else second).put(('upsert', 'events', doc_id, {'title': f'Event {doc_id}'}))
+        # A replay file left behind by a process that died mid-replay
+        pid = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                             capture_output=True, text=True, check=True).stdout.strip()
+        Spool(f'{self.path}.{pid}{Spool.suffix}').append([('upsert', 'events', 7, {'title': 'Event 7'})])
+        self.assertEqual(second.spooled(), 7)
+
+        self.close_circuit()
+        first.put(('upsert', 'events', 8, {'title': 'Event 8'}))
+        second.put(('upsert', 'events', 9, {'title': 'Event 9'}))
+        self.assertEqual(set(self.docs('events')), set(range(1, 10)))
+        self.assertEqual((first.spooled(), second.spooled()), (0, 0))
+
+    def test_size_counts_lines_appended_elsewhere(self):
+        pipeline = self.pipeline()
+        self.open_circuit()
+        pipeline.put(('upsert', 'events', 1, {'title': 'Fair'}))
+        self.assertEqual(pipeline.spooled(), 1)
+        # Another process appending to the same spool
+        Spool(self.path).append([('delete', 'events', 2, None), ('delete', 'events', 3, None)])
+        self.assertEqual(pipeline.spooled(), 3)
+
+
+class BucketStoreTestsMixin:
+    """Token bucket maths and the login throttle, run against each bucket store"""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        super().setUp()
+        self.store = self.make_store()
+        patcher = mock.patch.object(throttling, 'get_store', lambda: self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_refill(self):
+        bucket = [('test:ip:1', *throttling.parse_rate('3/min'))]
+        self.assertEqual([self.store.take(bucket, now=100) for _ in range(3)], [0, 0, 0])
+        # Empty: one token comes back every 20 seconds
+        self.assertAlmostEqual(self.store.take(bucket, now=100), 20)
+        self.assertAlmostEqual(self.store.take(bucket, now=110), 10)
+        self.assertEqual(self.store.take(bucket, now=120), 0)
+        # Never more than the capacity, however long the bucket was idle
+        self.assertEqual([self.store.take(bucket, now=10000) for _ in range(3)], [0, 0, 0])
+        self.assertGreater(self.store.take(bucket, now=10000), 0)
+
+    def test_rejection_takes_no_tokens(self):
+        endpoint = ('test:endpoint:', *throttling.parse_rate('2/s'))
+        client = ('test:ip:1', *throttling.parse_rate('1/min'))
+        self.assertEqual(self.store.take([endpoint, client], now=100), 0)
+        self.assertAlmostEqual(self.store.take([endpoint, client], now=100), 60)
+        # The endpoint bucket kept the token the rejected request did not use
+        self.assertEqual(self.store.take([endpoint, ('test:ip:2', *client[1:])], now=100), 0)
+        self.assertGreater(self.store.take([endpoint], now=100), 0)
+
+    def test_clear(self):
+        bucket = [('test:ip:1', *throttling.parse_rate('1/hour'))]
+        self.store.take(bucket, now=100)
+        self.store.clear()
+        self.assertEqual(self.store.take(bucket, now=100), 0)
+
+    def login(self, username, ip='10.0.0.1'):
+        return APIClient().post('/api/auth/login/', {'username': username, 'password': 'wrong'},
+                                format='json', REMOTE_ADDR=ip)
+
+    @override_settings(THROTTLE_RATES={'login': {'ip': '4/min', 'account': '2/min'}})
+    def test_login_account_bucket(self):
+        self.assertEqual([self.login('alice').status_code for _ in range(2)], [400, 400])
+        response = self.login('Alice')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(int(response['Retry-After']), 30)
+        # Other accounts from the same address, and the same account from elsewhere, go on
+        self.assertEqual(self.login('bob').status_code, 400)
+        self.assertEqual(self.login('alice', ip='10.0.0.2').status_code, 400)
+        # Until the address itself runs out
+        self.assertEqual(self.login('carol').status_code, 400)
+        self.assertEqual(self.login('dave').status_code, 429)
+
+    @override_settings(THROTTLE_ENABLED=False, THROTTLE_RATES={'login': {'account': '1/min'}})
+    def test_disabled(self):
+        self.assertEqual([self.login('alice').status_code for _ in range(3)], [400, 400, 400])
+
+
+class MemoryBucketStoreTests(BucketStoreTestsMixin, MirrorSuspendedMixin, TestCase):
+
+    def make_store(self):
+        return throttling.MemoryBucketStore()
+
+
+class SQLiteBucketStoreTests(BucketStoreTestsMixin, MirrorSuspendedMixin, TestCase):
+
+    def make_store(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        return throttling.SQLiteBucketStore(os.path.join(directory, 'throttle.sqlite3'))
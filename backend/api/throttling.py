@@ -0,0 +1,237 @@
+"""
+Token-bucket throttling for the expensive public endpoints.
+
+Each throttled endpoint has a scope (login, register, message) with up to
+three buckets: one shared by every client of the endpoint (admission
+control for the whole process group), one per client IP and one per
+authenticated user. Login adds one per IP and username. A request is
+admitted only when every bucket has a token, and only then are tokens
+taken, so rejected requests do not drain the other buckets. Rejections
+raise DRF's 429 with Retry-After before the request body is parsed (login
+reads just the username from it), i.e. before any database, hashing, Mongo
+or SMTP work.
+
+Rates are "<tokens>/<period>" strings (THROTTLE_RATES): the bucket holds at
+most that many tokens and refills at that rate, so a client may burst up to
+the full amount and is then held to the average.
+
+Buckets live in THROTTLE_STORE: MemoryBucketStore keeps them per process;
+SQLiteBucketStore keeps them in a local SQLite file (THROTTLE_PATH) shared
+by every worker process on the host.
+"""
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+from .async_support import parse_body
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+# Buckets idle for this long are full again in any sane configuration and are dropped
+IDLE_SECONDS = 86400
+
+
+def parse_rate(rate):
+    """'10/min' -> (capacity 10.0, refill 10/60 tokens per second); None or '' disables the bucket"""
+    if not rate:
+        return None
+    count, _, period = rate.partition('/')
+    capacity = float(count)
+    return capacity, capacity / PERIODS[period.strip().lower()]
+
+
+class MemoryBucketStore:
+    """
+    Buckets in a dict, guarded by a lock; limits apply per process.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def take(self, buckets, now=None):
+        """
+        Take one token from each (key, capacity, refill) bucket if all have one.
+
+        Returns 0 when admitted, otherwise the seconds until the emptiest
+        bucket has a token again.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            levels = {}
+            for key, capacity, refill in buckets:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                levels[key] = min(capacity, tokens + (now - updated) * refill)
+            wait = _wait(buckets, levels)
+            if not wait:
+                for key, _, _ in buckets:
+                    self._buckets[key] = (levels[key] - 1, now)
+                self._calls += 1
+                if self._calls % 1000 == 0:
+                    self._prune(now)
+            return wait
+
+    def _prune(self, now):
+        stale = [key for key, (_, updated) in self._buckets.items() if now - updated > IDLE_SECONDS]
+        for key in stale:
+            del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBucketStore:
+    """
+    Buckets in a local SQLite file, so all worker processes share the limits.
+
+    Each check is one short write transaction on its own small database, kept
+    apart from the application database so throttling never contends with it.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path or settings.THROTTLE_PATH)
+        self._local = threading.local()
+        self._calls = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, buckets, now=None):
+        # Wall clock: monotonic clocks are not comparable across processes
+        now = time.time() if now is None else now
+        conn = self._connection()
+        keys = [key for key, _, _ in buckets]
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            stored = dict(
+                (key, (tokens, updated))
+                for key, tokens, updated in conn.execute(
+                    f'SELECT key, tokens, updated FROM buckets WHERE key IN ({",".join("?" * len(keys))})', keys
+                )
+            )
+            levels = {}
+            for key, capacity, refill in buckets:
+                tokens, updated = stored.get(key, (capacity, now))
+                levels[key] = min(capacity, tokens + max(0.0, now - updated) * refill)
+            wait = _wait(buckets, levels)
+            if not wait:
+                conn.executemany(
+                    'INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                    [(key, levels[key] - 1, now) for key in keys],
+                )
+                self._calls += 1
+                if self._calls % 1000 == 0:
+                    conn.execute('DELETE FROM buckets WHERE updated < ?', (now - IDLE_SECONDS,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+    def clear(self):
+        self._connection().execute('DELETE FROM buckets')
+
+
+def _wait(buckets, levels):
+    wait = 0.0
+    for key, _, refill in buckets:
+        if levels[key] < 1:
+            wait = max(wait, (1 - levels[key]) / refill)
+    return wait
+
+
+def _body(request):
+    # Credentials are a small body; parsing it is cheap next to hashing the password
+    data = request.data if hasattr(request, 'data') else parse_body(request)
+    return data if hasattr(data, 'get') else {}
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    return import_string(settings.THROTTLE_STORE)()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    DRF throttle checking the endpoint, IP and user buckets of `scope`.
+
+    Anonymous requests skip the user bucket; the IP bucket still applies.
+    """
+    scope = None
+
+    def get_idents(self, request, rates):
+        """{bucket kind: client identity}; kinds without a rate are skipped"""
+        idents = {'endpoint': ''}
+        if 'ip' in rates:
+            idents['ip'] = self.get_ident(request)
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            idents['user'] = user.pk
+        return idents
+
+    def get_buckets(self, request):
+        rates = settings.THROTTLE_RATES.get(self.scope, {})
+        idents = self.get_idents(request, rates)
+        buckets = []
+        for kind, ident in idents.items():
+            rate = parse_rate(rates.get(kind))
+            if rate:
+                buckets.append((f'{self.scope}:{kind}:{ident}', *rate))
+        return buckets
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0
+        if not settings.THROTTLE_ENABLED:
+            return True
+        buckets = self.get_buckets(request)
+        if buckets:
+            self.wait_seconds = get_store().take(buckets)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginThrottle(TokenBucketThrottle):
+    """
+    Adds an 'account' bucket per IP and username, so guessing one account's
+    password is held back while a campus behind one NAT address, logging in
+    to many accounts at once, only meets the much larger per-IP rate.
+    """
+    scope = 'login'
+
+    def get_idents(self, request, rates):
+        idents = super().get_idents(request, rates)
+        if 'account' in rates:
+            username = str(_body(request).get('username') or '').strip().lower()[:150]
+            idents['account'] = f'{self.get_ident(request)}:{username}'
+        return idents
+
+
+class RegisterThrottle(TokenBucketThrottle):
+    scope = 'register'
+
+
+class MessageThrottle(TokenBucketThrottle):
+    scope = 'message'
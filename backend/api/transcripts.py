@@ -0,0 +1,164 @@
+"""
+Materialized student transcripts (the student_summaries table).
+
+Every result write marks the affected students; once the transaction
+commits, their summaries are recomputed from their results with one grouped
+query and written back with one upsert. Only the students a write touched
+are recomputed, and each recomputation reads just that student's results
+through the student index, so a summary can never drift from the results
+the way accumulated deltas could. Marks collected inside one transaction
+(a bulk marks sheet, or an exam deleted together with its results) are
+recomputed together when it commits.
+
+Reading a transcript is then a single primary key lookup.
+"""
+import threading
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, Q, Sum, When
+
+from .models import GRADE_POINTS, Result, StudentSummary
+
+# Students recomputed per grouped query
+BATCH_SIZE = 500
+
+_pending = threading.local()
+
+_GRADED = Q(total_marks__gt=0, grade__isnull=False)
+_POINTS = Case(
+    *(When(grade=grade, then=points) for grade, points in GRADE_POINTS.items()),
+    default=0,
+    output_field=DecimalField(max_digits=10, decimal_places=2),
+)
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+def mark_changed(*student_ids):
+    """Recompute these students' summaries when the current transaction commits"""
+    ids = {student_id for student_id in student_ids if student_id is not None}
+    if not ids:
+        return
+    pending = getattr(_pending, 'ids', None)
+    if pending is None:
+        pending = _pending.ids = set()
+    pending.update(ids)
+    # Every mark registers a flush; the first to run takes all pending ids and the rest find none.
+    # Ids left behind by a rolled-back transaction are recomputed with the next flush, which is harmless.
+    transaction.on_commit(flush)
+
+
+def flush():
+    ids = getattr(_pending, 'ids', None)
+    if ids:
+        _pending.ids = set()
+        rebuild(ids)
+
+
+def _quantize(value):
+    return Decimal(value or 0).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _ratios(totals):
+    """Add percentage and GPA to a dict of summed marks and points"""
+    graded = totals['graded']
+    totals['percentage'] = _quantize(totals['marks_obtained'] / totals['total_marks'] * 100) if graded else ZERO
+    totals['gpa'] = _quantize(totals['grade_points'] / graded) if graded else ZERO
+    return totals
+
+
+def summarize(rows):
+    """
+    Build {student_id: StudentSummary} from rows of
+    (student_id, subject, results, graded, marks_obtained, total_marks, grade_points).
+    """
+    summaries = {}
+    for student_id, subject, results, graded, marks, total, points in rows:
+        summary = summaries.get(student_id)
+        if summary is None:
+            summary = summaries[student_id] = StudentSummary(
+                student_id=student_id, results_count=0, graded_count=0, subjects={},
+                marks_obtained=Decimal(0), total_marks=Decimal(0), grade_points=Decimal(0),
+            )
+        subject_totals = _ratios({
+            'results': results,
+            'graded': graded,
+            'marks_obtained': _quantize(marks),
+            'total_marks': _quantize(total),
+            'grade_points': _quantize(points),
+        })
+        summary.results_count += results
+        summary.graded_count += graded
+        summary.marks_obtained += subject_totals['marks_obtained']
+        summary.total_marks += subject_totals['total_marks']
+        summary.grade_points += subject_totals['grade_points']
+        summary.subjects[subject] = {
+            key: str(value) if isinstance(value, Decimal) else value for key, value in subject_totals.items()
+        }
+    for summary in summaries.values():
+        totals = _ratios({
+            'graded': summary.graded_count,
+            'marks_obtained': summary.marks_obtained,
+            'total_marks': summary.total_marks,
+            'grade_points': summary.grade_points,
+        })
+        summary.percentage = totals['percentage']
+        summary.gpa = totals['gpa']
+        summary.subjects = dict(sorted(summary.subjects.items()))
+    return summaries
+
+
+def rebuild(student_ids, batch_size=BATCH_SIZE):
+    """Recompute the summaries of these students from their results"""
+    student_ids = sorted(set(student_ids))
+    rebuilt = 0
+    for start in range(0, len(student_ids), batch_size):
+        batch = student_ids[start:start + batch_size]
+        rows = (
+            Result.objects.filter(student_id__in=batch)
+            .values('student_id', 'exam__subject')
+            .annotate(
+                results=Count('pk'),
+                graded=Count('pk', filter=_GRADED),
+                marks=Sum('marks_obtained', filter=_GRADED),
+                total=Sum('total_marks', filter=_GRADED),
+                points=Sum(_POINTS, filter=_GRADED),
+            )
+            .values_list('student_id', 'exam__subject', 'results', 'graded', 'marks', 'total', 'points')
+        )
+        summaries = summarize(rows)
+        with transaction.atomic():
+            StudentSummary.objects.bulk_create(
+                summaries.values(),
+                update_conflicts=True,
+                unique_fields=['student'],
+                update_fields=[
+                    'results_count', 'graded_count', 'marks_obtained', 'total_marks',
+                    'percentage', 'grade_points', 'gpa', 'subjects', 'updated_at',
+                ],
+            )
+            # Students whose last result went away
+            StudentSummary.objects.filter(student_id__in=set(batch) - set(summaries)).delete()
+        rebuilt += len(summaries)
+    return rebuilt
+
+
+def transcript(student_id):
+    """Transcript payload for a student: one indexed read"""
+    summary = StudentSummary.objects.filter(student_id=student_id).first()
+    if summary is None:
+        summary = StudentSummary(student_id=student_id, percentage=ZERO, gpa=ZERO)
+    return {
+        'student': student_id,
+        'results': summary.results_count,
+        'graded': summary.graded_count,
+        'marks_obtained': str(_quantize(summary.marks_obtained)),
+        'total_marks': str(_quantize(summary.total_marks)),
+        'percentage': str(_quantize(summary.percentage)),
+        'grade_points': str(_quantize(summary.grade_points)),
+        'gpa': str(_quantize(summary.gpa)),
+        'subjects': [{'subject': subject, **totals} for subject, totals in summary.subjects.items()],
+        'updated_at': summary.updated_at,
+    }
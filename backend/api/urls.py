@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -9,9 +10,13 @@ urlpatterns = [
     # Exams
     path('exams/', views.ExamListCreateView.as_view(), name='exam_list_create'),
     path('exams/<int:pk>/', views.ExamDetailView.as_view(), name='exam_detail'),
+    path('exams/<int:pk>/stats/', views.exam_stats, name='exam_stats'),
     
     # Results
     path('results/', views.ResultListCreateView.as_view(), name='result_list_create'),
+    path('results/bulk/', views.bulk_create_results, name='result_bulk_create'),
+    path('results/export/<str:fmt>/', views.export_results, name='result_export'),
+    path('transcript/', views.transcript_view, name='transcript'),
     path('results/<int:pk>/', views.ResultDetailView.as_view(), name='result_detail'),
     
     # Study Materials
@@ -22,5 +27,9 @@ urlpatterns = [
     path('dashboard-stats/', views.dashboard_stats, name='dashboard_stats'),
     path('students/', views.get_students, name='get_students'),
     path('faculty/', views.get_faculty, name='get_faculty'),
-    path('messages/', views.post_message, name='post_message'),
+    path('search/', views.search_view, name='search'),
+    path('messages/', views.post_message_async if settings.ASYNC_VIEWS else views.post_message, name='post_message'),
+    path('health/mongo/', views.mongo_health, name='mongo_health'),
+    path('jobs/stats/', views.job_stats, name='job_stats'),
+    path('metrics/', views.request_metrics, name='request_metrics'),
 ]
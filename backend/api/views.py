@@ -1,43 +1,77 @@
+import hashlib
+
+from asgiref.sync import sync_to_async
+
 from rest_framework import generics, status, filters
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, parser_classes, throttle_classes
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
 from django.db.models import Q
-from .models import Event, Exam, Result, StudyMaterial
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.text import slugify
+from .models import Event, Exam, Result, StudyMaterial, calculate_grades
 from .serializers import (
     EventSerializer, EventCreateSerializer,
     ExamSerializer, ExamCreateSerializer,
     ResultSerializer, ResultCreateSerializer,
+    ResultBulkCreateSerializer, ResultBulkRowSerializer,
     StudyMaterialSerializer, StudyMaterialCreateSerializer,
-    UserBasicSerializer
 )
-from .permissions import IsAdminOrReadOnly, IsFacultyOrAdmin, IsFacultyOrAdminOrReadOnly, IsOwnerOrAdmin, IsStudentOrReadOnly
+from .async_support import async_api_view, json_response
+from .cache import CachedListMixin, etag_matches
+from .filters import IndexedSearchFilter
+from .mixins import SelectRelatedMixin
+from .parsers import CSVParser, read_csv_rows
+from .permissions import IsAdmin, IsAdminOrReadOnly, IsFacultyOrAdmin, IsFacultyOrAdminOrReadOnly, IsOwnerOrAdmin, IsStudentOrReadOnly
+from .replicas import ReplicaListMixin, reads_from_replica
+from .throttling import MessageThrottle
 from accounts.models import User
-from api.mongo import col
+from api import counters, exports, instrumentation, jobs, roster, search, stats, transcripts
+from api.mirror import mirror
+from api.mongo import UNAVAILABLE_ERRORS, MongoUnavailable, acol, col, mongo
+from api.signals import results_bulk_created
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.conf import settings
 
 
+def _owner_scope(user):
+    """
+    Cache scope for lists where faculty only see rows they own
+    """
+    if user.is_student:
+        return 'active'
+    if user.is_faculty and not user.is_admin:
+        return f'owner:{user.id}'
+    return 'all'
+
+
 # Event Views
-class EventListCreateView(generics.ListCreateAPIView):
+class EventListCreateView(ReplicaListMixin, CachedListMixin, SelectRelatedMixin, generics.ListCreateAPIView):
     """
     List all events or create a new event
     """
     queryset = Event.objects.filter(is_active=True)
     permission_classes = [IsAuthenticated, IsFacultyOrAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     filterset_fields = ['created_by']
     search_fields = ['title', 'description', 'location']
+    search_kinds = {'event': 'pk'}
     ordering_fields = ['date', 'created_at']
     ordering = ['-date']
+    cursor_ordering = ('-date', '-id')
+    cache_dependencies = ('event', 'user')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return EventCreateSerializer
         return EventSerializer
     
+    def get_cache_scope(self):
+        return 'active' if self.request.user.is_student else 'all'
+    
     def get_queryset(self):
         # Students can only see active events
         if self.request.user.is_student:
@@ -46,7 +80,7 @@ class EventListCreateView(generics.ListCreateAPIView):
         return Event.objects.all()
 
 
-class EventDetailView(generics.RetrieveUpdateDestroyAPIView):
+class EventDetailView(SelectRelatedMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete an event
     """
@@ -60,35 +94,41 @@ class EventDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 # Exam Views
-class ExamListCreateView(generics.ListCreateAPIView):
+class ExamListCreateView(ReplicaListMixin, CachedListMixin, SelectRelatedMixin, generics.ListCreateAPIView):
     """
     List all exams or create a new exam
     """
     queryset = Exam.objects.filter(is_active=True)
     permission_classes = [IsAuthenticated, IsFacultyOrAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     filterset_fields = ['faculty', 'subject']
     search_fields = ['title', 'description', 'subject']
+    search_kinds = {'exam': 'pk'}
     ordering_fields = ['date', 'created_at']
     ordering = ['-date']
+    cursor_ordering = ('-date', '-id')
+    cache_dependencies = ('exam', 'user')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return ExamCreateSerializer
         return ExamSerializer
     
+    def get_cache_scope(self):
+        return _owner_scope(self.request.user)
+    
     def get_queryset(self):
         # Students can only see active exams
         if self.request.user.is_student:
             return Exam.objects.filter(is_active=True)
         # Faculty can see their own exams and all if admin
         elif self.request.user.is_faculty and not self.request.user.is_admin:
-            return Exam.objects.filter(faculty=self.request.user)
+            return Exam.objects.filter(faculty_id=self.request.user.id)
         # Admin can see all exams
         return Exam.objects.all()
 
 
-class ExamDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ExamDetailView(SelectRelatedMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete an exam
     """
@@ -102,17 +142,21 @@ class ExamDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 # Result Views
-class ResultListCreateView(generics.ListCreateAPIView):
+class ResultListCreateView(ReplicaListMixin, SelectRelatedMixin, generics.ListCreateAPIView):
     """
     List all results or create a new result
     """
     queryset = Result.objects.all()
     permission_classes = [IsAuthenticated, IsFacultyOrAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     filterset_fields = ['exam', 'student', 'grade']
     search_fields = ['student__username', 'student__first_name', 'student__last_name', 'exam__title']
+    search_kinds = {'student': 'student_id', 'exam': 'exam_id'}
+    # Exams match on their title only, as the LIKE filter did
+    search_columns = {'exam': ['title']}
     ordering_fields = ['created_at', 'marks_obtained']
     ordering = ['-created_at']
+    cursor_ordering = ('-created_at', '-id')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -120,17 +164,21 @@ class ResultListCreateView(generics.ListCreateAPIView):
         return ResultSerializer
     
     def get_queryset(self):
-        # Students can only see their own results
-        if self.request.user.is_student:
-            return Result.objects.filter(student=self.request.user)
-        # Faculty can see results for their exams
-        elif self.request.user.is_faculty and not self.request.user.is_admin:
-            return Result.objects.filter(exam__faculty=self.request.user)
-        # Admin can see all results
-        return Result.objects.all()
+        return _visible_results(self.request.user)
+
 
+def _visible_results(user):
+    # Students can only see their own results
+    if user.is_student:
+        return Result.objects.filter(student_id=user.id)
+    # Faculty can see results for their exams
+    elif user.is_faculty and not user.is_admin:
+        return Result.objects.filter(exam__faculty_id=user.id)
+    # Admin can see all results
+    return Result.objects.all()
 
-class ResultDetailView(generics.RetrieveUpdateDestroyAPIView):
+
+class ResultDetailView(SelectRelatedMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete a result
     """
@@ -143,36 +191,135 @@ class ResultDetailView(generics.RetrieveUpdateDestroyAPIView):
         return ResultSerializer
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsFacultyOrAdmin])
+@parser_classes([JSONParser, CSVParser, MultiPartParser, FormParser])
+def bulk_create_results(request):
+    """
+    Create results for a whole exam from a JSON or CSV marks sheet.
+
+    Accepts {"exam": id, "results": [...]} as JSON, a multipart upload with
+    `exam` and a CSV `file`, or a text/csv body with ?exam=<id>. Invalid rows
+    are reported by index; the remaining rows are inserted in one transaction.
+    """
+    if isinstance(request.data, list):
+        payload = {'exam': request.query_params.get('exam'), 'results': request.data}
+    elif 'file' in request.FILES:
+        text = request.FILES['file'].read().decode('utf-8', errors='replace')
+        payload = {'exam': request.data.get('exam'), 'results': read_csv_rows(text)}
+    else:
+        payload = request.data
+    envelope = ResultBulkCreateSerializer(data=payload)
+    envelope.is_valid(raise_exception=True)
+    exam = envelope.validated_data['exam']
+    if not request.user.is_admin and exam.faculty_id != request.user.id:
+        return Response({'error': 'You can only enter results for your own exams'},
+                        status=status.HTTP_403_FORBIDDEN)
+
+    errors = []
+    rows = []
+    for index, raw in enumerate(envelope.validated_data['results']):
+        row = ResultBulkRowSerializer(data=raw)
+        if row.is_valid():
+            rows.append((index, row.validated_data))
+        else:
+            errors.append({'row': index, 'errors': row.errors})
+
+    # Resolve every referenced student and existing result with one query each
+    ids = {attrs['student'] for _, attrs in rows if attrs.get('student') is not None}
+    usernames = {attrs['username'] for _, attrs in rows if attrs.get('student') is None}
+    users = list(User.objects.filter(Q(id__in=ids) | Q(username__in=usernames)).values_list('id', 'username', 'role'))
+    roles = {pk: role for pk, _, role in users}
+    ids_by_username = {username: pk for pk, username, _ in users}
+    for _, attrs in rows:
+        if attrs.get('student') is None:
+            attrs['student'] = ids_by_username.get(attrs['username'])
+    existing = set(
+        Result.objects.filter(exam=exam, student_id__in=[attrs['student'] for _, attrs in rows])
+        .values_list('student_id', flat=True)
+    )
+
+    accepted = []
+    seen = set()
+    for index, attrs in rows:
+        student_id = attrs['student']
+        if student_id not in roles:
+            message = "Student not found"
+        elif roles[student_id] != 'student':
+            message = "Selected user is not a student"
+        elif student_id in existing:
+            message = "Result for this student and exam already exists"
+        elif student_id in seen:
+            message = "Duplicate row for this student"
+        else:
+            seen.add(student_id)
+            accepted.append(attrs)
+            continue
+        errors.append({'row': index, 'errors': {'non_field_errors': [message]}})
+
+    grades = calculate_grades((attrs['marks_obtained'], attrs['total_marks']) for attrs in accepted)
+    results = [
+        Result(
+            exam=exam,
+            student_id=attrs['student'],
+            marks_obtained=attrs['marks_obtained'],
+            total_marks=attrs['total_marks'],
+            grade=grade,
+            remarks=attrs.get('remarks'),
+        )
+        for attrs, grade in zip(accepted, grades)
+    ]
+    if results:
+        with transaction.atomic():
+            Result.objects.bulk_create(results, batch_size=500)
+            results_bulk_created.send(sender=Result, instances=results)
+
+    errors.sort(key=lambda error: error['row'])
+    return Response({
+        'exam': exam.id,
+        'created': len(results),
+        'failed': len(errors),
+        'result_ids': [result.id for result in results],
+        'errors': errors,
+    }, status=status.HTTP_201_CREATED if results else status.HTTP_400_BAD_REQUEST)
+
+
 # Study Material Views
-class StudyMaterialListCreateView(generics.ListCreateAPIView):
+class StudyMaterialListCreateView(ReplicaListMixin, CachedListMixin, SelectRelatedMixin, generics.ListCreateAPIView):
     """
     List all study materials or create a new study material
     """
     queryset = StudyMaterial.objects.filter(is_active=True)
     permission_classes = [IsAuthenticated, IsFacultyOrAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['uploaded_by', 'material_type', 'subject']
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
+    filterset_fields = ['uploaded_by', 'material_type', 'subject', 'mime_type']
     search_fields = ['title', 'description', 'subject']
-    ordering_fields = ['created_at', 'title']
+    search_kinds = {'material': 'pk'}
+    ordering_fields = ['created_at', 'title', 'file_size_bytes']
     ordering = ['-created_at']
+    cursor_ordering = ('-created_at', '-id')
+    cache_dependencies = ('material', 'user')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return StudyMaterialCreateSerializer
         return StudyMaterialSerializer
     
+    def get_cache_scope(self):
+        return _owner_scope(self.request.user)
+    
     def get_queryset(self):
         # Students can only see active materials
         if self.request.user.is_student:
             return StudyMaterial.objects.filter(is_active=True)
         # Faculty can see their own materials and all if admin
         elif self.request.user.is_faculty and not self.request.user.is_admin:
-            return StudyMaterial.objects.filter(uploaded_by=self.request.user)
+            return StudyMaterial.objects.filter(uploaded_by_id=self.request.user.id)
         # Admin can see all materials
         return StudyMaterial.objects.all()
 
 
-class StudyMaterialDetailView(generics.RetrieveUpdateDestroyAPIView):
+class StudyMaterialDetailView(SelectRelatedMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete a study material
     """
@@ -185,50 +332,158 @@ class StudyMaterialDetailView(generics.RetrieveUpdateDestroyAPIView):
         return StudyMaterialSerializer
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_results(request, fmt):
+    """
+    Stream visible results as a CSV or XLSX marks sheet
+
+    Filter with ?exam=<id>, ?subject=<name> and ?student=<id>; rows are
+    streamed in chunks, so large exports start immediately.
+    """
+    if fmt not in exports.CONTENT_TYPES:
+        return Response({'error': 'Format must be csv or xlsx'}, status=status.HTTP_404_NOT_FOUND)
+    results = _visible_results(request.user)
+    name = ['results']
+    for param, lookup in (('exam', 'exam_id'), ('student', 'student_id')):
+        value = request.query_params.get(param)
+        if value:
+            try:
+                results = results.filter(**{lookup: int(value)})
+            except ValueError:
+                return Response({'error': f'{param} must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+            name.append(f'{param}-{int(value)}')
+    subject = request.query_params.get('subject', '').strip()
+    if subject:
+        results = results.filter(exam__subject__iexact=subject)
+        name.append(slugify(subject) or 'subject')
+
+    response = StreamingHttpResponse(
+        exports.stream(fmt, exports.result_rows(results), sheet_name='Results'),
+        content_type=exports.CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{"-".join(name)}.{fmt}"'
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsFacultyOrAdmin])
+def exam_stats(request, pk):
+    """
+    Score distribution of an exam: mean, spread, percentiles, grades and pass rate
+
+    Faculty see the statistics of their own exams; cached until a result changes.
+    """
+    faculty_id = Exam.objects.filter(pk=pk).values_list('faculty_id', flat=True).first()
+    if faculty_id is None:
+        return Response({'error': 'Exam not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not request.user.is_admin and faculty_id != request.user.id:
+        return Response({'error': 'You can only view statistics for your own exams'},
+                        status=status.HTTP_403_FORBIDDEN)
+    return Response(stats.exam_statistics(pk))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def transcript_view(request):
+    """
+    Cumulative transcript: total marks, weighted percentage, GPA and per-subject breakdown
+
+    Students get their own; admins pass ?student=<id>. Served from the
+    materialized student summary (one indexed read).
+    """
+    user = request.user
+    if user.is_student:
+        return Response(transcripts.transcript(user.id))
+    if not user.is_admin:
+        return Response({'error': 'Transcripts are available to students and admins'},
+                        status=status.HTTP_403_FORBIDDEN)
+    try:
+        student_id = int(request.query_params['student'])
+    except (KeyError, ValueError):
+        return Response({'error': 'Pass ?student=<id>'}, status=status.HTTP_400_BAD_REQUEST)
+    if not User.objects.filter(pk=student_id, role='student').exists():
+        return Response({'error': 'Student not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(transcripts.transcript(student_id))
+
+
 # Utility Views
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@reads_from_replica
 def dashboard_stats(request):
     """
     Get dashboard statistics based on user role
+
+    Counts come from the precomputed counters in api.counters (one query).
     """
     user = request.user
     
     if user.is_admin:
-        stats = {
-            'total_events': Event.objects.count(),
-            'total_exams': Exam.objects.count(),
-            'total_results': Result.objects.count(),
-            'total_materials': StudyMaterial.objects.count(),
-            'total_users': User.objects.count(),
+        fields = {
+            'total_events': 'events',
+            'total_exams': 'exams',
+            'total_results': 'results',
+            'total_materials': 'materials',
+            'total_users': 'users',
         }
     elif user.is_faculty:
-        stats = {
-            'my_events': Event.objects.filter(created_by=user).count(),
-            'my_exams': Exam.objects.filter(faculty=user).count(),
-            'my_results': Result.objects.filter(exam__faculty=user).count(),
-            'my_materials': StudyMaterial.objects.filter(uploaded_by=user).count(),
+        fields = {
+            'my_events': counters.user_key(user.id, 'events'),
+            'my_exams': counters.user_key(user.id, 'exams'),
+            'my_results': counters.user_key(user.id, 'exam_results'),
+            'my_materials': counters.user_key(user.id, 'materials'),
         }
     else:  # student
-        stats = {
-            'my_results': Result.objects.filter(student=user).count(),
-            'available_events': Event.objects.filter(is_active=True).count(),
-            'available_exams': Exam.objects.filter(is_active=True).count(),
-            'available_materials': StudyMaterial.objects.filter(is_active=True).count(),
+        fields = {
+            'my_results': counters.user_key(user.id, 'results'),
+            'available_events': 'events:active',
+            'available_exams': 'exams:active',
+            'available_materials': 'materials:active',
         }
     
+    values = counters.read(list(fields.values()))
+    stats = {name: values[key] for name, key in fields.items()}
+    
     return Response(stats)
 
 
+def _roster_response(request, role):
+    """
+    Serve a roster snapshot with conditional GET, ?q= prefix filtering and ?limit=
+    """
+    query = request.query_params.get('q', '').strip()
+    try:
+        limit = int(request.query_params.get('limit') or 0)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if limit < 0:
+        return Response({'error': 'limit must not be negative'}, status=status.HTTP_400_BAD_REQUEST)
+
+    snapshot = roster.get_roster(role)
+    etag = f'"{role}-{snapshot.version}-{hashlib.sha1(f"{query}|{limit}".encode()).hexdigest()[:12]}"'
+    if etag_matches(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    elif not query and not limit:
+        # The full list is rendered once per roster version
+        response = HttpResponse(snapshot.content, content_type='application/json')
+    elif query:
+        response = Response(snapshot.filter(query, limit))
+    else:
+        response = Response(snapshot.rows[:limit])
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_students(request):
     """
     Get list of students for dropdowns
     """
-    students = User.objects.filter(role='student').order_by('first_name', 'last_name')
-    serializer = UserBasicSerializer(students, many=True)
-    return Response(serializer.data)
+    return _roster_response(request, 'student')
 
 
 @api_view(['GET'])
@@ -237,26 +492,137 @@ def get_faculty(request):
     """
     Get list of faculty for dropdowns
     """
-    faculty = User.objects.filter(role='faculty').order_by('first_name', 'last_name')
-    serializer = UserBasicSerializer(faculty, many=True)
-    return Response(serializer.data)
+    return _roster_response(request, 'faculty')
 
 
-@api_view(['POST'])
+def _searchable(user):
+    """
+    Querysets a user may see search hits from, mirroring the list views
+    """
+    if user.is_student:
+        return {
+            'event': Event.objects.filter(is_active=True),
+            'exam': Exam.objects.filter(is_active=True),
+            'material': StudyMaterial.objects.filter(is_active=True),
+        }
+    if user.is_faculty and not user.is_admin:
+        return {
+            'event': Event.objects.all(),
+            'exam': Exam.objects.filter(faculty_id=user.id),
+            'material': StudyMaterial.objects.filter(uploaded_by_id=user.id),
+            'student': User.objects.filter(role='student'),
+        }
+    return {
+        'event': Event.objects.all(),
+        'exam': Exam.objects.all(),
+        'material': StudyMaterial.objects.all(),
+        'student': User.objects.filter(role='student'),
+    }
+
+
+# Hits are over-fetched so that rows the user may not see can be dropped
+SEARCH_OVERFETCH = 4
+
+
+@api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def post_message(request):
-    payload = request.data or {}
-    doc = {
-        "user_id": request.user.id,
-        "username": request.user.username,
-        "role": request.user.role,
+def search_view(request):
+    """
+    Ranked full-text search across events, exams, materials and students
+
+    ?q= is required; ?type= narrows to a comma-separated list of kinds and
+    ?limit= caps the number of hits (default 20, max 100).
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': 'The q parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    allowed = _searchable(request.user)
+    kinds = list(allowed)
+    requested = request.query_params.get('type')
+    if requested:
+        kinds = [kind for kind in requested.split(',') if kind in allowed]
+        if not kinds:
+            return Response({'error': f'type must be one of: {", ".join(allowed)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    hits = search.get_backend().search(
+        query, kinds=kinds, active_only=request.user.is_student, limit=limit * SEARCH_OVERFETCH,
+    )
+
+    # One query per kind to drop hidden rows and fetch display titles
+    titles = {}
+    for kind in kinds:
+        ids = [object_id for hit_kind, object_id, _ in hits if hit_kind == kind]
+        if not ids:
+            continue
+        if kind == 'student':
+            rows = allowed[kind].filter(pk__in=ids).values_list('pk', 'first_name', 'last_name', 'username')
+            titles.update(((kind, pk), f'{first} {last}'.strip() or username) for pk, first, last, username in rows)
+        else:
+            rows = allowed[kind].filter(pk__in=ids).values_list('pk', 'title')
+            titles.update(((kind, pk), title) for pk, title in rows)
+
+    results = [
+        {'type': kind, 'id': object_id, 'title': titles[(kind, object_id)], 'score': round(score, 4)}
+        for kind, object_id, score in hits
+        if (kind, object_id) in titles
+    ][:limit]
+    return Response({'query': query, 'count': len(results), 'results': results})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdmin])
+def mongo_health(request):
+    """
+    MongoDB circuit state, ping, latency percentiles and mirror backlog
+    """
+    health = mongo.health()
+    health['mirror'] = {'queued': mirror.depth(), 'spooled': mirror.spooled()}
+    healthy = health['ping_ms'] is not None
+    return Response(health, status=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdmin])
+def job_stats(request):
+    """
+    Background job queue depth by status
+    """
+    return Response(jobs.stats())
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated, IsAdmin])
+def request_metrics(request):
+    """
+    Per-route histograms of wall, SQL, Mongo and serializer time for this worker process
+
+    DELETE starts a new measurement window.
+    """
+    if request.method == 'DELETE':
+        instrumentation.registry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(instrumentation.registry.snapshot())
+
+
+def _message_doc(user, payload):
+    return {
+        "user_id": user.id,
+        "username": user.username,
+        "role": user.role,
         "message": payload.get("message", ""),
         "meta": payload.get("meta", {}),
         "created_at": timezone.now(),
     }
-    res = col("messages").insert_one(doc)
-    
-    # Send email notification to admin
+
+
+def _queue_contact_email(payload):
+    """Queue the email notification to admin; run_jobs sends it in the background"""
     try:
         # Get contact details from meta
         meta = payload.get("meta", {})
@@ -284,16 +650,40 @@ This message was sent through the Campus Connect contact form.
         
         # Send email to admin (you can change this email address)
         admin_email = "sisodiyajeet55@gmail.com"  # ⚠️ CHANGE THIS TO YOUR EMAIL ADDRESS
-        send_mail(
+        jobs.send_email_later(
             email_subject,
             email_message,
-            settings.DEFAULT_FROM_EMAIL,
             [admin_email],
-            fail_silently=False,
+            reply_to=email or None,
         )
         
     except Exception as e:
-        print(f"Error sending email: {e}")
+        print(f"Error queueing email: {e}")
         # Don't fail the request if email fails
-    
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([MessageThrottle])
+def post_message(request):
+    payload = request.data or {}
+    try:
+        res = col("messages").insert_one(_message_doc(request.user, payload))
+    except (MongoUnavailable, *UNAVAILABLE_ERRORS):
+        return Response({"error": "Messaging is temporarily unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    _queue_contact_email(payload)
     return Response({"inserted_id": str(res.inserted_id)})
+
+
+@async_api_view(['POST'], throttle=MessageThrottle)
+async def post_message_async(request, payload):
+    """
+    post_message for ASGI servers: awaits Mongo instead of holding a thread
+    """
+    try:
+        res = await acol("messages").insert_one(_message_doc(request.user, payload))
+    except (MongoUnavailable, *UNAVAILABLE_ERRORS):
+        return json_response({"error": "Messaging is temporarily unavailable"},
+                             status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    await sync_to_async(_queue_contact_email)(payload)
+    return json_response({"inserted_id": str(res.inserted_id)})
@@ -1,5 +1,10 @@
 """
 ASGI config for campus_connect project.
+
+Serve with an ASGI server and ASYNC_VIEWS=True to use the async login and
+message views, e.g.:
+
+    gunicorn campus_connect.asgi:application -w 4 -k uvicorn.workers.UvicornWorker
 """
 
 import os
@@ -2,7 +2,10 @@
 Django settings for campus_connect project.
 """
 
+import os
+from importlib.util import find_spec
 from pathlib import Path
+import django
 from decouple import config
 from datetime import timedelta
 
@@ -55,6 +58,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timing covers the rest of the stack
+    'api.instrumentation.InstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -85,13 +90,105 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'campus_connect.wsgi.application'
 
-# Database - SQLite configuration (for development)
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database
+# SQLite by default (development). DATABASE_ENGINE=postgres (requires psycopg) for
+# production; connections are kept open for DATABASE_CONN_MAX_AGE seconds per worker thread.
+DATABASE_ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgres': 'django.db.backends.postgresql',
+}
+_database_engine = config('DATABASE_ENGINE', default='sqlite')
+# A name from DATABASE_ENGINES or a backend's dotted path
+DATABASE_ENGINE = DATABASE_ENGINES.get(_database_engine, _database_engine)
+
+
+def _database(prefix, default_name):
+    """Connection settings read from <prefix>_NAME, <prefix>_HOST, ..."""
+    database = {
+        'ENGINE': DATABASE_ENGINE,
+        'NAME': config(f'{prefix}_NAME', default=default_name),
+        'CONN_MAX_AGE': config('DATABASE_CONN_MAX_AGE', default=0 if DATABASE_ENGINE.endswith('sqlite3') else 60,
+                               cast=int),
+        # Replace connections that died while idle instead of failing the next request
+        'CONN_HEALTH_CHECKS': _parse_bool(config('DATABASE_CONN_HEALTH_CHECKS', default='True'), default=True),
     }
+    if DATABASE_ENGINE.endswith('sqlite3'):
+        return database
+    database.update({
+        'USER': config(f'{prefix}_USER', default=config('DATABASE_USER', default='')),
+        'PASSWORD': config(f'{prefix}_PASSWORD', default=config('DATABASE_PASSWORD', default='')),
+        'HOST': config(f'{prefix}_HOST', default=config('DATABASE_HOST', default='localhost')),
+        'PORT': config(f'{prefix}_PORT', default=config('DATABASE_PORT', default='5432')),
+        # Required behind a transaction-pooling PgBouncer; exports then buffer each chunk client-side
+        'DISABLE_SERVER_SIDE_CURSORS': _parse_bool(
+            config('DATABASE_DISABLE_SERVER_SIDE_CURSORS', default='False'), default=False),
+        'OPTIONS': {
+            'connect_timeout': config('DATABASE_CONNECT_TIMEOUT', default=5, cast=int),
+            'sslmode': config('DATABASE_SSLMODE', default='prefer'),
+        },
+    })
+    return database
+
+
+DATABASES = {
+    'default': _database(
+        'DATABASE', str(BASE_DIR / 'db.sqlite3') if DATABASE_ENGINE.endswith('sqlite3') else 'campus_connect'),
+}
+
+# Read replica (api/replicas.py): list and dashboard reads go to it once DATABASE_REPLICA_NAME
+# (SQLite: path of a replicated copy) or DATABASE_REPLICA_HOST (Postgres) is set.
+# Unset DATABASE_REPLICA_* values fall back to the primary's.
+DATABASE_REPLICA_ALIAS = 'replica'
+if config('DATABASE_REPLICA_NAME', default='') or config('DATABASE_REPLICA_HOST', default=''):
+    DATABASES[DATABASE_REPLICA_ALIAS] = _database('DATABASE_REPLICA', DATABASES['default']['NAME'])
+    # Tests read the test primary through the replica alias
+    DATABASES[DATABASE_REPLICA_ALIAS]['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['api.replicas.PrimaryReplicaRouter']
+
+# Opt-in SQLite performance profile (api/sqlite.py): SQLITE_TUNED=True applies these
+# pragmas to every SQLite connection and opens the primary's transactions with BEGIN IMMEDIATE
+SQLITE_TUNED = _parse_bool(config('SQLITE_TUNED', default='False'), default=False)
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='WAL'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='NORMAL'),
+    # Negative sizes are in KiB: 64 MiB of page cache per connection
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-65536, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    'temp_store': 'MEMORY',
+    # Milliseconds a writer waits for the lock before "database is locked"
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
 }
+if SQLITE_TUNED and DATABASE_ENGINE.endswith('sqlite3') and django.VERSION >= (5, 1):
+    # Older versions have no option for it; api/sqlite.py covers them
+    DATABASES['default'].setdefault('OPTIONS', {})['transaction_mode'] = 'IMMEDIATE'
+
+# Password hashing
+# PASSWORD_HASHER=argon2 (requires argon2-cffi) makes a tuned Argon2id hasher the
+# default; existing PBKDF2 hashes keep working and are upgraded on next login.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'accounts.hashing.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+if config('PASSWORD_HASHER', default='pbkdf2').strip().lower() == 'argon2' and find_spec('argon2') is not None:
+    PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop(2))
+# Argon2id costs; the defaults are the OWASP baseline (19 MiB, 2 passes, 1 lane)
+ARGON2_TIME_COST = config('ARGON2_TIME_COST', default=2, cast=int)
+ARGON2_MEMORY_COST = config('ARGON2_MEMORY_COST', default=19456, cast=int)  # KiB
+ARGON2_PARALLELISM = config('ARGON2_PARALLELISM', default=1, cast=int)
+
+# Login hash verification pool (accounts/hashing.py); 0 workers verifies inline
+LOGIN_HASH_WORKERS = config('LOGIN_HASH_WORKERS', default=os.cpu_count() or 1, cast=int)
+# Logins allowed to wait for a worker before new ones are shed with a 503
+LOGIN_HASH_QUEUE = config('LOGIN_HASH_QUEUE', default=(os.cpu_count() or 1) * 16, cast=int)
+LOGIN_HASH_TIMEOUT = config('LOGIN_HASH_TIMEOUT', default=5.0, cast=float)
+
+# Serve login and contact messages from native async views (accounts/views.py,
+# api/views.py). Only worthwhile under an ASGI server (see campus_connect/asgi.py);
+# under WSGI each async request runs in its own event loop.
+ASYNC_VIEWS = _parse_bool(config('ASYNC_VIEWS', default='False'), default=False)
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -132,16 +229,17 @@ AUTH_USER_MODEL = 'accounts.User'
 # Django REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # Page numbers by default; ?cursor= switches list views to keyset pagination
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.StandardPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
-        'rest_framework.filters.SearchFilter',
+        'api.filters.IndexedSearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
 }
@@ -177,6 +275,101 @@ SIMPLE_JWT = {
 MONGO_URI = config('MONGO_URI', default='mongodb://localhost:27017')
 MONGO_DB = config('MONGO_DB', default='campus_connect')
 
+# Client pool and timeouts (api/mongo.py); the client connects on first use
+MONGO_MAX_POOL_SIZE = config('MONGO_MAX_POOL_SIZE', default=20, cast=int)
+MONGO_MIN_POOL_SIZE = config('MONGO_MIN_POOL_SIZE', default=0, cast=int)
+MONGO_CONNECT_TIMEOUT_MS = config('MONGO_CONNECT_TIMEOUT_MS', default=2000, cast=int)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = config('MONGO_SERVER_SELECTION_TIMEOUT_MS', default=2000, cast=int)
+MONGO_SOCKET_TIMEOUT_MS = config('MONGO_SOCKET_TIMEOUT_MS', default=5000, cast=int)
+# Circuit breaker: open after this many consecutive failures, probe again after MONGO_BREAKER_RESET seconds
+MONGO_BREAKER_THRESHOLD = config('MONGO_BREAKER_THRESHOLD', default=5, cast=int)
+MONGO_BREAKER_RESET = config('MONGO_BREAKER_RESET', default=30.0, cast=float)
+
+# Mongo mirroring pipeline (api/mirror.py)
+# Writes from post_save signals are queued after commit and flushed in batches.
+# Set MONGO_MIRROR_ASYNC=False to write synchronously (e.g. in one-off scripts).
+MONGO_MIRROR_ASYNC = _parse_bool(config('MONGO_MIRROR_ASYNC', default='True'), default=True)
+MONGO_MIRROR_QUEUE_SIZE = config('MONGO_MIRROR_QUEUE_SIZE', default=10000, cast=int)
+MONGO_MIRROR_BATCH_SIZE = config('MONGO_MIRROR_BATCH_SIZE', default=500, cast=int)
+MONGO_MIRROR_FLUSH_INTERVAL = config('MONGO_MIRROR_FLUSH_INTERVAL', default=0.5, cast=float)
+# Seconds the worker keeps collecting after the first queued write, so bursts
+# (e.g. login audit events) are written together
+MONGO_MIRROR_LINGER = config('MONGO_MIRROR_LINGER', default=0.2, cast=float)
+MONGO_MIRROR_ENQUEUE_TIMEOUT = config('MONGO_MIRROR_ENQUEUE_TIMEOUT', default=2.0, cast=float)
+# Mirror writes are spooled here while Mongo is unreachable; empty disables spooling
+MONGO_SPOOL_PATH = config('MONGO_SPOOL_PATH', default=str(BASE_DIR / 'var' / 'mongo_spool.jsonl'))
+
+# Request throttling (api/throttling.py): token buckets for login, registration and
+# contact messages. Rates are "<tokens>/<s|min|hour|day>"; an empty rate disables that bucket.
+THROTTLE_ENABLED = _parse_bool(config('THROTTLE_ENABLED', default='True'), default=True)
+# api.throttling.SQLiteBucketStore shares the buckets between worker processes on one host
+THROTTLE_STORE = config('THROTTLE_STORE', default='api.throttling.MemoryBucketStore')
+THROTTLE_PATH = config('THROTTLE_PATH', default=str(BASE_DIR / 'var' / 'throttle.sqlite3'))
+THROTTLE_RATES = {
+    'login': {
+        'endpoint': config('THROTTLE_LOGIN_RATE', default='50/s'),
+        # Campuses log in from behind a few NAT addresses; the per-account bucket stops guessing
+        'ip': config('THROTTLE_LOGIN_IP_RATE', default='1200/min'),
+        'account': config('THROTTLE_LOGIN_ACCOUNT_RATE', default='10/min'),
+    },
+    'register': {
+        'endpoint': config('THROTTLE_REGISTER_RATE', default='10/s'),
+        'ip': config('THROTTLE_REGISTER_IP_RATE', default='20/hour'),
+    },
+    'message': {
+        'endpoint': config('THROTTLE_MESSAGE_RATE', default='10/s'),
+        'ip': config('THROTTLE_MESSAGE_IP_RATE', default='30/min'),
+        'user': config('THROTTLE_MESSAGE_USER_RATE', default='5/min'),
+    },
+}
+
+# Cache (used by the list response cache in api/cache.py)
+# Use a shared backend such as django.core.cache.backends.redis.RedisCache when
+# running several worker processes, so invalidations reach all of them.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='campus-connect'),
+    }
+}
+# Backends that keep entries inside each process and cannot carry invalidations between workers
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+SHARED_CACHE = CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+# On by default only with a shared backend; with local memory, other workers would serve stale pages
+RESPONSE_CACHE_ENABLED = _parse_bool(config('RESPONSE_CACHE_ENABLED', default=SHARED_CACHE), default=SHARED_CACHE)
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+# Build request.user from access token claims without loading the user (accounts/authentication.py).
+# Token revocations are cache markers, so this too is on by default only with a shared cache.
+TOKEN_CLAIMS_TRUSTED = _parse_bool(config('TOKEN_CLAIMS_TRUSTED', default=SHARED_CACHE), default=SHARED_CACHE)
+
+# Seconds a per-exam statistics summary is kept (api/stats.py); result writes replace it sooner
+EXAM_STATS_CACHE_TIMEOUT = config('EXAM_STATS_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Full-text search (api/search.py)
+# Empty picks SQLite FTS5 when available and a plain database fallback otherwise.
+SEARCH_BACKEND = config('SEARCH_BACKEND', default='')
+# Matches ranked per /api/search/ query; broader queries rank only the newest this many
+SEARCH_RANK_WINDOW = config('SEARCH_RANK_WINDOW', default=2000, cast=int)
+
+# Request instrumentation (api/instrumentation.py): per-route histograms of wall, SQL,
+# Mongo and serializer time at /api/metrics/, and a Server-Timing header on responses
+INSTRUMENTATION_ENABLED = _parse_bool(config('INSTRUMENTATION_ENABLED', default='True'), default=True)
+# Server-Timing reveals query counts and timings to clients; off by default outside DEBUG
+SERVER_TIMING_ENABLED = _parse_bool(config('SERVER_TIMING_ENABLED', default=str(DEBUG)), default=DEBUG)
+# Requests sent with "X-Profile: <PROFILE_TOKEN>" are profiled with cProfile; empty disables
+PROFILE_TOKEN = config('PROFILE_TOKEN', default='')
+# Share of all requests profiled at random (0 to 1)
+PROFILE_SAMPLE_RATE = config('PROFILE_SAMPLE_RATE', default=0.0, cast=float)
+PROFILE_DIR = config('PROFILE_DIR', default=str(BASE_DIR / 'var' / 'profiles'))
+# Newest profiles kept in PROFILE_DIR
+PROFILE_KEEP = config('PROFILE_KEEP', default=100, cast=int)
+
+# Rows fetched per database round trip (and encoded per streamed chunk) by the result exports
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",      # React local host
@@ -200,3 +393,13 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='sisodiyajeet55@gmail.com')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='Jeet#sije$@$15062006')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='2304030101675@silveroakuni.ac.in')
+
+# Background jobs (api/jobs.py), executed by `python manage.py run_jobs`
+JOB_BATCH_SIZE = config('JOB_BATCH_SIZE', default=50, cast=int)
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=5, cast=int)
+# Retry n waits JOB_RETRY_BASE_DELAY * 2**(n-1) seconds, capped at JOB_RETRY_MAX_DELAY
+JOB_RETRY_BASE_DELAY = config('JOB_RETRY_BASE_DELAY', default=30, cast=float)
+JOB_RETRY_MAX_DELAY = config('JOB_RETRY_MAX_DELAY', default=3600, cast=float)
+# Seconds after which a running job whose worker died is claimed again
+JOB_LOCK_TIMEOUT = config('JOB_LOCK_TIMEOUT', default=600, cast=int)
+JOB_RETENTION_DAYS = config('JOB_RETENTION_DAYS', default=7, cast=int)